@@ -1,5 +1,6 @@
 import sys
 import os
+import re
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -18,6 +19,8 @@ from novelnest.core.config import settings
 from novelnest.models.user_t import User
 from novelnest.models.piece_t import Piece
 from novelnest.models.like_t import Like
+from novelnest.models.similarity_t import PieceSimilarity
+from novelnest.models.deletion_t import DeletionJob
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -38,6 +41,17 @@ target_metadata = Base.metadata
 # ... etc.
 
 
+# Partitions of likes (see like_t) are created by their migration, not declared as models
+LIKE_PARTITION = re.compile(r"likes_p\d+$")
+
+
+def include_name(name, type_, parent_names):
+    """Leave the likes partitions out of autogenerate."""
+    if type_ == "table":
+        return not LIKE_PARTITION.match(name)
+    return True
+
+
 def get_url():
     """Get database URL from environment variables"""
     return f'postgresql://{settings.db_username}:{settings.db_password}@{settings.db_hostname}:{settings.db_port}/{settings.db_name}'
@@ -61,6 +75,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_name=include_name,
     )
 
     with context.begin_transaction():
@@ -86,7 +101,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_name=include_name
         )
 
         with context.begin_transaction():
@@ -0,0 +1,32 @@
+"""Keyset pagination indexes
+
+Revision ID: 3f9a1c2d7b4e
+Revises: cc0660e4f28e
+Create Date: 2026-10-18 09:12:40.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2d7b4e'
+down_revision: Union[str, Sequence[str], None] = 'cc0660e4f28e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY can't run inside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_pieces_created_at_id', 'pieces', ['created_at', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_created_at_id', table_name='users', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_pieces_created_at_id', table_name='pieces', postgresql_concurrently=True, if_exists=True)
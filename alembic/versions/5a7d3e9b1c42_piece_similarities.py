@@ -0,0 +1,42 @@
+"""Co-like neighbours per piece for recommendations
+
+Revision ID: 5a7d3e9b1c42
+Revises: e91b6f3a0d27
+Create Date: 2026-10-18 22:04:37.512938
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a7d3e9b1c42'
+down_revision: Union[str, Sequence[str], None] = 'e91b6f3a0d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Empty until `novelnest build-recommendations` runs
+    op.create_table(
+        'piece_similarities',
+        sa.Column('piece_id', sa.Integer(), nullable=False),
+        sa.Column('similar_piece_id', sa.Integer(), nullable=False),
+        sa.Column('co_likes', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['piece_id'], ['pieces.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['similar_piece_id'], ['pieces.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('piece_id', 'similar_piece_id'),
+    )
+    op.create_index('ix_piece_similarities_piece_id_score', 'piece_similarities', ['piece_id', sa.text('score DESC'), 'similar_piece_id'], unique=False)
+    op.create_index('ix_piece_similarities_similar_piece_id', 'piece_similarities', ['similar_piece_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_piece_similarities_similar_piece_id', table_name='piece_similarities')
+    op.drop_index('ix_piece_similarities_piece_id_score', table_name='piece_similarities')
+    op.drop_table('piece_similarities')
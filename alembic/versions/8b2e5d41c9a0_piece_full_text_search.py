@@ -0,0 +1,46 @@
+"""Piece full-text and trigram search
+
+Revision ID: 8b2e5d41c9a0
+Revises: 3f9a1c2d7b4e
+Create Date: 2026-10-18 10:02:15.402871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e5d41c9a0'
+down_revision: Union[str, Sequence[str], None] = '3f9a1c2d7b4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Stored generated column: Postgres keeps it in sync with title/description on every write
+    op.add_column('pieces', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_pieces_search_vector', 'pieces', ['search_vector'], unique=False, postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_pieces_title_trgm', 'pieces', ['title'], unique=False, postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_pieces_title_trgm', table_name='pieces', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_pieces_search_vector', table_name='pieces', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('pieces', 'search_vector')
@@ -0,0 +1,146 @@
+"""Hash-partition likes by piece_id
+
+Revision ID: b7e4a2c9d315
+Revises: 5a7d3e9b1c42
+Create Date: 2026-10-19 09:12:48.630514
+
+Online: likes stays readable and writable while its rows are copied into
+likes_new in keyset batches, each in its own transaction, and a trigger
+mirrors every write made meanwhile. Only the final swap takes a lock on
+likes. Tune with -x, e.g.
+
+    alembic -x likes_partitions=64 -x likes_batch_size=20000 upgrade head
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e4a2c9d315'
+down_revision: Union[str, Sequence[str], None] = '5a7d3e9b1c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+log = logging.getLogger(f"alembic.{revision}")
+
+PARTITIONS = 32
+BATCH_SIZE = 50_000
+INDEXES = {'ix_likes_piece_id_user_id': ('piece_id', 'user_id'), 'ix_likes_created_at': ('created_at',)}
+
+MIRROR_FUNCTION = """
+    CREATE FUNCTION likes_copy_mirror() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            DELETE FROM likes_new WHERE user_id = OLD.user_id AND piece_id = OLD.piece_id;
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            INSERT INTO likes_new (user_id, piece_id, created_at) VALUES (NEW.user_id, NEW.piece_id, NEW.created_at)
+            ON CONFLICT (user_id, piece_id) DO UPDATE SET created_at = EXCLUDED.created_at;
+        END IF;
+        RETURN NULL;
+    END $$
+"""
+# FOR SHARE makes a concurrent DELETE of a row in the batch wait for the batch to commit, so the
+# mirror trigger then finds the copy and removes it; rows the trigger already copied are skipped
+COPY_BATCH = sa.text("""
+    WITH batch AS (
+        SELECT user_id, piece_id, created_at FROM likes
+        WHERE (user_id, piece_id) > (:user_id, :piece_id)
+        ORDER BY user_id, piece_id LIMIT :batch_size
+        FOR SHARE
+    ), copied AS (
+        INSERT INTO likes_new (user_id, piece_id, created_at) SELECT * FROM batch ON CONFLICT DO NOTHING
+    )
+    SELECT user_id, piece_id FROM batch ORDER BY user_id DESC, piece_id DESC LIMIT 1
+""")
+TRENDING_VIEW = (
+    "CREATE MATERIALIZED VIEW {name} AS "
+    "SELECT piece_id, count(*) AS recent_likes FROM likes_new "
+    "WHERE created_at > now() - interval '7 days' GROUP BY piece_id"
+)
+
+
+def _create_likes_new(partitions: int) -> None:
+    """likes_new with the likes columns and keys, hash-partitioned on piece_id unless `partitions` is 0."""
+    op.create_table(
+        'likes_new',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('piece_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        # Constraint names are per table, so the foreign keys can take their final names now
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='likes_user_id_fkey', ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['piece_id'], ['pieces.id'], name='likes_piece_id_fkey', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'piece_id', name='likes_new_pkey'),
+        **({'postgresql_partition_by': 'HASH (piece_id)'} if partitions else {}),
+    )
+    for remainder in range(partitions):
+        op.execute(f"CREATE TABLE likes_p{remainder:02d} PARTITION OF likes_new FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})")
+
+
+def _copy_likes(batch_size: int) -> None:
+    bind = op.get_bind()
+    last, copied = (0, 0), 0
+    while (row := bind.execute(COPY_BATCH, {"user_id": last[0], "piece_id": last[1], "batch_size": batch_size}).first()) is not None:
+        last, copied = tuple(row), copied + batch_size
+        if copied % (batch_size * 20) == 0:
+            log.info("Copied about %d likes, up to user %d", copied, last[0])
+
+
+def _create_indexes(partitions: int) -> None:
+    """The secondary indexes, built after the copy without blocking the mirror trigger's writes."""
+    for name, columns in INDEXES.items():
+        temporary = name.replace('ix_likes_', 'ix_likes_new_')
+        if not partitions:
+            op.create_index(temporary, 'likes_new', list(columns), postgresql_concurrently=True)
+            continue
+        # CONCURRENTLY doesn't work on a partitioned table: build each partition's index, then attach it
+        op.execute(f"CREATE INDEX {temporary} ON ONLY likes_new ({', '.join(columns)})")
+        for remainder in range(partitions):
+            partition = f"likes_p{remainder:02d}"
+            op.execute(f"CREATE INDEX CONCURRENTLY {partition}_{'_'.join(columns)}_idx ON {partition} ({', '.join(columns)})")
+            op.execute(f"ALTER INDEX {temporary} ATTACH PARTITION {partition}_{'_'.join(columns)}_idx")
+
+
+def _rebuild_likes(partitions: int) -> None:
+    """Replace likes with a copy that is hash-partitioned into `partitions`, or a plain table for 0."""
+    batch_size = int(context.get_x_argument(as_dictionary=True).get('likes_batch_size', BATCH_SIZE))
+    _create_likes_new(partitions)
+    op.execute(MIRROR_FUNCTION)
+    op.execute("CREATE TRIGGER likes_copy_mirror AFTER INSERT OR UPDATE OR DELETE ON likes FOR EACH ROW EXECUTE FUNCTION likes_copy_mirror()")
+
+    with op.get_context().autocommit_block():
+        _copy_likes(batch_size)
+        _create_indexes(partitions)
+        op.execute("ANALYZE likes_new")
+        # Built ahead of the swap so the lock isn't held while it is computed; a refresh catches it up
+        op.execute(TRENDING_VIEW.format(name='trending_pieces_new'))
+        op.execute("CREATE UNIQUE INDEX ix_trending_pieces_new_piece_id ON trending_pieces_new (piece_id)")
+        op.execute("CREATE INDEX ix_trending_pieces_new_recent_likes ON trending_pieces_new (recent_likes DESC, piece_id)")
+
+    # The swap: one short transaction, given up rather than queueing every request behind a long one
+    op.execute("SET LOCAL lock_timeout = '10s'")
+    op.execute("LOCK TABLE likes IN ACCESS EXCLUSIVE MODE")
+    op.execute("DROP MATERIALIZED VIEW trending_pieces")
+    op.execute("DROP TABLE likes")
+    op.execute("DROP FUNCTION likes_copy_mirror()")
+    op.rename_table('likes_new', 'likes')
+    op.execute("ALTER INDEX likes_new_pkey RENAME TO likes_pkey")
+    for name in INDEXES:
+        op.execute(f"ALTER INDEX {name.replace('ix_likes_', 'ix_likes_new_')} RENAME TO {name}")
+    op.execute("ALTER MATERIALIZED VIEW trending_pieces_new RENAME TO trending_pieces")
+    op.execute("ALTER INDEX ix_trending_pieces_new_piece_id RENAME TO ix_trending_pieces_piece_id")
+    op.execute("ALTER INDEX ix_trending_pieces_new_recent_likes RENAME TO ix_trending_pieces_recent_likes")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _rebuild_likes(int(context.get_x_argument(as_dictionary=True).get('likes_partitions', PARTITIONS)))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rebuild_likes(0)
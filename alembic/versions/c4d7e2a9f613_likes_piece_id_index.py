@@ -0,0 +1,30 @@
+"""Index likes by piece_id
+
+Revision ID: c4d7e2a9f613
+Revises: 8b2e5d41c9a0
+Create Date: 2026-10-18 11:20:53.774016
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d7e2a9f613'
+down_revision: Union[str, Sequence[str], None] = '8b2e5d41c9a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The (user_id, piece_id) primary key can't serve per-piece lookups
+    with op.get_context().autocommit_block():
+        op.create_index('ix_likes_piece_id_user_id', 'likes', ['piece_id', 'user_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_likes_piece_id_user_id', table_name='likes', postgresql_concurrently=True, if_exists=True)
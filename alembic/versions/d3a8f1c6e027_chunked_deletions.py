@@ -0,0 +1,50 @@
+"""Soft-deleted users and pieces and their deletion jobs
+
+Revision ID: d3a8f1c6e027
+Revises: b7e4a2c9d315
+Create Date: 2026-10-19 16:40:12.208731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a8f1c6e027'
+down_revision: Union[str, Sequence[str], None] = 'b7e4a2c9d315'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable without a default: a catalog-only change, no table rewrite
+    op.add_column('users', sa.Column('deleted_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.add_column('pieces', sa.Column('deleted_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.create_table(
+        'deletion_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.Enum('USER', 'PIECE', name='deletionkind'), nullable=False),
+        sa.Column('target_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'DONE', name='deletionstatus'), server_default='PENDING', nullable=False),
+        sa.Column('likes_total', sa.BigInteger(), nullable=True),
+        sa.Column('likes_deleted', sa.BigInteger(), server_default=sa.text('0'), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_deletion_jobs_unfinished', 'deletion_jobs', ['id'], unique=False, postgresql_where=sa.text('finished_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_deletion_jobs_unfinished', table_name='deletion_jobs', postgresql_where=sa.text('finished_at IS NULL'))
+    op.drop_table('deletion_jobs')
+    sa.Enum(name='deletionstatus').drop(op.get_bind(), checkfirst=False)
+    sa.Enum(name='deletionkind').drop(op.get_bind(), checkfirst=False)
+    op.drop_column('pieces', 'deleted_at')
+    op.drop_column('users', 'deleted_at')
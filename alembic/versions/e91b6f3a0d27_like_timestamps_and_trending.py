@@ -0,0 +1,46 @@
+"""Like timestamps, top pieces index and trending view
+
+Revision ID: e91b6f3a0d27
+Revises: c4d7e2a9f613
+Create Date: 2026-10-18 13:41:07.219583
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e91b6f3a0d27'
+down_revision: Union[str, Sequence[str], None] = 'c4d7e2a9f613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing likes have no known time: give them a constant (no table rewrite) old enough to stay out
+    # of the trending window, then stamp new rows with now()
+    op.add_column('likes', sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.text("'1970-01-01 00:00:00+00'")))
+    op.alter_column('likes', 'created_at', server_default=sa.text('now()'))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_likes_created_at', 'likes', ['created_at'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_pieces_num_of_likes_id', 'pieces', [sa.text('num_of_likes DESC'), 'id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+    op.execute(
+        "CREATE MATERIALIZED VIEW IF NOT EXISTS trending_pieces AS "
+        "SELECT piece_id, count(*) AS recent_likes FROM likes "
+        "WHERE created_at > now() - interval '7 days' GROUP BY piece_id"
+    )
+    # The unique index is what REFRESH ... CONCURRENTLY diffs against
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_trending_pieces_piece_id ON trending_pieces (piece_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_trending_pieces_recent_likes ON trending_pieces (recent_likes DESC, piece_id)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS trending_pieces")
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_pieces_num_of_likes_id', table_name='pieces', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_likes_created_at', table_name='likes', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('likes', 'created_at')
@@ -0,0 +1,102 @@
+"""Rows/sec for the bulk importer versus one POST /pieces/ per row.
+
+Generates synthetic rows in memory and feeds them to the same code path as
+POST /pieces/import and POST /users/import, in-process against the
+configured database (.env). User imports are bounded by bcrypt, so compare
+them across BCRYPT_ROUNDS and PASSWORD_WORKERS values.
+
+    python benchmarks/bulk_import.py --pieces 100000 --users 2000 --baseline 2000 --format csv
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import httpx  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from novelnest.core import OAuth2, bulk_import, database, passwords  # noqa: E402
+from novelnest.main import app  # noqa: E402
+
+PREFIX = "bulk-"
+
+
+def encode(rows, fmt):
+    if fmt == "ndjson":
+        return "".join(json.dumps(row) + "\n" for row in rows).encode()
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode()
+
+
+async def stream(body, size=1 << 16):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def cleanup():
+    with database.engine.begin() as conn:
+        conn.execute(text("DELETE FROM pieces WHERE title LIKE :p"), {"p": PREFIX + "%"})
+        conn.execute(text("DELETE FROM users WHERE username LIKE :p"), {"p": PREFIX + "%"})
+
+
+async def timed_import(kind, rows, args):
+    body = encode(rows, args.format)
+    start = time.perf_counter()
+    result = await bulk_import.import_rows(kind, stream(body), args.format, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"import {kind:<7} {result.imported:>8} rows  {result.imported / elapsed:>10.0f} rows/s  ({result.failed} rejected)")
+
+
+async def baseline(count):
+    with database.engine.begin() as conn:
+        admin_id = conn.execute(text(
+            "INSERT INTO users (username, email, password, role) VALUES (:u, :e, 'x', 'ADMIN') RETURNING id"
+        ), {"u": PREFIX + "admin", "e": PREFIX + "admin@example.com"}).scalar_one()
+    headers = {"Authorization": f"Bearer {OAuth2.create_access_token(data={'user_id': admin_id})}"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        start = time.perf_counter()
+        for i in range(count):
+            response = await client.post("/pieces/", json={"title": f"{PREFIX}post-{i}", "description": "baseline"}, headers=headers)
+            response.raise_for_status()
+        elapsed = time.perf_counter() - start
+    print(f"POST /pieces/ {count:>8} rows  {count / elapsed:>10.0f} rows/s  (one request and commit per row)")
+
+
+async def run(args):
+    cleanup()
+    try:
+        if args.pieces:
+            await timed_import("pieces", [{"title": f"{PREFIX}{i}", "description": f"Synthetic piece number {i}"} for i in range(args.pieces)], args)
+        if args.users:
+            await timed_import("users", [{"username": f"{PREFIX}{i}", "email": f"{PREFIX}{i}@example.com", "password": f"password-{i}"} for i in range(args.users)], args)
+        if args.baseline:
+            await baseline(args.baseline)
+    finally:
+        cleanup()
+        await database.async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pieces", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--baseline", type=int, default=1000, help="Rows to send through POST /pieces/ for comparison")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    try:
+        asyncio.run(run(parser.parse_args()))
+    finally:
+        passwords.pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
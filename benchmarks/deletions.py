@@ -0,0 +1,177 @@
+"""Deleting a heavy user in one transaction versus a soft delete and the chunked job.
+
+Seeds --pieces pieces and three users who each like --likes of them, then
+deletes one with a single DELETE (what DELETE /users/{id} used to run,
+cascading to every like and leaving num_of_likes stale), one in a single
+transaction that also takes its likes off num_of_likes, and the last through
+a soft delete and deletions.run_deletions. Meanwhile other users keep toggling
+likes on the heavy users' pieces, as the app's toggle statement does, and the
+toggle latency is reported for each approach along with how long the request
+itself took and how long until the user was gone. Runs directly against the
+configured database (.env); seeded rows are named del-bench-*:
+
+    python benchmarks/deletions.py --pieces 200000 --likes 100000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from sqlalchemy import text  # noqa: E402
+
+from novelnest.api.like import toggle_like_statement  # noqa: E402
+from novelnest.core import database, deletions  # noqa: E402
+from novelnest.core.config import settings  # noqa: E402
+from novelnest.schemas.deletion_sc import DeletionKind  # noqa: E402
+
+CLEANUP_SQL = (
+    "DELETE FROM users WHERE username LIKE 'del-bench-%'",
+    "DELETE FROM pieces WHERE title LIKE 'del-bench-%'",
+)
+SEED_USERS_SQL = text("""
+    INSERT INTO users (username, email, password, role)
+    SELECT 'del-bench-' || g, 'del-bench-' || g || '@example.com', 'x', 'USER' FROM generate_series(0, :users) AS g
+""")
+SEED_PIECES_SQL = text("INSERT INTO pieces (title, num_of_likes) SELECT 'del-bench-' || g, 0 FROM generate_series(1, :pieces) AS g")
+SEED_LIKES_SQL = text("""
+    INSERT INTO likes (user_id, piece_id)
+    SELECT u.id, p.id FROM users u
+    CROSS JOIN LATERAL (SELECT id FROM pieces WHERE title LIKE 'del-bench-%' ORDER BY random() LIMIT :likes) AS p
+    WHERE u.username IN ('del-bench-0', 'del-bench-1', 'del-bench-2')
+""")
+RECOUNT_SQL = text("""
+    UPDATE pieces SET num_of_likes = c.n
+    FROM (SELECT piece_id, count(*) AS n FROM likes JOIN users ON users.id = likes.user_id
+          WHERE users.username IN ('del-bench-0', 'del-bench-1', 'del-bench-2') GROUP BY piece_id) AS c
+    WHERE c.piece_id = pieces.id
+""")
+# The whole job in one transaction: every piece the user liked stays locked until it commits
+SINGLE_TRANSACTION_SQL = text("""
+    WITH removed AS (DELETE FROM likes WHERE user_id = :id RETURNING piece_id),
+         decrements AS (SELECT piece_id, count(*) AS n FROM removed GROUP BY piece_id)
+    UPDATE pieces SET num_of_likes = greatest(num_of_likes - decrements.n, 0)
+    FROM decrements WHERE pieces.id = decrements.piece_id
+""")
+
+
+def percentile(samples, q) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1] if len(samples) > 1 else samples[0]
+
+
+async def seed(args) -> tuple:
+    async with database.session_scope() as db:
+        for statement in CLEANUP_SQL:
+            await db.execute(text(statement))
+        await db.execute(SEED_USERS_SQL, {"users": args.togglers + 2})
+        await db.execute(SEED_PIECES_SQL, {"pieces": args.pieces})
+        await db.execute(SEED_LIKES_SQL, {"likes": args.likes})
+        # Fresh statistics, or the recount plans for the tables as they were before seeding
+        await db.execute(text("ANALYZE pieces"))
+        await db.execute(text("ANALYZE likes"))
+        await db.execute(RECOUNT_SQL)
+        await db.commit()
+        users = dict((await db.execute(text("SELECT username, id FROM users WHERE username LIKE 'del-bench-%'"))).all())
+        heavy = [users[f"del-bench-{n}"] for n in range(3)]
+        liked = (await db.scalars(text("SELECT DISTINCT piece_id FROM likes WHERE user_id = ANY(:ids)"), {"ids": heavy})).all()
+    togglers = [users[f"del-bench-{n}"] for n in range(3, args.togglers + 3)]
+    return heavy, togglers, liked
+
+
+async def toggler(user_id: int, pieces, stop: asyncio.Event, timings: list):
+    rng = random.Random(user_id)
+    while not stop.is_set():
+        piece_id = rng.choice(pieces)
+        start = time.perf_counter()
+        async with database.session_scope() as db:
+            for direction in (1, 0):
+                await db.execute(toggle_like_statement(piece_id, user_id, direction))
+                await db.commit()
+        timings.append((time.perf_counter() - start) * 1000)
+
+
+async def measure(delete, togglers, pieces) -> dict:
+    """Run `delete` while the togglers work; returns its timings and the toggles' latency."""
+    stop, timings = asyncio.Event(), []
+    tasks = [asyncio.create_task(toggler(user_id, pieces, stop, timings)) for user_id in togglers]
+    await asyncio.sleep(1)
+    baseline = len(timings)
+    start = time.perf_counter()
+    request = await delete()
+    done = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*tasks)
+    during = timings[baseline:] or timings
+    return {
+        "request_ms": request * 1000,
+        "done_s": done,
+        "toggle_p50_ms": statistics.median(during),
+        "toggle_p99_ms": percentile(during, 99),
+        "toggle_max_ms": max(during),
+    }
+
+
+async def run(args) -> dict:
+    (plain_user, transaction_user, chunked_user), togglers, pieces = await seed(args)
+    print(f"seeded 3 users with {args.likes:,} likes each over {args.pieces:,} pieces", flush=True)
+
+    async def single_delete():
+        start = time.perf_counter()
+        async with database.session_scope() as db:
+            await db.execute(text("DELETE FROM users WHERE id = :id"), {"id": plain_user})
+            await db.commit()
+        return time.perf_counter() - start
+
+    async def transaction_delete():
+        start = time.perf_counter()
+        async with database.session_scope() as db:
+            await db.execute(SINGLE_TRANSACTION_SQL, {"id": transaction_user})
+            await db.execute(text("DELETE FROM users WHERE id = :id"), {"id": transaction_user})
+            await db.commit()
+        return time.perf_counter() - start
+
+    async def chunked_delete():
+        start = time.perf_counter()
+        async with database.session_scope() as db:
+            await db.scalar(deletions.soft_delete_statement(DeletionKind.USER, chunked_user))
+            await db.commit()
+        request = time.perf_counter() - start
+        while await deletions.run_chunk(args.chunk_size):
+            await asyncio.sleep(args.pause)
+        return request
+
+    try:
+        return {
+            "single DELETE": await measure(single_delete, togglers, pieces),
+            "one transaction": await measure(transaction_delete, togglers, pieces),
+            "soft + chunked": await measure(chunked_delete, togglers, pieces),
+        }
+    finally:
+        async with database.session_scope() as db:
+            for statement in CLEANUP_SQL:
+                await db.execute(text(statement))
+            await db.commit()
+        await database.dispose_engines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pieces", type=int, default=200_000)
+    parser.add_argument("--likes", type=int, default=100_000, help="likes of each heavy user")
+    parser.add_argument("--togglers", type=int, default=8, help="concurrent users liking and unliking the heavy users' pieces")
+    parser.add_argument("--chunk-size", type=int, default=settings.deletion_chunk_size)
+    parser.add_argument("--pause", type=float, default=settings.deletion_chunk_pause_seconds, help="seconds between chunks")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"{'approach':<16} {'request ms':>11} {'gone after s':>13} {'toggle p50/p99/max ms':>24}")
+    for name, r in results.items():
+        print(f"{name:<16} {r['request_ms']:11.1f} {r['done_s']:13.2f} {r['toggle_p50_ms']:8.1f} /{r['toggle_p99_ms']:7.1f} /{r['toggle_max_ms']:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Like/unlike throughput on a single hot piece through the HTTP API.
+
+Seeds --users users and one piece in the configured database (.env), mints
+tokens for them directly, then every client alternates like/unlike on the
+same piece. Compare runs with LIKE_BUFFER_ENABLED=false and =true on the
+server:
+
+    python benchmarks/hot_piece.py --url http://127.0.0.1:8000 --users 256 --duration 20
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import httpx  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from novelnest.core import OAuth2  # noqa: E402
+from novelnest.core.database import engine  # noqa: E402
+
+PREFIX = "hot-"
+
+
+def seed(users):
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM users WHERE username LIKE :p"), {"p": PREFIX + "%"})
+        conn.execute(text("DELETE FROM pieces WHERE title = :t"), {"t": PREFIX + "piece"})
+        user_ids = conn.execute(text(
+            "INSERT INTO users (username, email, password, role) "
+            "SELECT :p || g, :p || g || '@example.com', 'x', 'USER' FROM generate_series(1, :n) g RETURNING id"
+        ), {"p": PREFIX, "n": users}).scalars().all()
+        piece_id = conn.execute(text("INSERT INTO pieces (title, num_of_likes) VALUES (:t, 0) RETURNING id"), {"t": PREFIX + "piece"}).scalar_one()
+    return user_ids, piece_id
+
+
+async def client_loop(client, token, piece_id, deadline, counts):
+    headers = {"Authorization": f"Bearer {token}"}
+    direction = 1
+    while time.perf_counter() < deadline:
+        response = await client.post("/likes/", json={"piece_id": piece_id, "direction": direction}, headers=headers)
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+        direction = 1 - direction
+
+
+async def run(args):
+    user_ids, piece_id = seed(args.users)
+    tokens = [OAuth2.create_access_token(data={"user_id": user_id}) for user_id in user_ids]
+    counts = {}
+    limits = httpx.Limits(max_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(*(client_loop(client, token, piece_id, deadline, counts) for token in tokens))
+        count = (await client.get(f"/pieces/{piece_id}")).json()["num_of_likes"]
+
+    total = sum(counts.values())
+    print(f"toggles/sec   {total / args.duration:.1f}")
+    print(f"statuses      {dict(sorted(counts.items()))}")
+    with engine.connect() as conn:
+        actual = conn.execute(text("SELECT count(*) FROM likes WHERE piece_id = :id"), {"id": piece_id}).scalar_one()
+    print(f"num_of_likes  {count} (likes rows: {actual})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=256)
+    parser.add_argument("--duration", type=float, default=20.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Overhead of the request instrumentation, in-process.
+
+Measures the pieces separately so the numbers don't drown in database noise:
+route resolution against the real app's routes, the engine listeners called
+directly per statement, a SELECT 1 loop on the configured database (.env)
+with and without the listeners, and a small FastAPI route called directly
+as an ASGI app with and without InstrumentationMiddleware:
+
+    python benchmarks/instrumentation.py --requests 20000 --statements 5000
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy import event, text  # noqa: E402
+
+from novelnest.core import database, instrumentation  # noqa: E402
+from novelnest.main import app as novelnest_app  # noqa: E402
+
+SCOPE = {
+    "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+    "path": "/ping", "raw_path": b"/ping", "root_path": "", "query_string": b"", "headers": [(b"host", b"bench")],
+    "client": ("10.0.0.1", 50000), "server": ("bench", 80),
+}
+
+
+def per_call(fn, count) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - start) / count
+
+
+def route_resolution(args) -> float:
+    middleware = instrumentation.InstrumentationMiddleware(None)
+    # A late route, so the alternation has to skip most of the table
+    scope = {"app": novelnest_app, "method": "GET", "path": "/users/123"}
+    return per_call(lambda: middleware.route_of(scope), args.requests)
+
+
+def listener_calls(args) -> float:
+    class Context:
+        pass
+
+    context = Context()
+
+    def statement():
+        instrumentation.before_cursor_execute(None, None, "SELECT 1", None, context, False)
+        instrumentation.after_cursor_execute(None, None, "SELECT 1", None, context, False)
+
+    token = instrumentation.current_request.set(instrumentation.RequestStats("GET", "/ping"))
+    try:
+        return per_call(statement, args.statements)
+    finally:
+        instrumentation.current_request.reset(token)
+
+
+def select_loop(args) -> tuple[float, float]:
+    """Median SELECT 1 time without and with the listeners; rounds alternate so drift hits both alike."""
+    samples = {False: [], True: []}
+    per_round = args.statements // args.rounds
+    with database.engine.connect() as conn:
+        for _ in range(args.rounds):
+            for listening in samples:
+                if listening:
+                    instrumentation.instrument_engines()
+                else:
+                    for name in ("before_cursor_execute", "after_cursor_execute"):
+                        if event.contains(database.engine, name, getattr(instrumentation, name)):
+                            event.remove(database.engine, name, getattr(instrumentation, name))
+                samples[listening].append(per_call(lambda: conn.execute(text("SELECT 1")), per_round))
+    return statistics.median(samples[False]), statistics.median(samples[True])
+
+
+def make_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {}
+
+    if instrumented:
+        app.add_middleware(instrumentation.InstrumentationMiddleware)
+    return app
+
+
+async def call(app):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(dict(SCOPE), receive, send)
+
+
+async def route_costs(args) -> tuple[float, float]:
+    apps = {False: make_app(False), True: make_app(True)}
+    samples = {False: [], True: []}
+    per_round = args.requests // args.rounds
+    for _ in range(args.rounds):
+        for instrumented, app in apps.items():
+            start = time.perf_counter()
+            for _ in range(per_round):
+                await call(app)
+            samples[instrumented].append((time.perf_counter() - start) / per_round)
+    return statistics.median(samples[False]), statistics.median(samples[True])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--statements", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"route resolution            {route_resolution(args) * 1e6:8.2f} us/request")
+    print(f"cursor listeners            {listener_calls(args) * 1e6:8.2f} us/statement")
+    plain, listened = select_loop(args)
+    print(f"SELECT 1 without listeners  {plain * 1e6:8.2f} us/statement")
+    print(f"SELECT 1 with listeners     {listened * 1e6:8.2f} us/statement")
+    plain, instrumented = asyncio.run(route_costs(args))
+    print(f"route without middleware    {plain * 1e6:8.2f} us/request")
+    print(f"route with middleware       {instrumented * 1e6:8.2f} us/request")
+    print(f"middleware overhead         {(instrumented - plain) * 1e6:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Idle SSE subscribers and like-count fan-out, in-process against the configured database.
+
+Opens --subscribers GET /pieces/{id}/events streams straight through the ASGI
+app (no sockets), spread over --pieces pieces with --hot-share of them on one
+hot piece, and reports what they cost while idle: memory and event-loop lag.
+Then bumps the hot piece's counter --rate times a second for --seconds, as
+toggle_like does, and reports events per stream per second and the delay
+from a counter update to each stream's event. Run once per backend:
+
+    python benchmarks/live_counts.py --subscribers 10000
+    LIVE_COUNTS_BACKEND=postgres python benchmarks/live_counts.py --subscribers 10000
+"""
+import argparse
+import asyncio
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from sqlalchemy import text  # noqa: E402
+
+from novelnest.core import database  # noqa: E402
+from novelnest.core.config import settings  # noqa: E402
+from novelnest.core.live_counts import live_counts  # noqa: E402
+from novelnest.main import app  # noqa: E402
+
+
+class Stream:
+    """One subscriber driven straight through the ASGI app."""
+
+    def __init__(self, piece_id: int, disconnect: asyncio.Event, updated_at: dict):
+        self.piece_id = piece_id
+        self.disconnect = disconnect
+        self.updated_at = updated_at
+        self.connected = asyncio.Event()
+        self.delays = []
+        self._requested = False
+
+    async def receive(self):
+        if not self._requested:
+            self._requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] != "http.response.body":
+            return
+        body = message.get("body", b"")
+        if b"like_count" in body:
+            self.connected.set()
+            count = int(body.rsplit(b'"like_count": ', 1)[1].split(b"}", 1)[0])
+            updated = self.updated_at.get(count)
+            if updated is not None:
+                self.delays.append(time.perf_counter() - updated)
+
+    async def run(self):
+        path = f"/pieces/{self.piece_id}/events"
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [(b"host", b"bench")],
+            "client": ("10.0.0.1", 50000), "server": ("bench", 80),
+        }
+        await app(scope, self.receive, self.send)
+
+
+def rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def loop_lag(seconds: float) -> list:
+    """How late 10 ms sleeps wake up, in ms."""
+    lags = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append((time.perf_counter() - start - 0.01) * 1000)
+    return lags
+
+
+def percentile(samples, q) -> float:
+    return statistics.quantiles(samples, n=100)[q - 1] if len(samples) > 1 else (samples or [0])[0]
+
+
+async def run(args):
+    with database.engine.begin() as conn:
+        piece_ids = conn.execute(
+            text("INSERT INTO pieces (title, num_of_likes) SELECT 'Live ' || g, 0 FROM generate_series(1, :n) AS g RETURNING id"),
+            {"n": args.pieces},
+        ).scalars().all()
+    hot = piece_ids[0]
+    live_counts.broadcaster.max_subscribers = max(live_counts.broadcaster.max_subscribers, args.subscribers)
+    disconnect, updated_at = asyncio.Event(), {}
+
+    async with app.router.lifespan_context(app):
+        idle_lag = await loop_lag(1)
+        before = rss_mib()
+        start = time.perf_counter()
+        hot_streams = int(args.subscribers * args.hot_share)
+        streams = [Stream(hot if i < hot_streams else piece_ids[1 + i % (len(piece_ids) - 1)], disconnect, updated_at) for i in range(args.subscribers)]
+        tasks = [asyncio.create_task(stream.run()) for stream in streams]
+        for stream in streams:
+            await stream.connected.wait()
+        opened = time.perf_counter() - start
+        lag = await loop_lag(args.idle)
+        print(
+            f"{args.subscribers} streams ({live_counts.backend.__class__.__name__}) open in {opened:.2f} s, "
+            f"+{(rss_mib() - before) * 1024 / args.subscribers:.1f} KiB each; "
+            f"10 ms timer lag p99 {percentile(idle_lag, 99):.2f} ms without streams, {percentile(lag, 99):.2f} ms with them idle"
+        )
+
+        # Storm: the counter moves --rate times a second, as toggle_like does
+        count, storm_start = 0, time.perf_counter()
+        async with database.session_scope() as db:
+            while time.perf_counter() - storm_start < args.seconds:
+                count = await db.scalar(text("UPDATE pieces SET num_of_likes = num_of_likes + 1 WHERE id = :id RETURNING num_of_likes"), {"id": hot})
+                await db.commit()
+                updated_at[count] = time.perf_counter()
+                live_counts.touch(hot)
+                await asyncio.sleep(max(0, storm_start + count / args.rate - time.perf_counter()))
+        storm = time.perf_counter() - storm_start
+        await asyncio.sleep(settings.live_counts_interval_seconds * 3)  # let the last events arrive
+
+        delays = [delay * 1000 for stream in streams[:hot_streams] for delay in stream.delays]
+        events = len(delays) / max(hot_streams, 1) / storm
+        print(
+            f"{count} likes in {storm:.1f} s on a piece with {hot_streams} streams: {events:.2f} events/s per stream "
+            f"(LIVE_COUNTS_INTERVAL_SECONDS={settings.live_counts_interval_seconds}), "
+            f"update to event p50 {percentile(delays, 50):.0f} ms, p99 {percentile(delays, 99):.0f} ms"
+        )
+
+        disconnect.set()
+        await asyncio.gather(*tasks)
+
+    with database.engine.begin() as conn:
+        conn.execute(text("DELETE FROM pieces WHERE id = ANY(:ids)"), {"ids": piece_ids})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--pieces", type=int, default=100, help="pieces the streams watch, created for the run")
+    parser.add_argument("--hot-share", type=float, default=0.5, help="share of the streams on the hot piece")
+    parser.add_argument("--idle", type=float, default=5, help="seconds to measure the idle streams")
+    parser.add_argument("--rate", type=float, default=200, help="likes per second on the hot piece")
+    parser.add_argument("--seconds", type=float, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Closed-loop HTTP load generator for a running NovelNest server.
+
+Start the API once with DB_ASYNC=true and once with DB_ASYNC=false, then run:
+
+    python benchmarks/load.py --url http://127.0.0.1:8000 --concurrency 64 --duration 20
+
+and compare the requests/sec lines. Authenticated paths are exercised when
+--username/--password are given.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def worker(client, paths, deadline, latencies, errors, headers):
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = await client.get(path, headers=headers)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def login(client, username, password):
+    response = await client.post("/login", data={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def run(args):
+    paths = args.path or ["/pieces/?limit=20", "/pieces/1", "/likes/count/1", "/users/1"]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        headers = {}
+        if args.username:
+            headers = await login(client, args.username, args.password)
+            paths = paths + ["/likes/my-likes"]
+
+        latencies, errors = [], []
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, paths, deadline, latencies, errors, headers) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    print(f"requests      {len(latencies)}")
+    print(f"errors        {len(errors)}")
+    print(f"requests/sec  {len(latencies) / elapsed:.1f}")
+    if latencies:
+        print(f"mean ms       {statistics.mean(latencies) * 1000:.2f}")
+        for pct in (50, 95, 99):
+            print(f"p{pct} ms        {percentile(latencies, pct) * 1000:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--path", action="append", help="GET path to hit, may be repeated")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Latency of GET /pieces/ while logins hammer the server in parallel.
+
+    python benchmarks/login_storm.py --url http://127.0.0.1:8000 --username alice --password secret
+
+Run it before and after changing PASSWORD_WORKERS/PASSWORD_QUEUE_SIZE (or
+against an older commit) and compare the reader p99. Logins refused with
+503 by the password pool are counted separately.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from load import percentile
+
+
+async def reader(client, deadline, latencies):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/pieces/", params={"limit": 20})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+
+async def login_loop(client, deadline, username, password, outcomes):
+    while time.perf_counter() < deadline:
+        response = await client.post("/login", data={"username": username, "password": password})
+        outcomes[response.status_code] = outcomes.get(response.status_code, 0) + 1
+        if response.status_code == 503:
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.readers + args.logins)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        latencies, outcomes = [], {}
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(
+            *(reader(client, deadline, latencies) for _ in range(args.readers)),
+            *(login_loop(client, deadline, args.username, args.password, outcomes) for _ in range(args.logins)),
+        )
+
+    print(f"/pieces/ requests  {len(latencies)}")
+    for pct in (50, 95, 99):
+        print(f"/pieces/ p{pct} ms    {percentile(latencies, pct) * 1000:.2f}")
+    for code, count in sorted(outcomes.items()):
+        print(f"/login {code}        {count} ({count / args.duration:.1f}/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Latency versus page depth for offset and cursor pagination.
+
+Offset pages are requested directly at each depth. Cursor pages are walked
+page by page (the only way a client can reach them) and timed when the walk
+passes each depth.
+
+    python benchmarks/pagination.py --url http://127.0.0.1:8000 --path /pieces/ --limit 20 --depth 1 10 100 1000 10000
+"""
+import argparse
+import statistics
+import time
+
+import httpx
+
+
+def timed_get(client, path, params):
+    start = time.perf_counter()
+    response = client.get(path, params=params)
+    response.raise_for_status()
+    return time.perf_counter() - start, response
+
+
+def offset_latency(client, path, limit, depth, repeat):
+    samples = [timed_get(client, path, {"limit": limit, "offset": (depth - 1) * limit})[0] for _ in range(repeat)]
+    return statistics.median(samples)
+
+
+def cursor_latencies(client, path, limit, depths, repeat):
+    results, cursor, current = {}, None, 1
+    wanted = sorted(depths)
+    while wanted:
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        if current == wanted[0]:
+            results[current] = statistics.median(timed_get(client, path, params)[0] for _ in range(repeat))
+            wanted.pop(0)
+        _, response = timed_get(client, path, params)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        current += 1
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/pieces/")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--depth", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with httpx.Client(base_url=args.url, timeout=60) as client:
+        cursor = cursor_latencies(client, args.path, args.limit, args.depth, args.repeat)
+        print(f"{'page':>8} {'offset ms':>10} {'cursor ms':>10}")
+        for depth in sorted(args.depth):
+            offset_ms = offset_latency(client, args.path, args.limit, depth, args.repeat) * 1000
+            cursor_ms = f"{cursor[depth] * 1000:10.2f}" if depth in cursor else f"{'-':>10}"
+            print(f"{depth:>8} {offset_ms:10.2f} {cursor_ms}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Per-piece and per-user like queries on a plain versus a hash-partitioned likes table.
+
+Generates --rows likes (default 100M) over --users and --pieces with a long
+tail of piece popularity into bench_likes_plain, shaped like likes before the
+partitioning migration, and copies them into bench_likes_hash, partitioned by
+piece_id like likes after it. Then times the statements the likes routes run
+on each, through asyncpg prepared statements as the app does, and reports how
+many partitions each one touched. The tables are left in place for --reuse:
+
+    python benchmarks/partitioning.py --rows 100000000
+    python benchmarks/partitioning.py --reuse
+    python benchmarks/partitioning.py --drop
+"""
+import argparse
+import asyncio
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import asyncpg  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from novelnest.core import database  # noqa: E402
+from novelnest.core.config import settings  # noqa: E402
+
+TABLES = ("bench_likes_plain", "bench_likes_hash")
+SCANNED = re.compile(r"Scan (?:using \S+ )?on (bench_likes\w*)")
+GENERATE_BATCH = 5_000_000
+
+CREATE_SQL = """
+    CREATE UNLOGGED TABLE {table} (
+        user_id integer NOT NULL,
+        piece_id integer NOT NULL,
+        created_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (user_id, piece_id)
+    ) {partition_by}
+"""
+# power(random(), 3): a few pieces get most of the likes, as popular ones do
+GENERATE_SQL = text("""
+    INSERT INTO bench_likes_plain (user_id, piece_id, created_at)
+    SELECT 1 + floor(random() * :users)::int, 1 + floor(power(random(), 3) * :pieces)::int, now() - random() * interval '30 days'
+    FROM generate_series(1, :n)
+    ON CONFLICT DO NOTHING
+""")
+
+# name: (statement, parameters from a sampled (user_id, piece_id, piece_ids) triple)
+QUERIES = {
+    "piece page": (
+        "SELECT user_id, piece_id, created_at FROM {table} WHERE piece_id = $1 ORDER BY user_id, piece_id LIMIT 20",
+        lambda user_id, piece_id, piece_ids: (piece_id,),
+    ),
+    "piece count": (
+        "SELECT count(*) FROM {table} WHERE piece_id = $1",
+        lambda user_id, piece_id, piece_ids: (piece_id,),
+    ),
+    "user page": (
+        "SELECT user_id, piece_id, created_at FROM {table} WHERE user_id = $1 ORDER BY user_id, piece_id LIMIT 20",
+        lambda user_id, piece_id, piece_ids: (user_id,),
+    ),
+    "status ANY": (
+        "SELECT piece_id FROM {table} WHERE user_id = $1 AND piece_id = ANY($2::int[])",
+        lambda user_id, piece_id, piece_ids: (user_id, piece_ids),
+    ),
+    "status lateral": (
+        "SELECT l.piece_id FROM unnest($2::int[]) AS a(id) JOIN LATERAL "
+        "(SELECT piece_id FROM {table} WHERE user_id = $1 AND piece_id = a.id LIMIT 1) AS l ON true",
+        lambda user_id, piece_id, piece_ids: (user_id, piece_ids),
+    ),
+    "toggle": (
+        "WITH added AS (INSERT INTO {table} (user_id, piece_id) VALUES ($1, $2) ON CONFLICT DO NOTHING RETURNING 1) "
+        "DELETE FROM {table} WHERE user_id = $1 AND piece_id = $2 AND NOT EXISTS (SELECT 1 FROM added)",
+        lambda user_id, piece_id, piece_ids: (user_id, piece_id),
+    ),
+}
+
+
+def percentile(samples, q) -> float:
+    return statistics.quantiles(samples, n=100)[q - 1] if len(samples) > 1 else samples[0]
+
+
+def build(args):
+    with database.engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table in TABLES:
+            conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        conn.execute(text(CREATE_SQL.format(table="bench_likes_plain", partition_by="")))
+        start = time.perf_counter()
+        for done in range(0, args.rows, GENERATE_BATCH):
+            conn.execute(GENERATE_SQL, {"users": args.users, "pieces": args.pieces, "n": min(GENERATE_BATCH, args.rows - done)})
+            print(f"generated {min(done + GENERATE_BATCH, args.rows):,} likes in {time.perf_counter() - start:.0f} s", flush=True)
+        # Copied in the plain table's physical order, which is insertion order as on a live table
+        conn.execute(text(CREATE_SQL.format(table="bench_likes_hash", partition_by="PARTITION BY HASH (piece_id)")))
+        for remainder in range(args.partitions):
+            conn.execute(text(f"CREATE UNLOGGED TABLE bench_likes_hash_p{remainder:02d} PARTITION OF bench_likes_hash FOR VALUES WITH (MODULUS {args.partitions}, REMAINDER {remainder})"))
+        conn.execute(text("INSERT INTO bench_likes_hash SELECT * FROM bench_likes_plain"))
+        for table in TABLES:
+            conn.execute(text(f"CREATE INDEX ON {table} (piece_id, user_id)"))
+            conn.execute(text(f"CREATE INDEX ON {table} (created_at)"))
+            conn.execute(text(f"VACUUM ANALYZE {table}"))
+        print(f"built both tables in {time.perf_counter() - start:.0f} s", flush=True)
+
+
+def samples(args) -> list:
+    rng = random.Random(0)
+    with database.engine.connect() as conn:
+        # Sampled rows, so pieces come up as often as they are liked, as on a real feed
+        pairs = conn.execute(text(f"SELECT user_id, piece_id FROM bench_likes_plain TABLESAMPLE SYSTEM (1) LIMIT {args.samples}")).all()
+        max_piece = conn.execute(text("SELECT max(piece_id) FROM bench_likes_plain")).scalar()
+    return [(user_id, piece_id, [piece_id] + [rng.randint(1, max_piece) for _ in range(args.status_ids - 1)]) for user_id, piece_id in pairs]
+
+
+def literal(value) -> str:
+    return f"ARRAY[{','.join(map(str, value))}]::int[]" if isinstance(value, list) else str(int(value))
+
+
+async def touched(conn, statement: str, params) -> int:
+    """Tables scanned by one execution of the generic plan, i.e. partitions visited (1 on the plain table).
+
+    EXPLAIN with bind parameters plans them as constants, so this goes through
+    PREPARE/EXECUTE to see the pruning a reused prepared statement gets.
+    """
+    await conn.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+    await conn.execute(f"PREPARE touched AS {statement}")
+    try:
+        plan = await conn.fetch(f"EXPLAIN (ANALYZE, COSTS OFF, TIMING OFF) EXECUTE touched({', '.join(map(literal, params))})")
+    finally:
+        await conn.execute("DEALLOCATE touched")
+    return len({match[1] for (line,) in plan if "never executed" not in line and (match := SCANNED.search(line))})
+
+
+async def run(args, triples) -> dict:
+    # Plain asyncpg, whose cached prepared statements settle on generic plans as the app's do
+    conn = await asyncpg.connect(
+        host=settings.db_hostname, port=int(settings.db_port), user=settings.db_username,
+        password=settings.db_password, database=settings.db_name,
+    )
+    results = {}
+    try:
+        for name, (template, params) in QUERIES.items():
+            for table in TABLES:
+                statement = template.format(table=table)
+                timings = []
+                for triple in triples * args.repeat:
+                    start = time.perf_counter()
+                    await conn.fetch(statement, *params(*triple))
+                    timings.append((time.perf_counter() - start) * 1000)
+                transaction = conn.transaction()
+                await transaction.start()
+                scans = await touched(conn, statement, params(*triples[0]))
+                await transaction.rollback()  # EXPLAIN ANALYZE really runs the toggle, and SET LOCAL ends here
+                results[name, table] = (statistics.median(timings), percentile(timings, 99), scans)
+    finally:
+        await conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000_000)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--pieces", type=int, default=1_000_000)
+    parser.add_argument("--partitions", type=int, default=32)
+    parser.add_argument("--reuse", action="store_true", help="time the tables left by an earlier run instead of generating them")
+    parser.add_argument("--drop", action="store_true", help="drop the benchmark tables and exit")
+    parser.add_argument("--samples", type=int, default=500, help="(user, piece) pairs each query is timed for")
+    parser.add_argument("--status-ids", type=int, default=20, help="piece ids per like-status lookup")
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.drop:
+        with database.engine.begin() as conn:
+            for table in TABLES:
+                conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        return
+    if not args.reuse:
+        build(args)
+    with database.engine.connect() as conn:
+        sizes = {table: conn.execute(text(f"SELECT pg_size_pretty(coalesce(sum(pg_total_relation_size(relid)), pg_total_relation_size('{table}'))) FROM pg_partition_tree('{table}')")).scalar() for table in TABLES}
+        rows = conn.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'bench_likes_plain'")).scalar()
+    print(f"{rows:,} likes; plain {sizes['bench_likes_plain']}, hash-partitioned {sizes['bench_likes_hash']} with indexes")
+
+    results = asyncio.run(run(args, samples(args)))
+    print(f"{'query':<16} {'plain p50/p99 ms':>18} {'hash p50/p99 ms':>18} {'partitions':>11}")
+    for name in QUERIES:
+        plain, hashed = results[name, TABLES[0]], results[name, TABLES[1]]
+        print(f"{name:<16} {plain[0]:8.3f} /{plain[1]:8.3f} {hashed[0]:8.3f} /{hashed[1]:8.3f} {hashed[2]:11d}")
+
+
+if __name__ == "__main__":
+    main()
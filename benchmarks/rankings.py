@@ -0,0 +1,101 @@
+"""Latency of the top and trending queries versus computing them on the fly.
+
+Runs directly against the configured database (.env). "scan" sorts the
+whole pieces table (num_of_likes + 0 defeats the index) and aggregates the
+trending window straight from likes; "indexed" is what /pieces/top and
+/pieces/trending run. Use --seed to add synthetic pieces and likes spread
+over the last 90 days first:
+
+    python benchmarks/rankings.py --seed 1000000 --likes 5000000
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from sqlalchemy import text  # noqa: E402
+
+from novelnest.core.database import engine  # noqa: E402
+
+QUERIES = {
+    "top": (
+        text("SELECT id FROM pieces ORDER BY num_of_likes + 0 DESC, id LIMIT 20"),
+        text("SELECT id FROM pieces ORDER BY num_of_likes DESC, id LIMIT 20"),
+    ),
+    "trending": (
+        text("""
+            SELECT piece_id, count(*) AS recent_likes FROM likes
+            WHERE created_at > now() - interval '7 days'
+            GROUP BY piece_id ORDER BY recent_likes DESC, piece_id LIMIT 20
+        """),
+        text("""
+            SELECT p.id, t.recent_likes FROM trending_pieces t JOIN pieces p ON p.id = t.piece_id
+            ORDER BY t.recent_likes DESC, t.piece_id LIMIT 20
+        """),
+    ),
+}
+SEED_USERS_SQL = text("""
+    INSERT INTO users (username, email, password, role)
+    SELECT 'rank-' || g, 'rank-' || g || '@example.com', 'x', 'USER' FROM generate_series(1, :users) AS g
+    ON CONFLICT DO NOTHING
+""")
+SEED_PIECES_SQL = text("INSERT INTO pieces (title, num_of_likes) SELECT 'Ranked ' || g, 0 FROM generate_series(1, :rows) AS g")
+# Skewed towards low piece ids so there is a clear top; created_at spread over 90 days
+SEED_LIKES_SQL = text("""
+    INSERT INTO likes (user_id, piece_id, created_at)
+    SELECT u.id, p.id, now() - random() * interval '90 days'
+    FROM (SELECT (SELECT min(id) FROM users WHERE username LIKE 'rank-%') + (random() * (:users - 1))::int AS user_offset,
+                 (SELECT max(id) FROM pieces) - (power(random(), 3) * (:pieces - 1))::int AS piece_id
+          FROM generate_series(1, :likes)) AS g
+    JOIN users u ON u.id = g.user_offset
+    JOIN pieces p ON p.id = g.piece_id
+    ON CONFLICT DO NOTHING
+""")
+RECOUNT_SQL = text("UPDATE pieces SET num_of_likes = c.n FROM (SELECT piece_id, count(*) AS n FROM likes GROUP BY piece_id) AS c WHERE c.piece_id = pieces.id")
+
+
+def timed(conn, statement, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(statement).fetchall()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="insert this many synthetic pieces first")
+    parser.add_argument("--likes", type=int, default=0, help="random likes to add across the seeded pieces")
+    parser.add_argument("--users", type=int, default=10_000, help="synthetic users the likes come from")
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.seed:
+            conn.execute(SEED_USERS_SQL, {"users": args.users})
+            conn.execute(SEED_PIECES_SQL, {"rows": args.seed})
+            if args.likes:
+                conn.execute(SEED_LIKES_SQL, {"users": args.users, "pieces": args.seed, "likes": args.likes})
+                conn.execute(RECOUNT_SQL)
+            conn.execute(text("ANALYZE pieces"))
+            conn.execute(text("ANALYZE likes"))
+
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY trending_pieces"))
+        conn.commit()
+        refresh_ms = (time.perf_counter() - start) * 1000
+        pieces = conn.execute(text("SELECT count(*) FROM pieces")).scalar_one()
+        likes = conn.execute(text("SELECT count(*) FROM likes")).scalar_one()
+        print(f"pieces: {pieces}  likes: {likes}  trending refresh: {refresh_ms:.0f} ms")
+        print(f"{'query':<10} {'scan ms':>10} {'indexed ms':>11}")
+        for name, (scan, indexed) in QUERIES.items():
+            print(f"{name:<10} {timed(conn, scan, args.repeat):10.2f} {timed(conn, indexed, args.repeat):11.2f}")
+
+
+if __name__ == "__main__":
+    main()
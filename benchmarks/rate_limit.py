@@ -0,0 +1,101 @@
+"""Per-request cost of the token bucket rate limiter, in-process.
+
+Times RateLimiter.check on its own with the in-memory backend (spread over
+--keys clients), then the same small FastAPI route called directly as an
+ASGI app with no dependency, a no-op dependency and the rate_limit
+dependency, to separate the limiter from FastAPI's dependency resolution:
+
+    python benchmarks/rate_limit.py --requests 20000 --keys 1000
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from fastapi import Depends, FastAPI, Response  # noqa: E402
+
+from novelnest.core.rate_limit import Limit, MemoryBuckets, RateLimiter, rate_limit, rate_limiter  # noqa: E402
+
+BENCH_LIMIT = "1000000000/1"  # never refuses, so every call takes the full path
+
+
+async def check_cost(args) -> float:
+    limiter = RateLimiter({"bench": BENCH_LIMIT}, MemoryBuckets(args.keys))
+    response = Response()
+    keys = [f"ip:10.0.{i // 256}.{i % 256}" for i in range(args.keys)]
+    start = time.perf_counter()
+    for i in range(args.requests):
+        await limiter.check("bench", keys[i % args.keys], response)
+    return (time.perf_counter() - start) / args.requests
+
+
+async def no_op():
+    pass
+
+
+def make_app(dependency) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/ping", dependencies=[Depends(dependency)] if dependency else [])
+    async def ping():
+        return {}
+
+    return app
+
+
+async def call(app, scope):
+    """Drive one request straight through the ASGI app, so no HTTP client time is counted."""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(dict(scope), receive, send)
+
+
+async def route_costs(variants, args) -> dict:
+    """Median per-request time for each variant; rounds alternate so drift hits all of them alike."""
+    per_round = args.requests // args.rounds
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/ping", "raw_path": b"/ping", "root_path": "", "query_string": b"", "headers": [(b"host", b"bench")],
+        "client": ("10.0.0.1", 50000), "server": ("bench", 80),
+    }
+    apps = {name: make_app(dependency) for name, dependency in variants.items()}
+    samples = {name: [] for name in variants}
+    for _ in range(args.rounds):
+        for name, app in apps.items():
+            start = time.perf_counter()
+            for _ in range(per_round):
+                await call(app, scope)
+            samples[name].append((time.perf_counter() - start) / per_round)
+    return {name: statistics.median(times) for name, times in samples.items()}
+
+
+async def run(args):
+    # rate_limit() only wraps routes the limiter knows about
+    rate_limiter.limits["bench"] = Limit.parse(BENCH_LIMIT)
+    print(f"RateLimiter.check          {await check_cost(args) * 1e6:8.2f} us/call")
+    costs = await route_costs({"no dependency": None, "no-op dependency": no_op, "rate limiter": rate_limit("bench")}, args)
+    for name, cost in costs.items():
+        print(f"route, {name:<19} {cost * 1e6:8.2f} us/request")
+    # FastAPI's own per-dependency cost is paid by any Depends(); the rest is the limiter
+    print(f"limiter over no-op         {(costs['rate limiter'] - costs['no-op dependency']) * 1e6:8.2f} us/request")
+    print(f"limiter over no dependency {(costs['rate limiter'] - costs['no dependency']) * 1e6:8.2f} us/request")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--keys", type=int, default=1000, help="Distinct clients the calls are spread over")
+    parser.add_argument("--rounds", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Recommendation build throughput and serving latency versus co-occurrence on the fly.
+
+Runs directly against the configured database (.env). Use --pieces/--likes to
+seed synthetic users with clustered tastes first, then rebuilds
+piece_similarities (reporting likes/s, passes and peak memory), times
+/pieces/{id}/similar and /users/me/recommendations queries against the
+equivalent self-join of likes, and times one incremental flush of --events
+like changes:
+
+    python benchmarks/recommendations.py --pieces 100000 --likes 5000000 --users 200000
+"""
+import argparse
+import asyncio
+import random
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from sqlalchemy import text  # noqa: E402
+
+from novelnest.core import database, recommendations  # noqa: E402
+from novelnest.models import piece_t  # noqa: E402
+
+SEED_USERS_SQL = text("""
+    INSERT INTO users (username, email, password, role)
+    SELECT 'reco-' || g, 'reco-' || g || '@example.com', 'x', 'USER' FROM generate_series(1, :users) AS g
+    ON CONFLICT DO NOTHING
+""")
+SEED_PIECES_SQL = text("INSERT INTO pieces (title, num_of_likes) SELECT 'Recommended ' || g, 0 FROM generate_series(1, :pieces) AS g")
+# Each user mostly likes pieces from one of :clusters taste clusters, popular ones first, and sometimes anything
+SEED_LIKES_SQL = text("""
+    INSERT INTO likes (user_id, piece_id)
+    SELECT u.id, p.id
+    FROM (SELECT u0 + user_offset AS user_id,
+                 p0 + CASE WHEN random() < 0.8
+                           THEN (user_offset % :clusters) * (:pieces / :clusters) + floor(power(random(), 2) * (:pieces / :clusters))::int
+                           ELSE floor(random() * :pieces)::int END AS piece_id
+          FROM (SELECT (SELECT min(id) FROM users WHERE username LIKE 'reco-%') AS u0,
+                       (SELECT max(id) FROM pieces) - :pieces + 1 AS p0) AS base,
+               LATERAL (SELECT floor(random() * :users)::int AS user_offset FROM generate_series(1, :likes)) AS g) AS l
+    JOIN users u ON u.id = l.user_id
+    JOIN pieces p ON p.id = l.piece_id
+    ON CONFLICT DO NOTHING
+""")
+RECOUNT_SQL = text("UPDATE pieces SET num_of_likes = c.n FROM (SELECT piece_id, count(*) AS n FROM likes GROUP BY piece_id) AS c WHERE c.piece_id = pieces.id")
+
+SIMILAR_ON_THE_FLY = text("""
+    WITH n AS (SELECT piece_id, count(*) AS n FROM likes GROUP BY piece_id)
+    SELECT b.piece_id, count(*) / sqrt(max(na.n) * max(nb.n)) AS score
+    FROM likes a JOIN likes b ON b.user_id = a.user_id AND b.piece_id <> a.piece_id
+    JOIN n na ON na.piece_id = a.piece_id JOIN n nb ON nb.piece_id = b.piece_id
+    WHERE a.piece_id = :id GROUP BY b.piece_id ORDER BY score DESC, b.piece_id LIMIT 10
+""")
+RECOMMEND_ON_THE_FLY = text("""
+    SELECT c.piece_id, count(*) AS score
+    FROM likes mine JOIN likes other ON other.piece_id = mine.piece_id AND other.user_id <> mine.user_id
+    JOIN likes c ON c.user_id = other.user_id
+    WHERE mine.user_id = :id
+      AND NOT EXISTS (SELECT 1 FROM likes l WHERE l.user_id = :id AND l.piece_id = c.piece_id)
+    GROUP BY c.piece_id ORDER BY score DESC, c.piece_id LIMIT 20
+""")
+COLUMNS = (piece_t.Piece.id, piece_t.Piece.title, piece_t.Piece.num_of_likes)
+
+
+def timed(conn, statements, repeat) -> float:
+    samples = []
+    for _ in range(repeat):
+        for statement, params in statements:
+            start = time.perf_counter()
+            conn.execute(statement, params).fetchall()
+            samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+async def build(args) -> dict:
+    try:
+        return await recommendations.build_recommendations(block_pieces=args.block_pieces, neighbours=args.neighbours)
+    finally:
+        await database.dispose_engines()
+
+
+async def flush(events) -> float:
+    updater = recommendations.CoLikeUpdater(interval=0)
+    for user_id, piece_id, delta in events:
+        updater.add(user_id, piece_id, delta)
+    start = time.perf_counter()
+    await updater.flush()
+    elapsed = time.perf_counter() - start
+    await database.dispose_engines()
+    return elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pieces", type=int, default=0, help="insert this many synthetic pieces first")
+    parser.add_argument("--likes", type=int, default=0, help="random likes to add across the seeded pieces")
+    parser.add_argument("--users", type=int, default=20_000, help="synthetic users the likes come from")
+    parser.add_argument("--clusters", type=int, default=50, help="taste clusters the seeded pieces are split into")
+    parser.add_argument("--block-pieces", type=int, default=20_000)
+    parser.add_argument("--neighbours", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=20, help="pieces and users to time queries for")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--events", type=int, default=1000, help="like changes in the incremental flush")
+    args = parser.parse_args()
+
+    engine = database.engine
+    if args.pieces:
+        with engine.begin() as conn:
+            conn.execute(SEED_USERS_SQL, {"users": args.users})
+            conn.execute(SEED_PIECES_SQL, {"pieces": args.pieces})
+            if args.likes:
+                conn.execute(SEED_LIKES_SQL, {"users": args.users, "pieces": args.pieces, "likes": args.likes, "clusters": args.clusters})
+                conn.execute(RECOUNT_SQL)
+            conn.execute(text("ANALYZE likes"))
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result = asyncio.run(build(args))
+    # ru_maxrss is in KiB on Linux; the growth is what the build itself held at its peak
+    peak_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+    if result is None:
+        sys.exit("another build holds the lock")
+    print(
+        f"build: {result['likes']} likes in {result['seconds']} s ({result['likes'] / max(result['seconds'], 1e-3):,.0f} likes/s), "
+        f"{result['passes']} passes, {result['neighbour_rows']} neighbour rows, peak RSS +{peak_mb:.0f} MiB"
+    )
+
+    rng = random.Random(0)
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE piece_similarities"))
+        pieces = conn.execute(text("SELECT DISTINCT piece_id FROM piece_similarities LIMIT 10000")).scalars().all()
+        all_users = conn.execute(text("SELECT DISTINCT user_id FROM likes LIMIT 10000")).scalars().all()
+        pieces, users = rng.sample(pieces, min(args.samples, len(pieces))), rng.sample(all_users, min(args.samples, len(all_users)))
+        print(f"{'query':<16} {'on the fly ms':>14} {'precomputed ms':>15}")
+        similar = (
+            timed(conn, [(SIMILAR_ON_THE_FLY, {"id": p}) for p in pieces], args.repeat),
+            timed(conn, [(recommendations.similar_pieces_query(COLUMNS, p, 10), {}) for p in pieces], args.repeat),
+        )
+        print(f"{'similar':<16} {similar[0]:14.2f} {similar[1]:15.2f}")
+        recommended = (
+            timed(conn, [(RECOMMEND_ON_THE_FLY, {"id": u}) for u in users], args.repeat),
+            timed(conn, [(recommendations.recommendations_query(COLUMNS, u, 20), {}) for u in users], args.repeat),
+        )
+        print(f"{'recommendations':<16} {recommended[0]:14.2f} {recommended[1]:15.2f}")
+
+        if args.events:
+            all_pieces = conn.execute(text("SELECT id FROM pieces ORDER BY random() LIMIT 10000")).scalars().all()
+            events = {(rng.choice(all_users), rng.choice(all_pieces)) for _ in range(args.events)}
+            liked = set(conn.execute(
+                text("SELECT user_id, piece_id FROM likes WHERE (user_id, piece_id) IN (SELECT * FROM unnest(CAST(:u AS int[]), CAST(:p AS int[])))"),
+                {"u": [u for u, _ in events], "p": [p for _, p in events]},
+            ).all())
+            # Toggle each like, as the endpoint does, then apply the events in one flush
+            for user_id, piece_id in events:
+                if (user_id, piece_id) in liked:
+                    conn.execute(text("DELETE FROM likes WHERE user_id = :u AND piece_id = :p"), {"u": user_id, "p": piece_id})
+                else:
+                    conn.execute(text("INSERT INTO likes (user_id, piece_id) VALUES (:u, :p)"), {"u": user_id, "p": piece_id})
+            conn.commit()
+    if args.events:
+        ms = asyncio.run(flush([(u, p, -1 if (u, p) in liked else 1) for u, p in events]))
+        print(f"incremental flush of {len(events)} like events: {ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
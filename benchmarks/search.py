@@ -0,0 +1,71 @@
+"""Compare the old LIKE '%term%' title filter with the indexed full-text/trigram search.
+
+Runs directly against the configured database (.env). Use --seed to add
+synthetic pieces first so the comparison can be repeated at growing
+catalogue sizes:
+
+    python benchmarks/search.py --seed 1000000 --term dragon --term "lost kingdom"
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from sqlalchemy import text  # noqa: E402
+
+from novelnest.core.database import engine  # noqa: E402
+
+LIKE_SQL = text("SELECT id, title FROM pieces WHERE title LIKE '%' || :term || '%' LIMIT 20")
+SEARCH_SQL = text("""
+    SELECT id, title,
+           ts_rank_cd(search_vector, websearch_to_tsquery('english', :term)) + similarity(title, :term) AS rank
+    FROM pieces
+    WHERE search_vector @@ websearch_to_tsquery('english', :term) OR title % :term
+    ORDER BY rank DESC, id
+    LIMIT 20
+""")
+SEED_SQL = text("""
+    INSERT INTO pieces (title, description, num_of_likes)
+    SELECT (ARRAY['The Lost', 'Dragon', 'Kingdom of', 'Silent', 'Crimson', 'Winter'])[1 + g % 6]
+               || ' ' || md5(g::text),
+           repeat('A tale of ' || md5((g * 7)::text) || ' and the ' || (ARRAY['dragon', 'river', 'kingdom', 'empire'])[1 + g % 4] || '. ', 8),
+           0
+    FROM generate_series(1, :rows) AS g
+""")
+
+
+def timed(conn, statement, term, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(statement, {"term": term}).fetchall()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="insert this many synthetic pieces first")
+    parser.add_argument("--term", action="append", help="search term, may be repeated")
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+    terms = args.term or ["dragon", "lost kingdom", "crimsn"]
+
+    with engine.begin() as conn:
+        if args.seed:
+            conn.execute(SEED_SQL, {"rows": args.seed})
+            conn.execute(text("ANALYZE pieces"))
+
+    with engine.connect() as conn:
+        total = conn.execute(text("SELECT count(*) FROM pieces")).scalar_one()
+        print(f"pieces: {total}")
+        print(f"{'term':<20} {'LIKE ms':>10} {'search ms':>10}")
+        for term in terms:
+            print(f"{term:<20} {timed(conn, LIKE_SQL, term, args.repeat):10.2f} {timed(conn, SEARCH_SQL, term, args.repeat):10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Cost of rendering large list pages, in-process (no server or database needed).
+
+Serves the same synthetic page of pieces, each with a --description-bytes
+description, from small FastAPI routes called directly as an ASGI app:
+
+  response_model      ORM entities through response_model=List[Piece] (the previous path)
+  + FastJSONResponse  the same, rendered by the router's FastJSONResponse
+  rows, validated     Core rows through rows_response with FAST_JSON_VALIDATE=true
+  rows                Core rows through rows_response (orjson when installed)
+
+    python benchmarks/serialization.py --items 1000 --description-bytes 2000
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from fastapi import FastAPI, Response  # noqa: E402
+
+from novelnest.api.piece import piece_response, piece_rows  # noqa: E402
+from novelnest.core import serialization  # noqa: E402
+from novelnest.models import piece_t  # noqa: E402
+from novelnest.schemas import piece_sc  # noqa: E402
+
+# Stands in for a SQLAlchemy Row of PIECE_COLUMNS: attribute access and _asdict()
+PieceRow = namedtuple("PieceRow", list(piece_sc.Piece.model_fields)[:-1])
+
+
+def make_app(args) -> FastAPI:
+    now = datetime.now(timezone.utc)
+    description = ("lorem ipsum dolor sit amet " * (args.description_bytes // 27 + 1))[:args.description_bytes]
+    values = [(f"Piece number {i}", description, i, now, i % 100) for i in range(args.items)]
+    app = FastAPI()
+
+    # Entities are built per request, as a session would load them
+    @app.get("/orm", response_model=List[piece_sc.Piece])
+    async def orm():
+        return [piece_response(piece_t.Piece(title=t, description=d, id=i, created_at=c, num_of_likes=n)) for t, d, i, c, n in values]
+
+    @app.get("/orm-fast", response_model=List[piece_sc.Piece], response_class=serialization.FastJSONResponse)
+    async def orm_fast():
+        return [piece_response(piece_t.Piece(title=t, description=d, id=i, created_at=c, num_of_likes=n)) for t, d, i, c, n in values]
+
+    @app.get("/rows-validated", response_model=List[piece_sc.Piece])
+    async def rows_validated(response: Response):
+        return serialization.rows_response(piece_sc.Piece, piece_rows(PieceRow(*v) for v in values), response, validate=True)
+
+    @app.get("/rows", response_model=List[piece_sc.Piece])
+    async def rows(response: Response):
+        return serialization.rows_response(piece_sc.Piece, piece_rows(PieceRow(*v) for v in values), response)
+
+    return app
+
+
+async def call(app, path) -> bytes:
+    """Drive one GET straight through the ASGI app and return the body."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [(b"host", b"bench")],
+        "client": ("10.0.0.1", 50000), "server": ("bench", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def run(args):
+    app = make_app(args)
+    variants = {"response_model": "/orm", "+ FastJSONResponse": "/orm-fast", "rows, validated": "/rows-validated", "rows": "/rows"}
+    sizes = {name: len(await call(app, path)) for name, path in variants.items()}
+    samples = {name: [] for name in variants}
+    # Rounds alternate between variants so drift hits all of them alike
+    for _ in range(args.rounds):
+        for name, path in variants.items():
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                await call(app, path)
+            samples[name].append((time.perf_counter() - start) / args.requests)
+
+    print(f"{args.items} items/page, orjson {'installed' if serialization.orjson else 'not installed'}")
+    baseline = statistics.median(samples["response_model"])
+    for name, times in samples.items():
+        cost = statistics.median(times)
+        print(f"{name:<20} {cost * 1e3:8.2f} ms/page  {args.items / cost:>10.0f} items/s  {baseline / cost:5.1f}x  {sizes[name]:>9} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--description-bytes", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=5, help="Pages per variant per round")
+    parser.add_argument("--rounds", type=int, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
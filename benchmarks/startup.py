@@ -0,0 +1,84 @@
+"""Import time and boot-to-first-request time, each in a fresh interpreter.
+
+Imports novelnest.main --runs times, then starts uvicorn --runs times per
+DB_POOL_WARMUP value and reports how long until GET / first answers, plus
+the first and second GET /pieces/ (the first one pays for any connection
+the pool doesn't hold yet). Uses the configured database (.env); run it on
+two checkouts to compare:
+
+    python benchmarks/startup.py --runs 5 --warmup 0 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import novelnest.main; print(time.perf_counter() - start)"
+
+
+def environment(**overrides) -> dict:
+    env = {**os.environ, **overrides}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SRC), env.get("PYTHONPATH")]))
+    return env
+
+
+def import_time() -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=environment(), check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def timed_get(client, path) -> float:
+    start = time.perf_counter()
+    client.get(path).raise_for_status()
+    return time.perf_counter() - start
+
+
+def boot(port: int, warmup: int) -> tuple[float, float, float]:
+    """Seconds from spawning uvicorn to the first answer on /, then the first and second GET /pieces/."""
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "novelnest.main:app", "--port", str(port), "--log-level", "warning"],
+        env=environment(DB_POOL_WARMUP=str(warmup), TRENDING_REFRESH_SECONDS="0", RESPONSE_CACHE_ENABLED="false"),
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {server.returncode}")
+                try:
+                    client.get("/").raise_for_status()
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            ready = time.perf_counter() - start
+            return ready, timed_get(client, "/pieces/"), timed_get(client, "/pieces/")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", type=int, nargs="+", default=[0, 5], help="DB_POOL_WARMUP values to boot with")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    imports = [import_time() for _ in range(args.runs)]
+    print(f"import novelnest.main       {statistics.median(imports) * 1e3:8.1f} ms  (median of {args.runs})")
+    for warmup in args.warmup:
+        ready, first, second = zip(*(boot(args.port, warmup) for _ in range(args.runs)))
+        print(
+            f"boot, DB_POOL_WARMUP={warmup:<3}    {statistics.median(ready) * 1e3:8.1f} ms to first response,"
+            f"  first /pieces/ {statistics.median(first) * 1e3:6.1f} ms,  second {statistics.median(second) * 1e3:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
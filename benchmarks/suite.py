@@ -0,0 +1,310 @@
+"""Seeded, mixed-workload benchmark of the whole API with a JSON report.
+
+Seeds the configured database (.env) with synthetic users, pieces and likes
+(all prefixed "suite-" and replaced on every run, generated from --seed so
+two runs see the same data), then drives the app with a closed-loop mix of
+anonymous listing, search and detail reads, logins, like toggles on hot and
+cold pieces, and deep offset and cursor pagination.
+
+By default the app runs in-process with rate limiting off; pass --url to
+load a running server instead (start it with RATE_LIMIT_ENABLED=false).
+Statements per request come from the Server-Timing header, so keep
+REQUEST_METRICS_ENABLED on. Run it on two commits and diff the reports:
+
+    BCRYPT_ROUNDS=4 python benchmarks/suite.py --pieces 50000 --likes 200000 --duration 30 --output before.json
+    python benchmarks/suite.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# Before the app is imported: one client hammering /login and /likes/ is the point here
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from load import percentile  # noqa: E402
+from novelnest.core import OAuth2, database, passwords  # noqa: E402
+from novelnest.core.config import settings  # noqa: E402
+from novelnest.core.pagination import encode_cursor  # noqa: E402
+
+PREFIX = "suite-"
+PASSWORD = "suite-password"
+WORDS = ["dragon", "kingdom", "river", "winter", "crimson", "silent", "empire", "garden", "storm", "lantern", "harbor", "ember"]
+DEFAULT_MIX = "list=25,search=15,detail=20,login=5,like_hot=10,like_cold=10,deep_offset=5,deep_cursor=10"
+SERVER_TIMING = re.compile(r'db;dur=([\d.]+);desc="statements: (\d+)"')
+
+
+def seed(args):
+    """Replace the suite's rows with freshly generated ones; returns (user ids, piece ids) ranges."""
+    password_hash = passwords.hash_password(PASSWORD)
+    with database.engine.begin() as conn:
+        conn.execute(text("DELETE FROM pieces WHERE title LIKE :p"), {"p": PREFIX + "%"})
+        conn.execute(text("DELETE FROM users WHERE username LIKE :p"), {"p": PREFIX + "%"})
+        conn.execute(text("SELECT setseed(:s)"), {"s": (args.seed % 1000) / 1000})
+        users = conn.execute(text("""
+            INSERT INTO users (username, email, password, role)
+            SELECT :p || g, :p || g || '@example.com', :hash, 'USER' FROM generate_series(1, :n) AS g
+            RETURNING id
+        """), {"p": PREFIX, "hash": password_hash, "n": args.users}).scalars().all()
+        pieces = conn.execute(text("""
+            INSERT INTO pieces (title, description, num_of_likes, created_at)
+            SELECT :p || (:words)[1 + (g % cardinality(:words))] || ' ' || g,
+                   'A story about the ' || (:words)[1 + ((g * 7) % cardinality(:words))] || ' and the '
+                       || (:words)[1 + ((g * 13) % cardinality(:words))] || '.',
+                   0,
+                   now() - (g || ' seconds')::interval
+            FROM generate_series(1, :n) AS g
+            RETURNING id
+        """), {"p": PREFIX, "words": WORDS, "n": args.pieces}).scalars().all()
+        users, pieces = (min(users), max(users)), (min(pieces), max(pieces))
+        # A share of the likes lands on the first --hot pieces, the rest is spread evenly
+        conn.execute(text("""
+            INSERT INTO likes (user_id, piece_id, created_at)
+            SELECT :u0 + floor(random() * (:u1 - :u0 + 1))::int,
+                   CASE WHEN random() < :hot_share THEN :p0 + floor(random() * :hot)::int
+                        ELSE :p0 + floor(random() * (:p1 - :p0 + 1))::int END,
+                   now() - random() * interval '30 days'
+            FROM generate_series(1, :n)
+            ON CONFLICT DO NOTHING
+        """), {"u0": users[0], "u1": users[1], "p0": pieces[0], "p1": pieces[1], "hot": args.hot, "hot_share": args.hot_share, "n": args.likes})
+        conn.execute(text("""
+            UPDATE pieces SET num_of_likes = c.n
+            FROM (SELECT piece_id, count(*) AS n FROM likes WHERE piece_id BETWEEN :p0 AND :p1 GROUP BY piece_id) AS c
+            WHERE pieces.id = c.piece_id
+        """), {"p0": pieces[0], "p1": pieces[1]})
+        conn.execute(text("REFRESH MATERIALIZED VIEW trending_pieces"))
+    with database.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in ("users", "pieces", "likes"):
+            conn.execute(text(f"ANALYZE {table}"))
+    return users, pieces
+
+
+def volumes(pieces) -> dict:
+    """What the run actually saw, which with --skip-seed may differ from the command line."""
+    with database.engine.connect() as conn:
+        return {
+            "users": conn.execute(text("SELECT count(*) FROM users WHERE username LIKE :p"), {"p": PREFIX + "%"}).scalar_one(),
+            "pieces": pieces[1] - pieces[0] + 1,
+            "likes": conn.execute(text("SELECT count(*) FROM likes WHERE piece_id BETWEEN :p0 AND :p1"), {"p0": pieces[0], "p1": pieces[1]}).scalar_one(),
+        }
+
+
+def deep_cursor(depth: int) -> str:
+    """The cursor a client would hold after walking `depth` rows of /pieces/."""
+    with database.engine.connect() as conn:
+        row = conn.execute(text("SELECT created_at, id FROM pieces ORDER BY created_at, id OFFSET :n LIMIT 1"), {"n": depth}).one()
+    return encode_cursor(row)
+
+
+class Workload:
+    def __init__(self, args, users, pieces):
+        self.args = args
+        self.users, self.pieces = users, pieces
+        self.hot = (pieces[0], pieces[0] + args.hot - 1)
+        self.depth = min(args.depth, pieces[1] - pieces[0])
+        self.cursor = deep_cursor(self.depth)
+        sessions = random.Random(args.seed).sample(range(users[0], users[1] + 1), min(args.sessions, users[1] - users[0] + 1))
+        # Minted rather than logged in, so the run doesn't start with a bcrypt storm
+        self.tokens = [{"Authorization": f"Bearer {OAuth2.create_access_token(data={'user_id': user_id})}"} for user_id in sessions]
+        mix = dict(item.split("=") for item in args.mix.split(","))
+        self.names = list(mix)
+        self.weights = [float(weight) for weight in mix.values()]
+
+    def request(self, name, rng):
+        """(method, path, kwargs) for one operation of kind `name`."""
+        if name == "list":
+            return "GET", "/pieces/", {"params": {"limit": 20}}
+        if name == "search":
+            return "GET", "/pieces/search", {"params": {"q": rng.choice(WORDS), "limit": 10}}
+        if name == "detail":
+            return "GET", f"/pieces/{rng.randint(*self.pieces)}", {}
+        if name == "login":
+            return "POST", "/login", {"data": {"username": f"{PREFIX}{rng.randint(1, self.users[1] - self.users[0] + 1)}", "password": PASSWORD}}
+        if name in ("like_hot", "like_cold"):
+            piece_id = rng.randint(*self.hot) if name == "like_hot" else rng.randint(*self.pieces)
+            return "POST", "/likes/", {"json": {"piece_id": piece_id, "direction": rng.randint(0, 1)}, "headers": rng.choice(self.tokens)}
+        if name == "deep_offset":
+            return "GET", "/pieces/", {"params": {"limit": 20, "offset": self.depth}}
+        if name == "deep_cursor":
+            return "GET", "/pieces/", {"params": {"limit": 20, "cursor": self.cursor}}
+        raise ValueError(f"Unknown operation {name}")
+
+
+async def worker(client, workload, rng, deadline, record):
+    while time.perf_counter() < deadline:
+        name = rng.choices(workload.names, workload.weights)[0]
+        method, path, kwargs = workload.request(name, rng)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            record(name, time.perf_counter() - start, type(e).__name__, None)
+            continue
+        timing = SERVER_TIMING.search(response.headers.get("server-timing", ""))
+        record(name, time.perf_counter() - start, response.status_code, timing)
+
+
+def summarize(samples, elapsed):
+    latencies = [latency for latency, _, _ in samples]
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    timings = [timing for _, _, timing in samples if timing]
+    return {
+        "requests": len(samples),
+        "errors": sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500),
+        "statuses": statuses,
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3) if latencies else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "statements_per_request": round(statistics.mean(int(t.group(2)) for t in timings), 3) if timings else None,
+        "db_ms_per_request": round(statistics.mean(float(t.group(1)) for t in timings), 3) if timings else None,
+    }
+
+
+def git_revision():
+    try:
+        root = Path(__file__).resolve().parents[1]
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+async def run(args):
+    users, pieces = seed(args) if not args.skip_seed else (None, None)
+    if users is None:
+        with database.engine.connect() as conn:
+            users = conn.execute(text("SELECT min(id), max(id) FROM users WHERE username LIKE :p"), {"p": PREFIX + "%"}).one()
+            pieces = conn.execute(text("SELECT min(id), max(id) FROM pieces WHERE title LIKE :p"), {"p": PREFIX + "%"}).one()
+        if users[0] is None or pieces[0] is None:
+            raise SystemExit("No suite data to reuse, run without --skip-seed first")
+    workload = Workload(args, users, pieces)
+
+    if args.url:
+        transport, base_url = None, args.url
+    else:
+        from novelnest.main import app
+        transport, base_url = httpx.ASGITransport(app=app), "http://suite"
+
+    samples = {}
+    recording = False
+
+    def record(name, latency, status, timing):
+        if recording:
+            samples.setdefault(name, []).append((latency, status, timing))
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=60) as client:
+        rngs = [random.Random(args.seed * 1000 + i) for i in range(args.concurrency)]
+        if args.warmup:
+            deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(worker(client, workload, rng, deadline, record) for rng in rngs))
+        recording = True
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(worker(client, workload, rng, deadline, record) for rng in rngs))
+        elapsed = time.perf_counter() - started
+
+    report = {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "target": args.url or "in-process",
+            "seed": args.seed,
+            "volumes": {**volumes(pieces), "hot": args.hot},
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "settings": {
+                name: getattr(settings, name)
+                for name in ("db_async", "db_pool_size", "bcrypt_rounds", "response_cache_enabled", "like_buffer_enabled", "user_cache_enabled")
+            },
+        },
+        "total": summarize([sample for values in samples.values() for sample in values], elapsed),
+        "endpoints": {name: summarize(samples[name], elapsed) for name in sorted(samples)},
+    }
+    return report
+
+
+def print_report(report):
+    print(f"{'endpoint':<12} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'stmts':>6} {'errors':>7}")
+    for name, stats in [*report["endpoints"].items(), ("total", report["total"])]:
+        statements = "-" if stats["statements_per_request"] is None else f"{stats['statements_per_request']:.2f}"
+        print(f"{name:<12} {stats['throughput_rps']:>9.1f} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {statements:>6} {stats['errors']:>7}")
+
+
+def compare(old_path, new_path):
+    old, new = (json.loads(Path(path).read_text()) for path in (old_path, new_path))
+    print(" -> ".join(f"{report['meta']['commit']}{' (dirty)' if report['meta']['dirty'] else ''}" for report in (old, new)))
+    print(f"{'endpoint':<12} {'req/s':>16} {'p95 ms':>18} {'stmts':>12}")
+    for name in sorted(set(old["endpoints"]) | set(new["endpoints"])) + ["total"]:
+        a = old["total"] if name == "total" else old["endpoints"].get(name)
+        b = new["total"] if name == "total" else new["endpoints"].get(name)
+        if a is None or b is None:
+            print(f"{name:<12} only in {'new' if a is None else 'old'} report")
+            continue
+
+        def change(key):
+            if not a[key] or b[key] is None:
+                return "-"
+            return f"{b[key]:.1f} ({(b[key] - a[key]) / a[key] * 100:+.0f}%)"
+
+        statements = "-" if a["statements_per_request"] is None or b["statements_per_request"] is None else f"{a['statements_per_request']:.1f}->{b['statements_per_request']:.1f}"
+        print(f"{name:<12} {change('throughput_rps'):>16} {change('p95_ms'):>18} {statements:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Load a running server instead of the in-process app")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--pieces", type=int, default=50_000)
+    parser.add_argument("--likes", type=int, default=200_000)
+    parser.add_argument("--hot", type=int, default=10, help="Pieces that draw --hot-share of the likes and all like_hot toggles")
+    parser.add_argument("--hot-share", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=1, help="Data and workload are generated from this")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the suite rows from the previous run")
+    parser.add_argument("--sessions", type=int, default=100, help="Seeded users that toggle likes")
+    parser.add_argument("--depth", type=int, default=20_000, help="Row offset for deep pagination")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Operation weights")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds run before recording")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Print the difference between two reports and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        passwords.pool.shutdown()
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Bearer token verifications/sec, in-process (no server or database needed).
+
+Compares a plain jwt.decode per request (the previous behaviour) with
+TokenVerifier with its claims cache disabled and enabled, for HS256 and, when
+the crypto extra is installed, RS256 and EdDSA with freshly generated keys:
+
+    python benchmarks/token_verify.py --tokens 1000 --rounds 20
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import jwt  # noqa: E402
+
+from novelnest.core.tokens import RevocationList, TokenVerifier  # noqa: E402
+
+
+def generate_keys(algorithm):
+    if algorithm == "HS256":
+        secret = "benchmark-secret-benchmark-secret"
+        return secret, secret
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048) if algorithm == "RS256" else ed25519.Ed25519PrivateKey.generate()
+    private_pem = private.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    public_pem = private.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return private_pem.decode(), public_pem.decode()
+
+
+async def rate(verify, tokens, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for token in tokens:
+            await verify(token)
+    return len(tokens) * rounds / (time.perf_counter() - start)
+
+
+async def run(args):
+    print(f"{'algorithm':<10}{'jwt.decode':>14}{'no cache':>14}{'cached':>14}   verifications/sec")
+    for algorithm in ("HS256", "RS256", "EdDSA"):
+        try:
+            signing_key, verifying_key = generate_keys(algorithm)
+            uncached = TokenVerifier(algorithm, signing_key, verifying_key, max_entries=0, ttl=300, revocations=RevocationList(1000))
+        except (ImportError, RuntimeError) as e:
+            print(f"{algorithm:<10}skipped: {e}")
+            continue
+        cached = TokenVerifier(algorithm, signing_key, verifying_key, max_entries=args.tokens, ttl=300, revocations=RevocationList(1000))
+        tokens = [uncached.create({"user_id": i}, expires_in=3600) for i in range(args.tokens)]
+
+        async def plain_decode(token):
+            # What every request paid before: key parsing and full signature check each time
+            return jwt.decode(token, verifying_key, algorithms=[algorithm])
+
+        results = [await rate(verify, tokens, args.rounds) for verify in (plain_decode, uncached.verify, cached.verify)]
+        print(f"{algorithm:<10}" + "".join(f"{result:>14.0f}" for result in results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=1000, help="Distinct tokens, cycled through every round")
+    parser.add_argument("--rounds", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
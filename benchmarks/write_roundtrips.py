@@ -0,0 +1,105 @@
+"""SQL statements, commits and latency per write endpoint.
+
+Drives the app in-process (no server needed) against the configured database
+and counts what each request sends to Postgres through engine events, so the
+numbers include the authentication lookup if the user cache misses. Run it on
+two checkouts to compare before and after a change:
+
+    BCRYPT_ROUNDS=4 RATE_LIMIT_ENABLED=false python benchmarks/write_roundtrips.py --iterations 200
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import httpx  # noqa: E402
+from sqlalchemy import event, text  # noqa: E402
+
+from load import percentile  # noqa: E402
+from novelnest.core import OAuth2, database  # noqa: E402
+from novelnest.core.user_cache import user_cache  # noqa: E402
+from novelnest.main import app  # noqa: E402
+from novelnest.schemas import user_sc  # noqa: E402
+
+PREFIX = "rt-"
+counts = {"statements": 0, "commits": 0}
+
+
+def count(name):
+    def listener(*args, **kwargs):
+        counts[name] += 1
+    return listener
+
+
+for sync_engine in (database.engine, database.async_engine.sync_engine):
+    event.listen(sync_engine, "before_cursor_execute", count("statements"))
+    event.listen(sync_engine, "commit", count("commits"))
+
+
+def seed_admin():
+    with database.engine.begin() as conn:
+        conn.execute(text("DELETE FROM users WHERE username LIKE :p"), {"p": PREFIX + "%"})
+        conn.execute(text("DELETE FROM pieces WHERE title LIKE :p"), {"p": PREFIX + "%"})
+        return conn.execute(text(
+            "INSERT INTO users (username, email, password, role) VALUES (:u, :e, 'x', 'ADMIN') RETURNING id"
+        ), {"u": PREFIX + "admin", "e": PREFIX + "admin@example.com"}).scalar_one()
+
+
+async def measure(results, name, request):
+    counts["statements"] = counts["commits"] = 0
+    start = time.perf_counter()
+    response = await request
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    results.setdefault(name, []).append((elapsed, counts["statements"], counts["commits"]))
+    return response
+
+
+async def run(args):
+    admin_id = seed_admin()
+    admin = {"Authorization": f"Bearer {OAuth2.create_access_token(data={'user_id': admin_id})}"}
+    results = {}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        # Warm the user cache so per-request counts measure the write itself
+        await client.get("/likes/my-likes", headers=admin)
+
+        for i in range(args.iterations):
+            response = await measure(results, "create_piece", client.post("/pieces/", json={"title": f"{PREFIX}{i}", "description": "benchmark"}, headers=admin))
+            piece_id = response.json()["id"]
+            await measure(results, "update_piece", client.put(f"/pieces/{piece_id}", json={"title": f"{PREFIX}{i} renamed"}, headers=admin))
+            await measure(results, "delete_piece", client.delete(f"/pieces/{piece_id}", headers=admin))
+
+            response = await measure(results, "create_user", client.post("/users/", json={"username": f"{PREFIX}{i}", "email": f"{PREFIX}{i}@example.com", "password": "benchmark"}))
+            user = user_sc.User.model_validate(response.json())
+            _, version = await user_cache.get(user.id)
+            await user_cache.set(user, version)
+            token = {"Authorization": f"Bearer {OAuth2.create_access_token(data={'user_id': user.id})}"}
+            await measure(results, "update_user", client.put(f"/users/{user.id}", json={"username": f"{PREFIX}{i}-renamed"}, headers=token))
+            await measure(results, "delete_user", client.delete(f"/users/{user.id}", headers=admin))
+
+    with database.engine.begin() as conn:
+        conn.execute(text("DELETE FROM users WHERE id = :id"), {"id": admin_id})
+
+    print(f"{'endpoint':<14}{'statements':>11}{'commits':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, samples in results.items():
+        latencies = [sample[0] * 1000 for sample in samples]
+        print(
+            f"{name:<14}{statistics.mean(s[1] for s in samples):>11.2f}{statistics.mean(s[2] for s in samples):>9.2f}"
+            f"{percentile(latencies, 50):>9.2f}{percentile(latencies, 95):>9.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
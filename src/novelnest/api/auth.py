@@ -2,10 +2,12 @@ from typing import Annotated
 
 from fastapi import status, HTTPException, APIRouter, Depends
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..schemas import auth_sc
-from ..core import OAuth2
+from ..schemas import auth_sc, user_sc
+from ..core import OAuth2, tokens
+from ..core.rate_limit import rate_limit
 from ..core.database import get_db
 from ..models import user_t
 
@@ -13,11 +15,11 @@ router = APIRouter(
     tags=['Authentication']
 )
 
-@router.post('/login', response_model=auth_sc.Token)
-def login(user_credentials: Annotated[OAuth2PasswordRequestForm, Depends()], db: Annotated[Session, Depends(get_db)]):  # In Postman, the inputs are in form-data, not raw JSON
+@router.post('/login', response_model=auth_sc.Token, dependencies=[Depends(rate_limit("login"))])
+async def login(user_credentials: Annotated[OAuth2PasswordRequestForm, Depends()], db: Annotated[AsyncSession, Depends(get_db)]):  # In Postman, the inputs are in form-data, not raw JSON
 
-    user = db.query(user_t.User).filter( 
-        user_t.User.username == user_credentials.username).first()
+    user = await db.scalar(select(user_t.User).where(
+        user_t.User.username == user_credentials.username, user_t.User.deleted_at.is_(None)))
 
     if not user:
         raise HTTPException(
@@ -25,12 +27,31 @@ def login(user_credentials: Annotated[OAuth2PasswordRequestForm, Depends()], db:
             detail="Invalid username or password"
         )
 
-    if not OAuth2.verify_password(user_credentials.password, user.password):
+    valid, new_hash = await OAuth2.averify_and_update_password(user_credentials.password, user.password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail="Invalid username or password"
         )
 
+    # The bcrypt cost changed since this hash was made, store the upgraded one
+    if new_hash:
+        await db.execute(update(user_t.User).where(user_t.User.id == user.id).values(password=new_hash))
+        await db.commit()
+
     access_token = OAuth2.create_access_token(data={"user_id": user.id})
 
-    return auth_sc.Token(access_token=access_token, token_type="bearer")
\ No newline at end of file
+    return auth_sc.Token(access_token=access_token, token_type="bearer")
+
+@router.post('/logout', status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token_data: Annotated[auth_sc.TokenData, Depends(OAuth2.get_token_data)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_user)]):
+    if token_data.jti is not None:
+        await tokens.revocations.revoke_token(token_data.jti, token_data.expires_at)
+    else:
+        # Issued before tokens carried an id: the only way to end it is ending all of the user's sessions
+        await tokens.revocations.revoke_user(current_user.id)
+
+@router.get('/.well-known/jwks.json')
+async def get_jwks():
+    """Public verification keys when ALGO is asymmetric, so other services can check our tokens."""
+    return tokens.token_verifier.jwks()
@@ -0,0 +1,34 @@
+from typing import List, Annotated, Optional
+
+from fastapi import Query, status, HTTPException, APIRouter, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..schemas import deletion_sc, user_sc
+from ..core import OAuth2
+from ..core.database import get_db
+from ..models import deletion_t
+
+router = APIRouter(
+    prefix="/deletions",
+    tags=['Deletions']
+)
+
+
+# Progress is read from the primary: a replica may not have the job a DELETE just queued
+@router.get("/", response_model=List[deletion_sc.DeletionJob])
+async def get_deletion_jobs(db: Annotated[AsyncSession, Depends(get_db)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_admin_user)], job_status: Annotated[Optional[deletion_sc.DeletionStatus], Query(alias="status")] = None, limit: Annotated[int, Query(ge=1, le=100)] = 20):
+    """Latest deletion jobs first, optionally only those with the given status."""
+    query = select(deletion_t.DeletionJob).order_by(deletion_t.DeletionJob.id.desc()).limit(limit)
+    if job_status is not None:
+        query = query.where(deletion_t.DeletionJob.status == job_status)
+    return (await db.scalars(query)).all()
+
+@router.get("/{id}", response_model=deletion_sc.DeletionJob)
+async def get_deletion_job(id: int, db: Annotated[AsyncSession, Depends(get_db)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_admin_user)]):
+    job = await db.get(deletion_t.DeletionJob, id)
+
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Deletion job with id {id} was not found")
+
+    return job
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Response, status
+
+from ..core import health
+
+router = APIRouter(
+    tags=['Health']
+)
+
+@router.get("/healthz", include_in_schema=False)
+async def liveness():
+    """The process is up and serving requests; no database access."""
+    return {"status": "ok"}
+
+@router.get("/readyz", include_in_schema=False)
+async def readiness(response: Response):
+    """Whether this worker should get traffic: database reachable, a pooled connection free, schema at head."""
+    ready, checks = await health.readiness()
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"status": "ready" if ready else "unavailable", "checks": checks}
@@ -1,80 +1,195 @@
+from datetime import datetime
 from typing import List, Annotated, Optional
 
-from fastapi import Response, status, HTTPException, APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import BackgroundTasks, Query, Response, status, HTTPException, APIRouter, Depends
+from sqlalchemy import Integer, any_, bindparam, delete, exists, func, literal, null, select, true, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..schemas import like_sc
-from ..core import OAuth2
-from ..core.database import get_db
+from ..schemas import like_sc, user_sc
+from ..core import OAuth2, export, like_counter
+from ..core.recommendations import co_like_updater
+from ..core.config import settings
+from ..core.database import get_db, get_read_db
+from ..core.like_counter import like_buffer
+from ..core.live_counts import live_counts
+from ..core.pagination import page, paginate
+from ..core.rate_limit import rate_limit
+from ..core.response_cache import response_cache
+from ..core.serialization import FastJSONResponse, rows_response, schema_columns
 from ..models import like_t as like_t, piece_t, user_t
 
 router = APIRouter(
     prefix="/likes",
-    tags=['Likes']
+    tags=['Likes'],
+    default_response_class=FastJSONResponse
 )
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
-def toggle_like(like_data: like_sc.LikeToggle, db: Annotated[Session, Depends(get_db)], current_user: Annotated[user_t.User, Depends(OAuth2.get_current_user)]):
-    
-    piece = db.query(piece_t.Piece).filter(piece_t.Piece.id == like_data.piece_id).first()
-    
-    if not piece:
+LIKE_ORDER = (like_t.Like.user_id, like_t.Like.piece_id)
+LIKE_COLUMNS = schema_columns(like_t.Like.__table__, like_sc.Like)
+MAX_BATCH_IDS = 100
+
+
+def parse_piece_ids(ids: str) -> List[int]:
+    try:
+        piece_ids = list(dict.fromkeys(int(id) for id in ids.split(",") if id.strip()))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must be a comma-separated list of integers")
+    if not piece_ids or len(piece_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Between 1 and {MAX_BATCH_IDS} ids are allowed")
+    return piece_ids
+
+async def liked_piece_ids(db: AsyncSession, user_id: int, piece_ids) -> set:
+    """Which of `piece_ids` the user has liked, one primary key probe per id.
+
+    Each probe is a lateral lookup on one piece_id, so only that piece's
+    partition of likes is visited; `piece_id = ANY(:ids)` can't be pruned
+    when the array is a bind parameter and would search every partition.
+    """
+    if not piece_ids:
+        return set()
+    ids = func.unnest(bindparam("piece_ids", list(piece_ids), type_=ARRAY(Integer))).table_valued("id").render_derived()
+    like = (
+        select(like_t.Like.piece_id)
+        .where(like_t.Like.user_id == user_id, like_t.Like.piece_id == ids.c.id)
+        .limit(1)  # keeps the lookup a nested loop rather than a join over every partition
+        .lateral()
+    )
+    liked = await db.scalars(select(like.c.piece_id).select_from(ids).join(like, true()))
+    return set(liked)
+
+
+def toggle_like_statement(piece_id: int, user_id: int, direction: int, update_counter: bool = True):
+    """Build the single statement that adds/removes a like and moves the counter.
+
+    The INSERT ... ON CONFLICT DO NOTHING / DELETE returns the piece id only when a
+    row actually changed, and the counter UPDATE is driven by that CTE, so the
+    increment happens in SQL under the row lock and can't be lost or doubled.
+    Returns one row: (piece_exists, changed, num_of_likes, created_at), the
+    last being when the added or removed like was made. With
+    update_counter=False the counter is left to the write-behind buffer and
+    num_of_likes is NULL. Soft-deleted pieces count as missing, and a
+    soft-deleted user can't add likes behind its deletion job.
+    """
+    live_piece = (piece_t.Piece.id == piece_id, piece_t.Piece.deleted_at.is_(None))
+    if direction == 1:
+        changed = (
+            insert(like_t.Like)
+            .from_select(["user_id", "piece_id"], select(literal(user_id, Integer), piece_t.Piece.id).where(
+                *live_piece, exists().where(user_t.User.id == user_id, user_t.User.deleted_at.is_(None))
+            ))
+            .on_conflict_do_nothing()
+            .returning(like_t.Like.piece_id, like_t.Like.created_at)
+            .cte("changed")
+        )
+        new_count = piece_t.Piece.num_of_likes + 1
+    else:
+        changed = (
+            delete(like_t.Like)
+            .where(like_t.Like.piece_id == piece_id, like_t.Like.user_id == user_id, exists().where(*live_piece))
+            .returning(like_t.Like.piece_id, like_t.Like.created_at)
+            .cte("changed")
+        )
+        new_count = func.greatest(piece_t.Piece.num_of_likes - 1, 0)
+
+    if update_counter:
+        counter = (
+            update(piece_t.Piece)
+            .where(piece_t.Piece.id.in_(select(changed.c.piece_id)))
+            .values(num_of_likes=new_count)
+            .returning(piece_t.Piece.num_of_likes)
+            .cte("counter")
+        )
+        num_of_likes = select(counter.c.num_of_likes).scalar_subquery()
+    else:
+        num_of_likes = null()
+
+    return select(
+        exists().where(*live_piece).label("piece_exists"),
+        exists(select(changed.c.piece_id)).label("changed"),
+        num_of_likes.label("num_of_likes"),
+        select(changed.c.created_at).scalar_subquery().label("created_at"),
+    )
+
+
+@router.post("/", status_code=status.HTTP_201_CREATED, dependencies=[Depends(rate_limit("like", per_user=True))])
+async def toggle_like(like_data: like_sc.LikeToggle, db: Annotated[AsyncSession, Depends(get_db)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_user)]):
+
+    buffered = settings.like_buffer_enabled
+    statement = toggle_like_statement(like_data.piece_id, current_user.id, like_data.direction, update_counter=not buffered)
+    result = (await db.execute(statement)).one()
+    await db.commit()
+
+    if result.changed:
+        delta = 1 if like_data.direction == 1 else -1
+        if buffered:
+            like_buffer.add(like_data.piece_id, delta)
+        if settings.recommendations_update_seconds > 0:
+            co_like_updater.add(current_user.id, like_data.piece_id, delta)
+        if settings.live_counts_enabled:
+            live_counts.touch(like_data.piece_id)
+        response_cache.invalidate("/pieces/", f"/pieces/{like_data.piece_id}", f"/likes/count/{like_data.piece_id}")
+
+    if not result.piece_exists:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Piece with id: {like_data.piece_id} does not exist")
-     
-    like_query = db.query(like_t.Like).filter(like_t.Like.piece_id == like_data.piece_id, like_t.Like.user_id == current_user.id)
-    found_like = like_query.first()
-    
+
     if like_data.direction == 1:  # User wants to like
-        if found_like:
+        if not result.changed:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"User {current_user.id} has already liked piece {like_data.piece_id}")
-        
-        # Add the like
-        new_like = like_t.Like(piece_id=like_data.piece_id, user_id=current_user.id)
-        db.add(new_like)
-        
-        # Increment the like count
-        piece.num_of_likes += 1
-        
-        db.commit()
-        db.refresh(new_like)
-        
-        return {"message": "Successfully added like", "like": new_like}
-        
+
+        return {"message": "Successfully added like", "like": like_sc.Like(piece_id=like_data.piece_id, user_id=current_user.id, created_at=result.created_at)}
+
     else:  # direction == 0, user wants to unlike
-        if not found_like:
+        if not result.changed:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Like does not exist")
 
-        # Remove the like
-        like_query.delete(synchronize_session=False)
-        
-        # Decrement the like count (but don't go below 0)
-        if piece.num_of_likes > 0:
-            piece.num_of_likes -= 1
-        
-        db.commit()
-        
         return {"message": "Successfully removed like"}
-    
+
 @router.get("/count/{piece_id}", response_model=like_sc.LikeCount)
-def get_like_count(piece_id: int, db: Annotated[Session, Depends(get_db)]):
-    piece = db.query(piece_t.Piece).filter(piece_t.Piece.id == piece_id).first()
-    if not piece:
+async def get_like_count(piece_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]):
+    # Served from the denormalized counter, no COUNT(*) over likes
+    count = await db.scalar(select(piece_t.Piece.num_of_likes).where(piece_t.Piece.id == piece_id, piece_t.Piece.deleted_at.is_(None)))
+    if count is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Piece with id: {piece_id} does not exist")
-    
-    count = db.query(like_t.Like).filter(like_t.Like.piece_id == piece_id).count()
-    return {"piece_id": piece_id, "like_count": count}
+
+    return {"piece_id": piece_id, "like_count": count + like_buffer.pending(piece_id)}
+
+@router.get("/counts", response_model=List[like_sc.LikeCount])
+async def get_like_counts(ids: Annotated[str, Query(description="Comma-separated piece ids")], db: Annotated[AsyncSession, Depends(get_read_db)]):
+    rows = await db.execute(
+        select(piece_t.Piece.id, piece_t.Piece.num_of_likes)
+        .where(piece_t.Piece.id == any_(bindparam("piece_ids", parse_piece_ids(ids), type_=ARRAY(Integer))), piece_t.Piece.deleted_at.is_(None))
+    )
+    # Unknown ids are left out of the response
+    return [{"piece_id": id, "like_count": count + like_buffer.pending(id)} for id, count in rows]
+
+@router.post("/status", response_model=List[like_sc.LikeStatus])
+async def get_like_status(request: like_sc.LikeStatusRequest, db: Annotated[AsyncSession, Depends(get_db)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_user)]):
+    liked = await liked_piece_ids(db, current_user.id, request.piece_ids)
+    return [like_sc.LikeStatus(piece_id=piece_id, liked=piece_id in liked) for piece_id in dict.fromkeys(request.piece_ids)]
+
+@router.post("/reconcile", status_code=status.HTTP_202_ACCEPTED)
+async def reconcile_like_counts(background_tasks: BackgroundTasks, current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_admin_user)], chunk_size: Annotated[int, Query(ge=1, le=100_000)] = 1000):
+    background_tasks.add_task(like_counter.reconcile_like_counts, chunk_size)
+    return {"message": "Like counter reconcile started"}
+
+@router.get("/export")
+async def export_likes(current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_admin_user)], fmt: Annotated[export.ExportFormat, Query(alias="format")] = "ndjson", since: Optional[datetime] = None, gzip: bool = False):
+    """Stream every like as NDJSON or CSV, optionally only those made after `since`."""
+    return export.export_response("likes", fmt, since, gzip)
 
 @router.get("/my-likes", response_model=List[like_sc.Like])
-def get_my_likes(db: Annotated[Session, Depends(get_db)], current_user: Annotated[user_t.User, Depends(OAuth2.get_current_user)], limit: int = 10, offset: int = 0):    
-    likes = db.query(like_t.Like).filter(like_t.Like.user_id == current_user.id).limit(limit).offset(offset).all()
-    return likes
-    
+async def get_my_likes(response: Response, db: Annotated[AsyncSession, Depends(get_read_db)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_user)], limit: Annotated[int, Query(ge=1, le=100)] = 10, offset: Annotated[int, Query(ge=0)] = 0, cursor: Optional[str] = None):
+    query = select(*LIKE_COLUMNS).where(like_t.Like.user_id == current_user.id)
+    rows = await db.execute(paginate(query, LIKE_ORDER, limit, offset, cursor))
+    return rows_response(like_sc.Like, [row._asdict() for row in page(rows, LIKE_ORDER, limit, response)], response)
+
 @router.get("/{piece_id}", response_model=List[like_sc.Like])
-def get_likes_for_piece(piece_id: int, db: Annotated[Session, Depends(get_db)], limit: int = 10, offset: int = 0):    
-    piece = db.query(piece_t.Piece).filter(piece_t.Piece.id == piece_id).first()
-    if not piece:
+async def get_likes_for_piece(piece_id: int, response: Response, db: Annotated[AsyncSession, Depends(get_read_db)], limit: Annotated[int, Query(ge=1, le=100)] = 10, offset: Annotated[int, Query(ge=0)] = 0, cursor: Optional[str] = None):
+    if not await db.scalar(select(exists().where(piece_t.Piece.id == piece_id, piece_t.Piece.deleted_at.is_(None)))):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Piece with id: {piece_id} does not exist")
-    
-    likes = db.query(like_t.Like).filter(like_t.Like.piece_id == piece_id).limit(limit).offset(offset).all()
-    return likes
+
+    query = select(*LIKE_COLUMNS).where(like_t.Like.piece_id == piece_id)
+    rows = await db.execute(paginate(query, LIKE_ORDER, limit, offset, cursor))
+    return rows_response(like_sc.Like, [row._asdict() for row in page(rows, LIKE_ORDER, limit, response)], response)
 
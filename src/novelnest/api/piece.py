@@ -1,68 +1,227 @@
+from datetime import datetime
 from typing import List, Annotated, Optional
 
-from fastapi import status, HTTPException, APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import Query, Request, Response, status, HTTPException, APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import cast, exists, func, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..schemas import piece_sc
-from ..core import OAuth2
-from ..core.database import get_db
-from ..models import piece_t, user_t
+from ..schemas import deletion_sc, import_sc, piece_sc, user_sc
+from ..core import OAuth2, bulk_import, database, deletions, export, recommendations
+from ..core.serialization import FastJSONResponse, rows_response, schema_columns
+from ..core.config import settings
+from ..core.database import get_db, get_read_db
+from ..core.like_counter import like_buffer
+from ..core.live_counts import live_counts
+from ..core.pagination import page, paginate
+from ..core.response_cache import response_cache
+from ..models import piece_t, trending_t
+from .like import liked_piece_ids
 
 
 router = APIRouter(
     prefix="/pieces",
-    tags=['Pieces']
+    tags=['Pieces'],
+    default_response_class=FastJSONResponse
 )
 
 
-@router.get("/", response_model=List[piece_sc.Piece])
-def get_all_pieces(db: Annotated[Session, Depends(get_db)], limit: int = 10, offset: int = 0, search: Optional[str] = ""):
-    pieces = db.query(piece_t.Piece).filter(piece_t.Piece.title.contains(search)).limit(limit).offset(offset).all()
+PIECE_ORDER = (piece_t.Piece.created_at, piece_t.Piece.id)
+PIECE_COLUMNS = schema_columns(piece_t.Piece.__table__, piece_sc.Piece)
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MinWords=5, MaxWords=20"
+
+
+def piece_response(piece, liked_ids: Optional[set] = None):
+    """Add like deltas the write-behind buffer hasn't flushed yet and, for a viewer, liked_by_me."""
+    changes = {}
+    pending = like_buffer.pending(piece.id)
+    if pending:
+        changes["num_of_likes"] = piece.num_of_likes + pending
+    if liked_ids is not None:
+        changes["liked_by_me"] = piece.id in liked_ids
+    if not changes:
+        return piece
+    return piece_sc.Piece.model_validate(piece).model_copy(update=changes)
+
+def piece_rows(rows, liked_ids: Optional[set] = None) -> List[dict]:
+    """piece_response for Core rows of PIECE_COLUMNS (plus any extra columns), as dicts for rows_response."""
+    pieces = []
+    for row in rows:
+        piece = row._asdict()
+        piece["num_of_likes"] += like_buffer.pending(row.id)
+        piece["liked_by_me"] = None if liked_ids is None else row.id in liked_ids
+        pieces.append(piece)
     return pieces
 
+async def viewer_liked_ids(db: AsyncSession, viewer: Optional[user_sc.User], pieces) -> Optional[set]:
+    if viewer is None:
+        return None
+    return await liked_piece_ids(db, viewer.id, [piece.id for piece in pieces])
+
+def search_tsquery(term: str):
+    return func.websearch_to_tsquery(cast(piece_t.SEARCH_CONFIG, REGCONFIG), term)
+
+def search_filter(term: str, tsquery):
+    # Full-text match over title + description, or fuzzy (trigram) match on the title; both GIN indexed
+    return or_(piece_t.Piece.search_vector.op("@@")(tsquery), piece_t.Piece.title.op("%")(term))
+
+
+@router.get("/", response_model=List[piece_sc.Piece])
+async def get_all_pieces(response: Response, db: Annotated[AsyncSession, Depends(get_read_db)], viewer: Annotated[Optional[user_sc.User], Depends(OAuth2.get_current_user_optional)], limit: Annotated[int, Query(ge=1, le=100)] = 10, offset: Annotated[int, Query(ge=0)] = 0, cursor: Optional[str] = None, search: Optional[str] = None):
+    query = select(*PIECE_COLUMNS).where(piece_t.Piece.deleted_at.is_(None))
+    if search and search.strip():
+        query = query.where(search_filter(search, search_tsquery(search)))
+    rows = await db.execute(paginate(query, PIECE_ORDER, limit, offset, cursor))
+    rows = page(rows, PIECE_ORDER, limit, response)
+    liked_ids = await viewer_liked_ids(db, viewer, rows)
+    return rows_response(piece_sc.Piece, piece_rows(rows, liked_ids), response)
+
+@router.get("/export")
+async def export_pieces(current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_admin_user)], fmt: Annotated[export.ExportFormat, Query(alias="format")] = "ndjson", since: Optional[datetime] = None, gzip: bool = False):
+    """Stream every piece as NDJSON or CSV, optionally only those created after `since`."""
+    return export.export_response("pieces", fmt, since, gzip)
+
+@router.get("/search", response_model=List[piece_sc.PieceSearchResult])
+async def search_pieces(q: Annotated[str, Query(min_length=1)], db: Annotated[AsyncSession, Depends(get_read_db)], limit: Annotated[int, Query(ge=1, le=100)] = 10, offset: Annotated[int, Query(ge=0)] = 0):
+    tsquery = search_tsquery(q)
+    rank = (func.ts_rank_cd(piece_t.Piece.search_vector, tsquery) + func.similarity(piece_t.Piece.title, q)).label("rank")
+
+    # Rank and cut the page first so ts_headline only runs on the rows we return
+    matches = (
+        select(piece_t.Piece.id, rank)
+        .where(search_filter(q, tsquery), piece_t.Piece.deleted_at.is_(None))
+        .order_by(rank.desc(), piece_t.Piece.id)
+        .limit(limit)
+        .offset(offset)
+        .subquery()
+    )
+    headline = func.ts_headline(
+        cast(piece_t.SEARCH_CONFIG, REGCONFIG), func.coalesce(piece_t.Piece.description, piece_t.Piece.title), tsquery, HEADLINE_OPTIONS
+    ).label("headline")
+
+    rows = await db.execute(
+        select(piece_t.Piece, matches.c.rank, headline)
+        .join(matches, matches.c.id == piece_t.Piece.id)
+        .order_by(matches.c.rank.desc(), piece_t.Piece.id)
+    )
+    return [
+        piece_sc.PieceSearchResult(**piece_sc.Piece.model_validate(piece_response(piece)).model_dump(), rank=rank, headline=headline)
+        for piece, rank, headline in rows
+    ]
+
+@router.get("/top", response_model=List[piece_sc.Piece])
+async def get_top_pieces(response: Response, db: Annotated[AsyncSession, Depends(get_read_db)], viewer: Annotated[Optional[user_sc.User], Depends(OAuth2.get_current_user_optional)], limit: Annotated[int, Query(ge=1, le=100)] = 10, offset: Annotated[int, Query(ge=0, le=1000)] = 0):
+    """Most liked pieces of all time."""
+    # Walks ix_pieces_num_of_likes_id and stops after limit + offset rows
+    rows = (await db.execute(
+        select(*PIECE_COLUMNS)
+        .where(piece_t.Piece.deleted_at.is_(None))
+        .order_by(piece_t.Piece.num_of_likes.desc(), piece_t.Piece.id)
+        .limit(limit)
+        .offset(offset)
+    )).all()
+    liked_ids = await viewer_liked_ids(db, viewer, rows)
+    return rows_response(piece_sc.Piece, piece_rows(rows, liked_ids), response)
+
+@router.get("/trending", response_model=List[piece_sc.TrendingPiece])
+async def get_trending_pieces(response: Response, db: Annotated[AsyncSession, Depends(get_read_db)], viewer: Annotated[Optional[user_sc.User], Depends(OAuth2.get_current_user_optional)], limit: Annotated[int, Query(ge=1, le=100)] = 10, offset: Annotated[int, Query(ge=0, le=1000)] = 0):
+    """Most liked pieces over the last 7 days, as of the latest trending_pieces refresh."""
+    trending = trending_t.TrendingPiece
+    rows = (await db.execute(
+        select(*PIECE_COLUMNS, trending.c.recent_likes)
+        .join(trending, trending.c.piece_id == piece_t.Piece.id)
+        .where(piece_t.Piece.deleted_at.is_(None))
+        .order_by(trending.c.recent_likes.desc(), trending.c.piece_id)
+        .limit(limit)
+        .offset(offset)
+    )).all()
+    liked_ids = await viewer_liked_ids(db, viewer, rows)
+    return rows_response(piece_sc.TrendingPiece, piece_rows(rows, liked_ids), response)
+
 @router.get("/{id}", response_model=piece_sc.Piece)
-def get_piece_by_id(id: int, db: Annotated[Session, Depends(get_db)]):
-    piece = db.query(piece_t.Piece).filter(piece_t.Piece.id == id).first()
-    
+async def get_piece_by_id(id: int, db: Annotated[AsyncSession, Depends(get_read_db)], viewer: Annotated[Optional[user_sc.User], Depends(OAuth2.get_current_user_optional)]):
+    piece = await db.scalar(select(piece_t.Piece).where(piece_t.Piece.id == id, piece_t.Piece.deleted_at.is_(None)))
+
     if not piece:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Piece with id {id} was not found")
 
-    return piece
+    return piece_response(piece, await viewer_liked_ids(db, viewer, [piece]))
+
+@router.get("/{id}/similar", response_model=List[piece_sc.ScoredPiece])
+async def get_similar_pieces(id: int, response: Response, db: Annotated[AsyncSession, Depends(get_read_db)], viewer: Annotated[Optional[user_sc.User], Depends(OAuth2.get_current_user_optional)], limit: Annotated[int, Query(ge=1, le=100)] = 10):
+    """Pieces most often liked by the same users, as of the latest recommendations build."""
+    rows = (await db.execute(recommendations.similar_pieces_query(PIECE_COLUMNS, id, limit))).all()
+    if not rows and not await db.scalar(select(exists().where(piece_t.Piece.id == id, piece_t.Piece.deleted_at.is_(None)))):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Piece with id {id} was not found")
+    liked_ids = await viewer_liked_ids(db, viewer, rows)
+    return rows_response(piece_sc.ScoredPiece, piece_rows(rows, liked_ids), response)
+
+@router.get("/{id}/events", response_class=StreamingResponse)
+async def stream_like_count(id: int):
+    """Server-Sent Events: the piece's like count now, then at most one `likes` event per LIVE_COUNTS_INTERVAL_SECONDS while it changes."""
+    if not settings.live_counts_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Live like counts are disabled")
+    if not live_counts.accepting():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live streams on this server, poll /likes/count instead",
+            headers={"Retry-After": str(int(settings.live_counts_heartbeat_seconds))},
+        )
+    # Its own short session: a dependency's would stay checked out for as long as the stream is open
+    async with database.session_scope(read_only=True) as db:
+        count = await db.scalar(select(piece_t.Piece.num_of_likes).where(piece_t.Piece.id == id, piece_t.Piece.deleted_at.is_(None)))
+    if count is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Piece with id {id} was not found")
+    return StreamingResponse(
+        live_counts.stream(id, count + like_buffer.pending(id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/import", response_model=import_sc.ImportResult)
+async def import_pieces(request: Request, current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_admin_user)], fmt: Annotated[bulk_import.ImportFormat, Query(alias="format")] = "ndjson", chunk_size: Annotated[int, Query(ge=1, le=5000)] = settings.import_chunk_size):
+    """Stream NDJSON or CSV rows into pieces; bad rows are reported and skipped."""
+    return await bulk_import.import_rows("pieces", request.stream(), fmt, chunk_size)
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=piece_sc.Piece)
-def create_piece(piece: piece_sc.AddPiece, db: Annotated[Session, Depends(get_db)], current_user: Annotated[user_t.User, Depends(OAuth2.get_current_admin_user)]):
-    new_piece = piece_t.Piece(**piece.model_dump())
-    db.add(new_piece)
-    db.commit()
-    db.refresh(new_piece) # to get db generated values
+async def create_piece(piece: piece_sc.AddPiece, db: Annotated[AsyncSession, Depends(get_db)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_admin_user)]):
+    # RETURNING hands back the db generated values, no refresh needed
+    new_piece = await db.scalar(insert(piece_t.Piece).values(**piece.model_dump()).returning(piece_t.Piece))
+    await db.commit()
+    response_cache.invalidate("/pieces/")
     return new_piece
 
-@router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_piece(id: int, db: Annotated[Session, Depends(get_db)], current_user: Annotated[user_t.User, Depends(OAuth2.get_current_admin_user)]):
-    piece = db.query(piece_t.Piece).filter(piece_t.Piece.id == id).first()
-    
-    if not piece:
+@router.delete("/{id}", status_code=status.HTTP_202_ACCEPTED, response_model=deletion_sc.DeletionJob)
+async def delete_piece(id: int, response: Response, db: Annotated[AsyncSession, Depends(get_db)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_admin_user)]):
+    """Hide the piece at once and queue the job that removes its likes and then the piece; follow it at the Location returned."""
+    job = await db.scalar(deletions.soft_delete_statement(deletion_sc.DeletionKind.PIECE, id))
+
+    if job is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Piece with id {id} was not found")
-    
-    db.delete(piece)
-    db.commit()
+
+    await db.commit()
+    response_cache.invalidate("/pieces/", f"/pieces/{id}", f"/likes/count/{id}")
+    deletions.deletion_worker.wake()
+    response.headers["Location"] = f"/deletions/{job.id}"
+    return job
 
 @router.put("/{id}", response_model=piece_sc.Piece)
-def update_piece(id: int, new_piece: piece_sc.UpdatePiece, db: Annotated[Session, Depends(get_db)], current_user: Annotated[user_t.User, Depends(OAuth2.get_current_admin_user)]):
-    piece_query = db.query(piece_t.Piece).filter(piece_t.Piece.id == id)
-    piece = piece_query.first()
-    
-    if not piece:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Piece with id {id} was not found")
-    
+async def update_piece(id: int, new_piece: piece_sc.UpdatePiece, db: Annotated[AsyncSession, Depends(get_db)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_admin_user)]):
     update_data = new_piece.model_dump(exclude_unset=True)
-    
+
     # No fields to update, return the piece as is
-    if not update_data: 
-        return piece 
-    
-    piece_query.update(update_data, synchronize_session=False)
-    db.commit()
-    
-    db.refresh(piece)
-    return piece
\ No newline at end of file
+    live = (piece_t.Piece.id == id, piece_t.Piece.deleted_at.is_(None))
+    if not update_data:
+        piece = await db.scalar(select(piece_t.Piece).where(*live))
+    else:
+        piece = await db.scalar(update(piece_t.Piece).where(*live).values(**update_data).returning(piece_t.Piece))
+
+    if not piece:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Piece with id {id} was not found")
+
+    if update_data:
+        await db.commit()
+        response_cache.invalidate("/pieces/", f"/pieces/{id}")
+
+    return piece_response(piece)
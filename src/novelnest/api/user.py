@@ -1,13 +1,22 @@
-from typing import List, Annotated
-
-from fastapi import status, HTTPException, APIRouter, Depends
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
-
-from ..schemas import user_sc
-from ..core import OAuth2
-from ..core.database import get_db
+from datetime import datetime
+from typing import List, Annotated, Optional
+
+from fastapi import Query, Request, Response, status, HTTPException, APIRouter, Depends
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..schemas import deletion_sc, import_sc, piece_sc, user_sc
+from ..core import OAuth2, bulk_import, deletions, export, recommendations, tokens
+from ..core.config import settings
+from ..core.database import get_db, get_read_db
+from ..core.pagination import page, paginate
+from ..core.rate_limit import rate_limit
+from ..core.response_cache import response_cache
+from ..core.user_cache import user_cache
 from ..models import user_t
+from .piece import PIECE_COLUMNS, piece_rows
 
 router = APIRouter(
     prefix="/users",
@@ -15,119 +24,150 @@ router = APIRouter(
 )
 
 
+USER_ORDER = (user_t.User.created_at, user_t.User.id)
+
+
 @router.get("/", response_model=List[user_sc.User])
-def get_all_users(db: Annotated[Session, Depends(get_db)], limit: int = 10, offset: int = 0):
-    users = db.query(user_t.User).limit(limit).offset(offset).all()
-    return users
+async def get_all_users(response: Response, db: Annotated[AsyncSession, Depends(get_read_db)], limit: Annotated[int, Query(ge=1, le=100)] = 10, offset: Annotated[int, Query(ge=0)] = 0, cursor: Optional[str] = None):
+    users = await db.scalars(paginate(select(user_t.User).where(user_t.User.deleted_at.is_(None)), USER_ORDER, limit, offset, cursor))
+    return page(users, USER_ORDER, limit, response)
+
+@router.get("/export")
+async def export_users(current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_admin_user)], fmt: Annotated[export.ExportFormat, Query(alias="format")] = "ndjson", since: Optional[datetime] = None, gzip: bool = False):
+    """Stream every user as NDJSON or CSV, optionally only those created after `since`."""
+    return export.export_response("users", fmt, since, gzip)
+
+@router.get("/me/recommendations", response_model=List[piece_sc.ScoredPiece])
+async def get_my_recommendations(db: Annotated[AsyncSession, Depends(get_read_db)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_user)], limit: Annotated[int, Query(ge=1, le=100)] = 20):
+    """Pieces similar to the current user's latest likes that they haven't liked yet."""
+    rows = await db.execute(recommendations.recommendations_query(PIECE_COLUMNS, current_user.id, limit))
+    return piece_rows(rows, liked_ids=set())
 
 @router.get("/{id}", response_model=user_sc.User)
-def get_user_by_id(id: int, db: Annotated[Session, Depends(get_db)]):
-    user = db.query(user_t.User).filter(user_t.User.id == id).first()
-    
+async def get_user_by_id(id: int, db: Annotated[AsyncSession, Depends(get_read_db)]):
+    user = await db.scalar(select(user_t.User).where(user_t.User.id == id, user_t.User.deleted_at.is_(None)))
+
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id {id} was not found")
 
     return user
 
-@router.post("/", status_code=status.HTTP_201_CREATED, response_model=user_sc.User)
-def create_user(user: user_sc.UserCreate, db: Annotated[Session, Depends(get_db)]):
-    
-    same_username_or_email = db.query(user_t.User).filter(or_(user_t.User.username == user.username, user_t.User.email == user.email)).first()
-
-    if same_username_or_email:
-        if same_username_or_email.username == user.username:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Username '{user.username}' is already taken.")
-        if same_username_or_email.email == user.email:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Email '{user.email}' is already in use.")
-
-    
-    user.password = OAuth2.hash_password(user.password)
-        
-    new_user = user_t.User(**user.model_dump(), role = user_sc.UserRole.USER)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user) # to get db generated values
+async def raise_user_conflict(db: AsyncSession, username: Optional[str], email: Optional[str], exclude_id: Optional[int] = None):
+    """Raise the 409 naming the field that clashes with another user, if any does."""
+    query = select(user_t.User).where(or_(user_t.User.username == username, user_t.User.email == email))
+    if exclude_id is not None:
+        query = query.where(user_t.User.id != exclude_id)
+    existing = await db.scalar(query)
+
+    if existing is not None:
+        if existing.username == username:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Username '{username}' is already taken.")
+        if existing.email == email:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Email '{email}' is already in use.")
+
+async def insert_user(db: AsyncSession, user: user_sc.UserCreate, role: user_sc.UserRole):
+    # Reject clashes before paying for bcrypt, as the bulk importer does
+    await raise_user_conflict(db, user.username, user.email)
+    user.password = await OAuth2.ahash_password(user.password)
+
+    # A clash with a user created since the check inserts nothing instead of raising; only then do we look up which one
+    new_user = await db.scalar(
+        pg_insert(user_t.User)
+        .values(**user.model_dump(), role=role)
+        .on_conflict_do_nothing()
+        .returning(user_t.User)
+    )
+
+    if new_user is None:
+        await raise_user_conflict(db, user.username, user.email)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Username or email is already in use.")
+
+    await db.commit()
     return new_user
 
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=user_sc.User, dependencies=[Depends(rate_limit("signup"))])
+async def create_user(user: user_sc.UserCreate, db: Annotated[AsyncSession, Depends(get_db)]):
+    return await insert_user(db, user, user_sc.UserRole.USER)
+
 @router.post("/admin", status_code=status.HTTP_201_CREATED, response_model=user_sc.User)
-def create_admin_user(user: user_sc.UserCreate, db: Annotated[Session, Depends(get_db)], current_user: Annotated[user_t.User, Depends(OAuth2.get_current_admin_user)]):
-
-    same_username_or_email = db.query(user_t.User).filter(or_(user_t.User.username == user.username, user_t.User.email == user.email)).first()
-
-    if same_username_or_email:
-        if same_username_or_email.username == user.username:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Username '{user.username}' is already taken.")
-        if same_username_or_email.email == user.email:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Email '{user.email}' is already in use.")
-    
-    user.password = OAuth2.hash_password(user.password)
-        
-    new_user = user_t.User(**user.model_dump(), role = user_sc.UserRole.ADMIN)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user) # to get db generated values
-    return new_user
+async def create_admin_user(user: user_sc.UserCreate, db: Annotated[AsyncSession, Depends(get_db)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_admin_user)]):
+    return await insert_user(db, user, user_sc.UserRole.ADMIN)
+
+@router.post("/import", response_model=import_sc.ImportResult)
+async def import_users(request: Request, current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_admin_user)], fmt: Annotated[bulk_import.ImportFormat, Query(alias="format")] = "ndjson", chunk_size: Annotated[int, Query(ge=1, le=5000)] = settings.import_chunk_size):
+    """Stream NDJSON or CSV rows into users; bad rows are reported and skipped."""
+    return await bulk_import.import_rows("users", request.stream(), fmt, chunk_size)
 
-@router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(id: int, db: Annotated[Session, Depends(get_db)], current_user: Annotated[user_t.User, Depends(OAuth2.get_current_user)]):
-    
+@router.delete("/{id}", status_code=status.HTTP_202_ACCEPTED, response_model=deletion_sc.DeletionJob)
+async def delete_user(id: int, response: Response, db: Annotated[AsyncSession, Depends(get_db)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_user)]):
+    """Lock the account out at once and queue the job that removes its likes and then the user."""
     OAuth2.require_admin_or_self(id, current_user)
 
-    user = db.query(user_t.User).filter(user_t.User.id == id).first()
-    
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id {id} was not found")
-    
-    db.delete(user)
-    db.commit()
+    job = await db.scalar(deletions.soft_delete_statement(deletion_sc.DeletionKind.USER, id))
 
-@router.put("/{id}", response_model=user_sc.User)
-def update_user(id: int, new_user: user_sc.UserUpdate, db: Annotated[Session, Depends(get_db)], current_user: Annotated[user_t.User, Depends(OAuth2.get_current_user)]):
-    user_query = db.query(user_t.User).filter(user_t.User.id == id)
-    user = user_query.first()
-    
-    if not user:
+    if job is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id {id} was not found")
 
+    await db.commit()
+    await user_cache.invalidate(id)
+    await tokens.revocations.revoke_user(id)
+    response_cache.invalidate(f"/users/{id}")
+    deletions.deletion_worker.wake()
+    response.headers["Location"] = f"/deletions/{job.id}"
+    return job
+
+@router.put("/{id}", response_model=user_sc.User)
+async def update_user(id: int, new_user: user_sc.UserUpdate, db: Annotated[AsyncSession, Depends(get_db)], current_user: Annotated[user_sc.User, Depends(OAuth2.get_current_user)]):
     # Check if user can access this data
     OAuth2.require_admin_or_self(id, current_user)
 
     update_data = new_user.model_dump(exclude_unset=True)
     user_update_data = new_user.model_dump(exclude_unset=True, exclude={'role'})
-    
+
     # Only admins can change roles
     if new_user.role != None and current_user.role != user_sc.UserRole.ADMIN:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
+            status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can change user roles"
         )
-        
+
     # No fields to update, return the user as is
-    if not update_data: 
-        return user 
+    live = (user_t.User.id == id, user_t.User.deleted_at.is_(None))
+    if not update_data:
+        user = await db.scalar(select(user_t.User).where(*live))
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id {id} was not found")
+        return user
 
     # Admins acn only change roles
     if user_update_data:
         OAuth2.require_self(id, current_user)
 
+    # Missing users and clashes are answered before paying for bcrypt
+    if not await db.scalar(select(user_t.User.id).where(*live)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id {id} was not found")
+    if 'username' in update_data or 'email' in update_data:
+        await raise_user_conflict(db, update_data.get('username'), update_data.get('email'), exclude_id=id)
 
-    conflict_query = db.query(user_t.User).filter(user_t.User.id != id)
-        
-    if new_user.username != None:
-        existing_username = conflict_query.filter(user_t.User.username == update_data['username']).first()
-        if existing_username:   
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Username '{new_user.username}' is already taken.")
+    if new_user.password != None:
+        update_data['password'] = await OAuth2.ahash_password(new_user.password)
 
-    if new_user.email != None:
-        existing_email = conflict_query.filter(user_t.User.email == update_data['email']).first()
-        if existing_email:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Email '{new_user.email}' is already in use.")
-        
+    try:
+        user = await db.scalar(update(user_t.User).where(*live).values(**update_data).returning(user_t.User))
+    except IntegrityError:
+        # Taken by a user created or renamed since the check
+        await db.rollback()
+        await raise_user_conflict(db, update_data.get('username'), update_data.get('email'), exclude_id=id)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Username or email is already in use.")
+
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id {id} was not found")
+
+    await db.commit()
+    await user_cache.invalidate(id)
+    response_cache.invalidate(f"/users/{id}")
     if new_user.password != None:
-        new_user.password = OAuth2.hash_password(new_user.password)
-    
-    user_query.update(update_data, synchronize_session=False)
-    db.commit()
-    
-    db.refresh(user)
-    return user
\ No newline at end of file
+        # Sessions opened with the old password end here
+        await tokens.revocations.revoke_user(id)
+
+    return user
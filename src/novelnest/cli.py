@@ -0,0 +1,118 @@
+"""Command line tools that run against the configured database.
+
+    novelnest import pieces catalogue.ndjson
+    novelnest import users people.csv --chunk-size 500
+    python -m novelnest.cli import pieces - < catalogue.ndjson
+    novelnest refresh-trending
+    novelnest build-recommendations --block-pieces 50000
+    novelnest likes-partitions --exact --max-skew 1.2
+    novelnest run-deletions --chunk-size 5000
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from .core import bulk_import, database, deletions, like_partitions, passwords, recommendations, trending
+from .core.config import settings
+from .models import like_t, piece_t, user_t  # noqa: F401  every mapper must be registered before the first query
+
+
+async def read_file(path: str, size: int = 1 << 16):
+    stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while chunk := stream.read(size):
+            yield chunk
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+async def run_import(args) -> int:
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    try:
+        result = await bulk_import.import_rows(args.kind, read_file(args.path), fmt, args.chunk_size)
+    finally:
+        await database.dispose_engines()
+    print(result.model_dump_json(indent=2))
+    return 1 if result.failed else 0
+
+
+async def run_refresh_trending(args) -> int:
+    try:
+        refreshed = await trending.refresh_trending()
+    finally:
+        await database.dispose_engines()
+    print("trending_pieces refreshed" if refreshed else "Another refresh is in progress, skipped")
+    return 0
+
+
+async def run_build_recommendations(args) -> int:
+    try:
+        result = await recommendations.build_recommendations(block_pieces=args.block_pieces, batch_size=args.batch_size)
+    finally:
+        await database.dispose_engines()
+    print(json.dumps(result, indent=2) if result is not None else "Another build is in progress, skipped")
+    return 0
+
+
+async def run_likes_partitions(args) -> int:
+    try:
+        result = await like_partitions.partition_balance(exact=args.exact, hot_pieces=args.hot_pieces)
+    finally:
+        await database.dispose_engines()
+    if result is None:
+        print("likes is not partitioned; run alembic upgrade head")
+        return 1
+    print(json.dumps(result, indent=2))
+    # Non-zero past --max-skew, so cron or CI can alert on it
+    return 1 if result["skew"] > args.max_skew else 0
+
+
+async def run_deletions(args) -> int:
+    try:
+        chunks = await deletions.run_deletions(args.chunk_size)
+    finally:
+        await database.dispose_engines()
+    print(f"Ran {chunks} deletion chunks, no unfinished jobs left")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="novelnest", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="Bulk import pieces or users from NDJSON or CSV")
+    importer.add_argument("kind", choices=sorted(bulk_import.IMPORTERS))
+    importer.add_argument("path", help="File to read, or - for stdin")
+    importer.add_argument("--format", choices=["ndjson", "csv"], help="Defaults to csv for *.csv files, ndjson otherwise")
+    importer.add_argument("--chunk-size", type=int, default=settings.import_chunk_size)
+    importer.set_defaults(run=run_import)
+
+    refresher = commands.add_parser("refresh-trending", help="Recompute the trending_pieces view now, e.g. from cron")
+    refresher.set_defaults(run=run_refresh_trending)
+
+    builder = commands.add_parser("build-recommendations", help="Recompute piece_similarities from likes (needs the recommendations extra)")
+    builder.add_argument("--block-pieces", type=int, default=settings.recommendations_block_pieces, help="Pieces per pass; lower it to use less memory")
+    builder.add_argument("--batch-size", type=int, default=recommendations.BUILD_BATCH_SIZE, help="Likes per fetch")
+    builder.set_defaults(run=run_build_recommendations)
+
+    balance = commands.add_parser("likes-partitions", help="Rows, size and share of each hash partition of likes, and the hottest pieces")
+    balance.add_argument("--exact", action="store_true", help="Count rows instead of using the planner's estimates; scans all of likes")
+    balance.add_argument("--max-skew", type=float, default=1.5, help="Exit with 1 when the largest partition exceeds the mean by this factor")
+    balance.add_argument("--hot-pieces", type=int, default=10, help="Most liked pieces to list with their partition")
+    balance.set_defaults(run=run_likes_partitions)
+
+    deleter = commands.add_parser("run-deletions", help="Finish every queued user and piece deletion now, e.g. when DELETION_POLL_SECONDS is 0")
+    deleter.add_argument("--chunk-size", type=int, default=settings.deletion_chunk_size, help="Likes deleted per transaction")
+    deleter.set_defaults(run=run_deletions)
+
+    args = parser.parse_args(argv)
+    try:
+        sys.exit(asyncio.run(args.run(args)))
+    finally:
+        passwords.pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,89 @@
-from datetime import datetime, timedelta, timezone
-from typing import Annotated
+from typing import Annotated, Optional
 
-import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..schemas import auth_sc, user_sc
 from ..core import database
 from ..models import user_t
+from . import passwords, tokens
 from .config import settings
+from .user_cache import user_cache
 
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return passwords.pwd_context.verify(plain_password, hashed_password)
 
 def hash_password(password: str):
-    return pwd_context.hash(password)
+    return passwords.pwd_context.hash(password)
 
-def create_access_token(data: dict):
-    to_encode = data.copy()
+# bcrypt is CPU bound, run it in the bounded process pool (503 when saturated)
+async def averify_and_update_password(plain_password, hashed_password):
+    return await passwords.pool.run(passwords.verify_and_update, plain_password, hashed_password)
 
-    expire = datetime.now(timezone.utc) + timedelta(minutes=settings.access_token_expire_minutes)
-    to_encode.update({"exp": expire})
+async def ahash_password(password: str):
+    return await passwords.pool.run(passwords.hash_password, password)
 
+def create_access_token(data: dict):
     try:
-        encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algo)
-        return encoded_jwt
+        return tokens.token_verifier.create(data, expires_in=settings.access_token_expire_minutes * 60)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Could not create access token"
         )
 
-def verify_access_token(token: str, credentials_exception):
-    try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algo])
-        user_id: str = payload.get("user_id")
-        if user_id is None:
-            raise credentials_exception
-        token_data = auth_sc.TokenData(id=str(user_id))
-        return token_data
-    except InvalidTokenError as e:
-        raise credentials_exception
-    except Exception as e:
-        raise credentials_exception
-
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Annotated[Session, Depends(database.get_db)]):
-    credentials_exception = HTTPException(
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials", 
+        detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"}
     )
 
-    token_data = verify_access_token(token, credentials_exception)
+async def verify_access_token(token: str) -> auth_sc.TokenData:
+    try:
+        return await tokens.token_verifier.verify(token)
+    except InvalidTokenError:
+        raise credentials_exception()
+
+async def get_token_data(token: Annotated[str, Depends(oauth2_scheme)]):
+    return await verify_access_token(token)
+
+async def get_current_user(token_data: Annotated[auth_sc.TokenData, Depends(get_token_data)], db: Annotated[AsyncSession, Depends(database.get_db)]):
+    user_id = int(token_data.id)
+
+    if settings.user_cache_enabled:
+        # The version is read before the SELECT, so an update landing in between keeps this row out of the cache
+        user, version = await user_cache.get(user_id)
+        if user is not None:
+            return user
+
+    db_user = await db.scalar(select(user_t.User).where(user_t.User.id == user_id, user_t.User.deleted_at.is_(None)))
+
+    if not db_user:
+        raise credentials_exception()
+
+    user = user_sc.User.model_validate(db_user)
+    if settings.user_cache_enabled:
+        await user_cache.set(user, version)
 
-    user = db.query(user_t.User).filter(user_t.User.id == token_data.id).first()
-    
-    if not user:
-        raise credentials_exception
-    
     return user
 
-def get_current_admin_user(current_user: Annotated[user_t.User, Depends(get_current_user)]):
+async def get_current_user_optional(token: Annotated[Optional[str], Depends(optional_oauth2_scheme)], db: Annotated[AsyncSession, Depends(database.get_db)]):
+    """The viewer for endpoints that also serve anonymous requests; a bad token is still a 401."""
+    if token is None:
+        return None
+    return await get_current_user(await verify_access_token(token), db)
+
+async def get_current_admin_user(current_user: Annotated[user_sc.User, Depends(get_current_user)]):
     if current_user.role != user_sc.UserRole.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -77,7 +91,7 @@ def get_current_admin_user(current_user: Annotated[user_t.User, Depends(get_curr
         )
     return current_user
 
-def require_admin_or_self(user_id: int, current_user: Annotated[user_t.User, Depends(get_current_user)]):
+def require_admin_or_self(user_id: int, current_user: Annotated[user_sc.User, Depends(get_current_user)]):
     if current_user.role != user_sc.UserRole.ADMIN and current_user.id != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -85,7 +99,7 @@ def require_admin_or_self(user_id: int, current_user: Annotated[user_t.User, Dep
         )
     return current_user
 
-def require_self(user_id: int, current_user: Annotated[user_t.User, Depends(get_current_user)]):
+def require_self(user_id: int, current_user: Annotated[user_sc.User, Depends(get_current_user)]):
     if current_user.id != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
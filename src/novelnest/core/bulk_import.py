@@ -0,0 +1,192 @@
+import codecs
+import csv
+import json
+import logging
+from typing import AsyncIterator, Literal
+
+from pydantic import ValidationError
+from sqlalchemy import String, any_, bindparam, insert, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.exc import DBAPIError
+
+from ..models import piece_t, user_t
+from ..schemas import import_sc, piece_sc, user_sc
+from . import database, passwords
+from .config import settings
+from .response_cache import response_cache
+
+
+logger = logging.getLogger(__name__)
+
+ImportFormat = Literal["ndjson", "csv"]
+MAX_REPORTED_ERRORS = 1000
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.removesuffix("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.removesuffix("\r")
+
+
+async def iter_records(chunks: AsyncIterator[bytes], fmt: ImportFormat):
+    """Yield (row, dict) for each record, or (row, message) when it can't be parsed."""
+    row = 0
+    if fmt == "ndjson":
+        async for line in iter_lines(chunks):
+            if not line.strip():
+                continue
+            row += 1
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                yield row, f"Invalid JSON: {e}"
+                continue
+            yield row, data if isinstance(data, dict) else "Expected a JSON object"
+        return
+
+    header, pending = None, ""
+    async for line in iter_lines(chunks):
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            continue  # a quoted field goes on over the next line
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row += 1
+        if len(values) != len(header):
+            yield row, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        # Empty cells fall back to the schema default
+        yield row, {name: value for name, value in zip(header, values) if value != ""}
+    if pending:
+        yield row + 1, "Unterminated quoted field"
+
+
+async def write_pieces(db, batch):
+    await db.execute(insert(piece_t.Piece), [piece.model_dump() for _, piece in batch])
+    return []
+
+
+async def write_users(db, batch):
+    User = user_t.User
+    errors, accepted = [], []
+
+    # Reject clashes before paying for bcrypt: existing users first, then duplicates within the chunk
+    taken = (await db.execute(
+        select(User.username, User.email).where(or_(
+            User.username == any_(bindparam("usernames", [user.username for _, user in batch], type_=ARRAY(String))),
+            User.email == any_(bindparam("emails", [user.email for _, user in batch], type_=ARRAY(String))),
+        ))
+    )).all()
+    usernames = {username for username, _ in taken}
+    emails = {email for _, email in taken}
+    for row, user in batch:
+        if user.username in usernames:
+            errors.append((row, f"Username '{user.username}' is already taken."))
+        elif user.email in emails:
+            errors.append((row, f"Email '{user.email}' is already in use."))
+        else:
+            usernames.add(user.username)
+            emails.add(user.email)
+            accepted.append((row, user))
+    if not accepted:
+        return errors
+
+    hashes = await passwords.pool.map(passwords.hash_password, [user.password for _, user in accepted])
+    inserted = set(await db.scalars(
+        pg_insert(User).on_conflict_do_nothing().returning(User.username),
+        [{**user.model_dump(), "password": hashed, "role": user_sc.UserRole.USER} for (_, user), hashed in zip(accepted, hashes)],
+    ))
+    # Only rows created by a concurrent writer since the check above end up here
+    errors += [(row, "Username or email is already in use.") for row, user in accepted if user.username not in inserted]
+    return errors
+
+
+IMPORTERS = {
+    "pieces": (piece_sc.AddPiece, write_pieces),
+    "users": (user_sc.UserCreate, write_users),
+}
+
+
+def db_error_message(error: DBAPIError) -> str:
+    message = str(error.orig).strip().splitlines()[0]
+    # asyncpg errors are prefixed with their class
+    if message.startswith("<class"):
+        message = message.split(": ", 1)[-1]
+    return message
+
+
+async def write_chunk(db, write, batch):
+    """Write one chunk in a single transaction; returns (row, message) for rejected rows."""
+    try:
+        errors = await write(db, batch)
+        await db.commit()
+        return errors
+    except DBAPIError:
+        await db.rollback()
+
+    # A row broke the statement (e.g. a value too long for its column): retry one by one to isolate it
+    errors = []
+    for row, item in batch:
+        try:
+            errors += await write(db, [(row, item)])
+            await db.commit()
+        except DBAPIError as e:
+            await db.rollback()
+            errors.append((row, db_error_message(e)))
+    return errors
+
+
+async def import_rows(kind: str, chunks: AsyncIterator[bytes], fmt: ImportFormat, chunk_size: int = settings.import_chunk_size) -> import_sc.ImportResult:
+    """Stream NDJSON or CSV rows into `kind` ("pieces" or "users").
+
+    Rows are validated against the create schema and written `chunk_size` at a
+    time, each chunk in its own transaction, so an interrupted import keeps the
+    chunks already committed. Bad rows are reported and skipped.
+    """
+    schema, write = IMPORTERS[kind]
+    result = import_sc.ImportResult(imported=0, failed=0, errors=[])
+
+    def fail(row, messages):
+        result.failed += 1
+        if len(result.errors) < MAX_REPORTED_ERRORS:
+            result.errors.append(import_sc.ImportRowError(row=row, errors=messages))
+
+    async def flush(db, batch):
+        errors = await write_chunk(db, write, batch)
+        for row, message in errors:
+            fail(row, [message])
+        result.imported += len(batch) - len(errors)
+
+    batch = []
+    async with database.session_scope() as db:
+        async for row, data in iter_records(chunks, fmt):
+            if isinstance(data, str):
+                fail(row, [data])
+                continue
+            try:
+                batch.append((row, schema.model_validate(data)))
+            except ValidationError as e:
+                fail(row, [f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}" for error in e.errors()])
+            if len(batch) >= chunk_size:
+                await flush(db, batch)
+                batch = []
+        if batch:
+            await flush(db, batch)
+
+    result.errors.sort(key=lambda error: error.row)
+    if kind == "pieces" and result.imported:
+        response_cache.invalidate("/pieces/")
+    logger.info("Imported %d %s, %d rows rejected", result.imported, kind, result.failed)
+    return result
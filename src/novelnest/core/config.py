@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+
 from pydantic import ConfigDict
 from pydantic_settings import BaseSettings
 
@@ -7,9 +9,102 @@ class Settings(BaseSettings):
     db_password: str
     db_name: str
     db_username: str
+    db_replica_hostname: Optional[str] = None  # GET handlers read from this server when set
+    db_replica_port: Optional[str] = None
     secret_key: str
     algo: str
     access_token_expire_minutes: int
+    # PEM files for asymmetric ALGO values (RS256, ES256, EdDSA, ...); HS* algorithms sign with secret_key
+    jwt_private_key_file: Optional[str] = None
+    jwt_public_key_file: Optional[str] = None
+
+    # Use the asyncpg engine and AsyncSession; false falls back to psycopg2 in the threadpool
+    db_async: bool = True
+
+    # Connection pool per engine and worker process; size it so workers * (size + overflow) fits max_connections
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = True
+    db_pool_warmup: int = 0  # connections opened per pool at startup, at most db_pool_size
+    # Behind PgBouncer in transaction mode: NullPool and no server-side prepared statements
+    db_pgbouncer: bool = False
+
+    # At startup, compare the database's Alembic revision with alembic/: "fail" refuses to start when they differ
+    schema_check: Literal["fail", "warn", "off"] = "fail"
+    readiness_timeout_seconds: float = 2  # per database check at startup and on /readyz
+
+    # Authenticated-user cache used by get_current_user
+    user_cache_enabled: bool = True
+    user_cache_ttl_seconds: float = 30
+    user_cache_max_entries: int = 10_000
+    user_cache_backend_url: Optional[str] = None  # e.g. redis://localhost:6379/0 or memory://
+
+    # Verified token claims cache and revocation list (logout, password change)
+    token_cache_max_entries: int = 10_000
+    token_cache_ttl_seconds: float = 300
+    token_revocation_max_entries: int = 100_000
+    token_revocation_backend_url: Optional[str] = None  # share revocations between workers, e.g. redis://localhost:6379/0
+
+    # Password hashing; changing bcrypt_rounds rehashes each user's password at their next login
+    bcrypt_rounds: int = 12
+    password_workers: int = 2
+    password_queue_size: int = 32
+    password_retry_after_seconds: int = 1
+
+    # Write-behind num_of_likes: buffer per-piece deltas and flush them in batches
+    like_buffer_enabled: bool = False
+    like_buffer_flush_seconds: float = 1.0
+    like_buffer_flush_threshold: int = 1000
+
+    # Token buckets per route, "<requests>/<seconds>": bursts of up to <requests>, refilled evenly over <seconds>.
+    # login and signup are keyed by client IP, like by user id; remove a route to leave it unlimited
+    rate_limit_enabled: bool = True
+    rate_limits: dict[str, str] = {"login": "10/60", "signup": "5/60", "like": "60/60"}
+    rate_limit_backend_url: Optional[str] = None  # share buckets between workers, e.g. redis://localhost:6379/0
+    rate_limit_max_keys: int = 100_000
+
+    # Per-route latency, in-flight and SQL statement metrics on /metrics
+    request_metrics_enabled: bool = True
+    server_timing_enabled: bool = True  # Server-Timing header with SQL count and time; turn off to hide it from clients
+    slow_query_log_ms: Optional[float] = None  # log statements slower than this, with the route that ran them
+
+    # Seconds between trending_pieces refreshes in each worker; 0 leaves it to `novelnest refresh-trending`
+    trending_refresh_seconds: float = 300
+
+    # Like counts pushed to GET /pieces/{id}/events subscribers (Server-Sent Events)
+    live_counts_enabled: bool = True
+    live_counts_interval_seconds: float = 0.5  # a piece's changes are coalesced into at most one event per interval
+    live_counts_backend: Literal["local", "postgres"] = "local"  # postgres: LISTEN/NOTIFY, so every worker's subscribers see every like
+    live_counts_max_subscribers: int = 10_000  # open streams per worker; more are refused with 503
+    live_counts_heartbeat_seconds: float = 15
+
+    # Co-like recommendations, rebuilt by `novelnest build-recommendations` and kept current from like events
+    recommendations_neighbours: int = 50  # similar pieces kept per piece
+    recommendations_block_pieces: int = 20_000  # pieces whose co-like counts one build pass holds in memory
+    recommendations_max_user_likes: int = 500  # heavier users are sampled down by the build and skipped by updates
+    recommendations_update_seconds: float = 5  # apply buffered like events this often; 0 leaves it to the build
+
+    # Cache anonymous GETs of pieces, like counts and users in-process, with ETag/304 support
+    response_cache_enabled: bool = True
+    response_cache_ttl_seconds: float = 5
+    response_cache_max_entries: int = 10_000
+
+    # DELETE /users/{id} and /pieces/{id} tombstone the row; a background job then removes its likes in chunks
+    deletion_chunk_size: int = 1000  # likes deleted per transaction; each one locks the pieces it decrements until it commits
+    deletion_chunk_pause_seconds: float = 0.05  # between chunks, to leave room for other writers
+    deletion_poll_seconds: float = 5  # look for unfinished jobs this often; 0 leaves them to `novelnest run-deletions`
+    deletion_retry_seconds: float = 60  # a job whose last chunk failed waits this long while later jobs go ahead
+
+    # Rows validated, hashed and inserted per transaction by the bulk importers
+    import_chunk_size: int = 1000
+    # Rows fetched per round-trip from the server-side cursor behind the export endpoints
+    export_batch_size: int = 2000
+
+    # List pages on the pieces and likes routers are rendered straight from Core rows (with orjson when installed);
+    # true re-validates each page against its response schema first
+    fast_json_validate: bool = False
 
     model_config = ConfigDict(env_file=".env")
 
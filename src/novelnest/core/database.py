@@ -1,20 +1,268 @@
-from sqlalchemy import create_engine
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from starlette.concurrency import run_in_threadpool
 
 from .config import settings
+from .metrics import Counter, Gauge, Histogram
 
 SQLALCHEMY_DATABASE_URL = f'postgresql://{settings.db_username}:{settings.db_password}@{settings.db_hostname}:{settings.db_port}/{settings.db_name}'
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+ASYNC_SQLALCHEMY_DATABASE_URL = f'postgresql+asyncpg://{settings.db_username}:{settings.db_password}@{settings.db_hostname}:{settings.db_port}/{settings.db_name}'
+
+
+pool_wait = Histogram(
+    "novelnest_db_pool_checkout_seconds",
+    "Time to get a connection from the pool, including waiting for a free one",
+    ["role", "driver"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30),
+)
+pool_timeouts = Counter("novelnest_db_pool_timeouts_total", "Checkouts that gave up after db_pool_timeout", ["role", "driver"])
+pool_in_use = Gauge("novelnest_db_pool_connections_in_use", "Connections currently checked out of the pool", ["role", "driver"])
+
+
+def _timed_pool(base, **labels):
+    class TimedPool(base):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                pool_timeouts.inc(**labels)
+                raise
+            finally:
+                pool_wait.observe(time.perf_counter() - start, **labels)
+
+    return TimedPool
+
+
+def _engine_options(role: str, driver: str) -> dict:
+    if settings.db_pgbouncer:
+        # PgBouncer in transaction mode owns pooling; a server connection can change between
+        # transactions, so keep no idle connections and no named prepared statements
+        options = {"poolclass": _timed_pool(NullPool, role=role, driver=driver)}
+        if driver == "asyncpg":
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        return options
+    return {
+        "poolclass": _timed_pool(AsyncAdaptedQueuePool if driver == "asyncpg" else QueuePool, role=role, driver=driver),
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def _track_in_use(sync_engine, role: str, driver: str):
+    event.listen(sync_engine, "checkout", lambda *args: pool_in_use.inc(role=role, driver=driver))
+    event.listen(sync_engine, "checkin", lambda *args: pool_in_use.dec(role=role, driver=driver))
+
+
+_engines = {}  # role -> (sync, async), see engines()
+_sessionmakers = {}  # read_only -> (sync, async)
+# Called with every sync engine (asyncpg engines through their sync_engine) as it is created
+_engine_hooks = []
+
+
+def on_engine_created(hook):
+    """Run `hook(sync_engine)` on the engines that already exist and on every one created later."""
+    if hook not in _engine_hooks:
+        _engine_hooks.append(hook)
+    for sync_engine, async_engine in set(_engines.values()):
+        hook(sync_engine)
+        hook(async_engine.sync_engine)
+
+
+def make_engines(role: str, hostname: str, port: str):
+    """Sync (psycopg2) and async (asyncpg) engines for one server, with pool settings and metrics."""
+    address = f'{settings.db_username}:{settings.db_password}@{hostname}:{port}/{settings.db_name}'
+    sync_engine = create_engine(f'postgresql://{address}', **_engine_options(role, "psycopg2"))
+    async_engine = create_async_engine(f'postgresql+asyncpg://{address}', **_engine_options(role, "asyncpg"))
+    _track_in_use(sync_engine, role, "psycopg2")
+    _track_in_use(async_engine.sync_engine, role, "asyncpg")
+    for hook in _engine_hooks:
+        hook(sync_engine)
+        hook(async_engine.sync_engine)
+    return sync_engine, async_engine
+
+
+def engines(role: str = "primary"):
+    """(sync, async) engines for "primary" or "replica", created on first use rather than at import.
+
+    Without a replica configured, "replica" is the primary's pair.
+    """
+    pair = _engines.get(role)
+    if pair is None:
+        if role == "primary":
+            pair = make_engines("primary", settings.db_hostname, settings.db_port)
+        elif settings.db_replica_hostname:
+            pair = make_engines("replica", settings.db_replica_hostname, settings.db_replica_port or settings.db_port)
+        else:
+            pair = engines("primary")
+        _engines[role] = pair
+    return pair
+
+
+def sessionmakers(read_only: bool = False):
+    """(sync, async) session factories; GET handlers read through the read_only pair."""
+    pair = _sessionmakers.get(read_only)
+    if pair is None:
+        sync_engine, async_engine = engines("replica" if read_only else "primary")
+        # expire_on_commit=False so returned ORM objects can be serialized after commit without implicit IO
+        pair = (
+            sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=sync_engine),
+            async_sessionmaker(autoflush=False, expire_on_commit=False, bind=async_engine),
+        )
+        _sessionmakers[read_only] = pair
+    return pair
+
+
+_LAZY = {
+    "engine": lambda: engines("primary")[0],
+    "async_engine": lambda: engines("primary")[1],
+    "read_engine": lambda: engines("replica")[0],
+    "async_read_engine": lambda: engines("replica")[1],
+    "SessionLocal": lambda: sessionmakers(False)[0],
+    "AsyncSessionLocal": lambda: sessionmakers(False)[1],
+    "ReadSessionLocal": lambda: sessionmakers(True)[0],
+    "AsyncReadSessionLocal": lambda: sessionmakers(True)[1],
+}
+
+
+def __getattr__(name):
+    # database.engine, database.AsyncSessionLocal, ... keep working but only connect once used
+    if name in _LAZY:
+        return _LAZY[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+async def warm_up_pools(connections: int):
+    """Open up to `connections` pooled connections on each engine the handlers use, so early requests don't connect."""
+    if settings.db_pgbouncer:
+        return  # NullPool keeps nothing to warm
+    count = min(connections, settings.db_pool_size)
+    for sync_engine, async_engine in {engines("primary"), engines("replica")}:
+        if settings.db_async:
+            opened = await asyncio.gather(*(async_engine.connect().start() for _ in range(count)))
+            await asyncio.gather(*(conn.close() for conn in opened))
+        else:
+            opened = [await run_in_threadpool(sync_engine.connect) for _ in range(count)]
+            for conn in opened:
+                await run_in_threadpool(conn.close)
+
+
+async def dispose_engines():
+    """Close every pooled connection of the engines created so far."""
+    for sync_engine, async_engine in set(_engines.values()):
+        sync_engine.dispose()
+        await async_engine.dispose()
+    _engines.clear()
+    _sessionmakers.clear()
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Parent class of all our database tables
 class Base(DeclarativeBase):
     pass
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+class SyncSessionAdapter:
+    """Exposes a sync Session through the AsyncSession API.
+
+    Every call that may hit the database runs in Starlette's threadpool, so the
+    async handlers work unchanged on top of the psycopg2 engine (DB_ASYNC=false).
+    """
+
+    def __init__(self, sync_session):
+        self.sync_session = sync_session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, params, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self, objects=None):
+        await run_in_threadpool(self.sync_session.flush, objects)
+
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+
+@asynccontextmanager
+async def session_scope(read_only: bool = False):
+    """Session for work outside a request (background jobs, CLI), same API as get_db.
+
+    read_only=True uses the replica when one is configured; it may lag the primary.
+    """
+    sync_factory, async_factory = sessionmakers(read_only)
+    if settings.db_async:
+        async with async_factory() as db:
+            yield db
+    else:
+        db = SyncSessionAdapter(sync_factory())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+
+async def stream_partitions(statement, size: int, read_only: bool = True):
+    """Yield lists of at most `size` rows from a server-side cursor on one dedicated connection."""
+    sync_engine, async_engine = engines("replica" if read_only else "primary")
+    if settings.db_async:
+        async with async_engine.connect() as conn:
+            result = await conn.stream(statement.execution_options(yield_per=size))
+            async for rows in result.partitions():
+                yield rows
+    else:
+        conn = await run_in_threadpool(sync_engine.connect)
+        try:
+            result = await run_in_threadpool(conn.execution_options(yield_per=size).execute, statement)
+            while rows := await run_in_threadpool(result.fetchmany, size):
+                yield rows
+        finally:
+            await run_in_threadpool(conn.close)
+
+
+async def get_db():
+    async with session_scope() as db:
+        yield db
+
+
+async def get_read_db():
+    async with session_scope(read_only=True) as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from sqlalchemy import Integer, column, delete, exists, func, insert, literal, or_, select, update, values
+
+from ..models import deletion_t, like_t, piece_t, user_t
+from ..schemas.deletion_sc import DeletionKind, DeletionStatus
+from . import database
+from .config import settings
+from .live_counts import live_counts
+from .metrics import Counter
+from .response_cache import response_cache
+
+
+logger = logging.getLogger(__name__)
+
+Job = deletion_t.DeletionJob
+Like = like_t.Like
+TARGETS = {DeletionKind.USER: user_t.User, DeletionKind.PIECE: piece_t.Piece}
+# kind -> (likes column holding the target's id, the other key column)
+LIKE_KEYS = {DeletionKind.USER: (Like.user_id, Like.piece_id), DeletionKind.PIECE: (Like.piece_id, Like.user_id)}
+
+chunks = Counter("novelnest_deletion_chunks_total", "Deletion job chunks by outcome", ["result"])
+likes_removed = Counter("novelnest_deletion_likes_removed_total", "Likes removed by deletion jobs")
+finished = Counter("novelnest_deletion_jobs_finished_total", "Users and pieces removed for good by deletion jobs", ["kind"])
+
+
+def soft_delete_statement(kind: DeletionKind, target_id: int):
+    """Tombstone the user or piece and queue its deletion job in one statement.
+
+    Returns the new job, or no row when the target doesn't exist or is
+    already being deleted.
+    """
+    target = TARGETS[kind]
+    tombstoned = (
+        update(target)
+        .where(target.id == target_id, target.deleted_at.is_(None))
+        .values(deleted_at=func.now())
+        .returning(target.id)
+        .cte("tombstoned")
+    )
+    return (
+        insert(Job)
+        .from_select(["kind", "target_id"], select(literal(kind, Job.kind.type), tombstoned.c.id))
+        .returning(Job)
+    )
+
+
+async def run_chunk(chunk_size: int = settings.deletion_chunk_size, retry_seconds: float = settings.deletion_retry_seconds) -> bool:
+    """Advance the oldest unfinished deletion job by one chunk; False when none is waiting.
+
+    Up to `chunk_size` of the target's likes are deleted, the pieces a deleted
+    user had liked get one grouped decrement each, and the job's progress is
+    updated, all in one transaction: a job stopped at any point resumes where
+    it left off. The chunk that leaves no likes behind deletes the row itself.
+    Jobs are claimed with SKIP LOCKED, so several workers share the queue
+    without running the same job at once. A job whose last chunk failed is
+    passed over for `retry_seconds`, so one that keeps failing can't hold up
+    the jobs queued after it.
+    """
+    async with database.session_scope() as db:
+        job = (await db.execute(
+            select(Job.id, Job.kind, Job.target_id, Job.likes_total)
+            .where(Job.finished_at.is_(None), or_(Job.last_error.is_(None), Job.updated_at < func.now() - timedelta(seconds=retry_seconds)))
+            .order_by(Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )).one_or_none()
+        if job is None:
+            return False
+
+        try:
+            owner, other = LIKE_KEYS[job.kind]
+            progress = {"status": DeletionStatus.RUNNING, "updated_at": func.now(), "last_error": None}
+            if job.likes_total is None:
+                progress["likes_total"] = await db.scalar(select(func.count()).select_from(Like).where(owner == job.target_id))
+
+            # The chunk is a key range on the target's index, (user_id, piece_id) or (piece_id, user_id), so it
+            # reads only the rows it deletes instead of all that are left; none for the last chunk
+            batch = [owner == job.target_id]
+            bound = await db.scalar(select(other).where(*batch).order_by(other).offset(chunk_size - 1).limit(1))
+            if bound is not None:
+                batch.append(other <= bound)
+            removed = (await db.scalars(delete(Like).where(*batch).returning(Like.piece_id))).all()
+            progress["likes_deleted"] = Job.likes_deleted + len(removed)
+
+            decrements = {}
+            if job.kind == DeletionKind.USER:
+                for piece_id in removed:
+                    decrements[piece_id] = decrements.get(piece_id, 0) + 1
+            if decrements:
+                # Sorted, like the write-behind buffer's flush, so concurrent jobs lock pieces in the same order
+                rows = values(column("id", Integer), column("delta", Integer), name="decrements").data(sorted(decrements.items()))
+                await db.execute(
+                    update(piece_t.Piece)
+                    .where(piece_t.Piece.id == rows.c.id)
+                    .values(num_of_likes=func.greatest(piece_t.Piece.num_of_likes - rows.c.delta, 0))
+                    .execution_options(synchronize_session=False)
+                )
+
+            # Not len(removed) < chunk_size: another job may have taken some of this batch's likes first
+            done = not await db.scalar(select(exists().where(owner == job.target_id)))
+            if done:
+                target = TARGETS[job.kind]
+                await db.execute(delete(target).where(target.id == job.target_id))
+                progress.update(status=DeletionStatus.DONE, finished_at=func.now())
+            await db.execute(update(Job).where(Job.id == job.id).values(**progress))
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            await db.execute(update(Job).where(Job.id == job.id).values(last_error=f"{type(e).__name__}: {e}"[:1000], updated_at=func.now()))
+            await db.commit()
+            chunks.inc(result="error")
+            raise
+
+    chunks.inc(result="ok")
+    likes_removed.inc(len(removed))
+    if done:
+        finished.inc(kind=job.kind.value)
+    if decrements:
+        response_cache.invalidate("/pieces/", *(f"/pieces/{piece_id}" for piece_id in decrements), *(f"/likes/count/{piece_id}" for piece_id in decrements))
+        if settings.live_counts_enabled:
+            for piece_id in decrements:
+                live_counts.touch(piece_id)
+    return True
+
+
+async def run_deletions(chunk_size: int = settings.deletion_chunk_size) -> int:
+    """Run chunks until no unfinished job is left; returns how many ran."""
+    ran = 0
+    while await run_chunk(chunk_size):
+        ran += 1
+    return ran
+
+
+class DeletionWorker:
+    """Works through deletion jobs in the background.
+
+    Checks for unfinished jobs every `interval` seconds, or at once when
+    woken by a delete endpoint, then runs chunks until the queue is empty,
+    sleeping `pause` seconds between chunks to bound the write rate. Jobs
+    left unfinished by a restart or another worker are picked up the same way.
+    """
+
+    def __init__(self, interval: float, pause: float, chunk_size: int):
+        self.interval = interval
+        self.pause = pause
+        self.chunk_size = chunk_size
+        self._wake = asyncio.Event()
+        self._timer = None
+
+    def wake(self):
+        self._wake.set()
+
+    async def _run_timer(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                # Shielded per chunk so stopping never abandons one half-written; the job itself resumes later
+                while await asyncio.shield(run_chunk(self.chunk_size)):
+                    await asyncio.sleep(self.pause)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Deletion job chunk failed, retrying in %s s", self.interval)
+
+    async def start(self):
+        self._timer = asyncio.get_running_loop().create_task(self._run_timer())
+
+    async def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+
+
+deletion_worker = DeletionWorker(
+    interval=settings.deletion_poll_seconds,
+    pause=settings.deletion_chunk_pause_seconds,
+    chunk_size=settings.deletion_chunk_size,
+)
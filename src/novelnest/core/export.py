@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from enum import Enum
+from typing import Literal, Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from ..models import like_t, piece_t, user_t
+from ..schemas import like_sc, piece_sc, user_sc
+from . import database
+from .config import settings
+from .serialization import schema_columns
+
+
+ExportFormat = Literal["ndjson", "csv"]
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+# kind -> (columns, order, column for since=); users go through user_sc.User, which has no password
+EXPORTS = {
+    "pieces": (schema_columns(piece_t.Piece.__table__, piece_sc.Piece), (piece_t.Piece.created_at, piece_t.Piece.id), piece_t.Piece.created_at),
+    "users": (schema_columns(user_t.User.__table__, user_sc.User), (user_t.User.created_at, user_t.User.id), user_t.User.created_at),
+    "likes": (schema_columns(like_t.Like.__table__, like_sc.Like), (like_t.Like.user_id, like_t.Like.piece_id), like_t.Like.created_at),
+}
+# Soft-deleted rows are left out; their likes go with them once the deletion job runs
+LIVE_ROWS = {"pieces": piece_t.Piece.deleted_at.is_(None), "users": user_t.User.deleted_at.is_(None)}
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def render_ndjson(names, rows) -> bytes:
+    return "".join(json.dumps(dict(zip(names, map(_plain, row))), ensure_ascii=False) + "\n" for row in rows).encode()
+
+
+def render_csv(names, rows, header: bool) -> bytes:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if header:
+        writer.writerow(names)
+    writer.writerows([_plain(value) for value in row] for row in rows)
+    return out.getvalue().encode()
+
+
+async def export_chunks(kind: str, fmt: ExportFormat, since: Optional[datetime] = None, compress: bool = False, batch_size: int = settings.export_batch_size):
+    """Encoded export of a whole table, one server-side cursor batch at a time."""
+    columns, order, since_column = EXPORTS[kind]
+    names = [column.name for column in columns]
+    stmt = select(*columns).order_by(*order)
+    if kind in LIVE_ROWS:
+        stmt = stmt.where(LIVE_ROWS[kind])
+    if since is not None:
+        stmt = stmt.where(since_column > since)
+
+    gzip = zlib.compressobj(wbits=31) if compress else None
+    if fmt == "csv":
+        # Header on its own so an empty export is still a valid CSV
+        header = render_csv(names, [], header=True)
+        yield gzip.compress(header) if gzip else header
+    async for rows in database.stream_partitions(stmt, batch_size):
+        chunk = render_ndjson(names, rows) if fmt == "ndjson" else render_csv(names, rows, header=False)
+        if gzip:
+            chunk = gzip.compress(chunk)
+            if not chunk:
+                continue
+        yield chunk
+    if gzip:
+        yield gzip.flush()
+
+
+def export_response(kind: str, fmt: ExportFormat, since: Optional[datetime], compress: bool) -> StreamingResponse:
+    if since is not None and EXPORTS[kind][2] is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Incremental export is not available for {kind}")
+    headers = {"Content-Disposition": f'attachment; filename="{kind}.{fmt}"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(export_chunks(kind, fmt, since, compress), media_type=MEDIA_TYPES[fmt], headers=headers)
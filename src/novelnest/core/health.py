@@ -0,0 +1,139 @@
+import ast
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, ProgrammingError
+
+from . import database
+from .config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# The migrations next to src/ in a checkout, as configured under [tool.alembic] in pyproject.toml
+MIGRATIONS_DIR = Path(__file__).resolve().parents[3] / "alembic"
+
+# What a database that is down, refusing connections or too slow looks like from here
+UNAVAILABLE = (OSError, DBAPIError, TimeoutError)
+
+
+class SchemaMismatchError(RuntimeError):
+    pass
+
+
+def _revision_ids(path: Path) -> tuple:
+    """(revision, down_revisions) of one migration file, read without importing it."""
+    ids = {}
+    for node in ast.parse(path.read_text()).body:
+        if isinstance(node, (ast.Assign, ast.AnnAssign)):
+            target = node.targets[0] if isinstance(node, ast.Assign) else node.target
+            if isinstance(target, ast.Name) and target.id in ("revision", "down_revision"):
+                ids[target.id] = ast.literal_eval(node.value)
+    down = ids.get("down_revision")
+    return ids["revision"], (down,) if isinstance(down, str) else tuple(down or ())
+
+
+@lru_cache
+def expected_heads() -> frozenset:
+    """Head revisions of the migrations shipped with this code; empty when alembic/ isn't next to it.
+
+    Loading alembic's ScriptDirectory imports every migration, which costs more
+    than the rest of startup; a revision nothing revises is a head all the same.
+    """
+    if not MIGRATIONS_DIR.is_dir():
+        return frozenset()
+    revisions, revised = set(), set()
+    for path in (MIGRATIONS_DIR / "versions").glob("*.py"):
+        revision, down_revisions = _revision_ids(path)
+        revisions.add(revision)
+        revised.update(down_revisions)
+    return frozenset(revisions - revised)
+
+
+async def current_heads(db) -> frozenset:
+    try:
+        return frozenset(await db.scalars(text("SELECT version_num FROM alembic_version")))
+    except ProgrammingError:  # no alembic_version table: never migrated
+        await db.rollback()
+        return frozenset()
+
+
+def schema_problem(current: frozenset) -> str | None:
+    expected = expected_heads()
+    if not expected or current == expected:
+        return None
+    return (
+        f"Database schema is at {', '.join(sorted(current)) or 'no revision'} but this code expects "
+        f"{', '.join(sorted(expected))}; run `alembic upgrade head`"
+    )
+
+
+async def check_schema():
+    """Refuse to start (SCHEMA_CHECK=fail) or warn when the database isn't at the migrations' head."""
+    if settings.schema_check == "off":
+        return
+    if not expected_heads():
+        logger.warning("No migrations found at %s, skipping the schema check", MIGRATIONS_DIR)
+        return
+    async with database.session_scope() as db:
+        problem = schema_problem(await current_heads(db))
+    if problem and settings.schema_check == "fail":
+        raise SchemaMismatchError(problem)
+    if problem:
+        logger.warning(problem)
+
+
+async def prepare_database():
+    """Lifespan startup: schema check, then pool warm-up when DB_POOL_WARMUP is set.
+
+    An unreachable database is logged rather than fatal, so workers can start
+    before Postgres does; /readyz reports it until it is reachable.
+    """
+    try:
+        async with asyncio.timeout(settings.readiness_timeout_seconds):
+            await check_schema()
+        if settings.db_pool_warmup > 0:
+            async with asyncio.timeout(settings.readiness_timeout_seconds):
+                await database.warm_up_pools(settings.db_pool_warmup)
+    except UNAVAILABLE as e:
+        logger.warning("Database unavailable at startup (%s: %s); /readyz reports it until it is reachable", type(e).__name__, e)
+
+
+def pool_status(role: str) -> dict:
+    sync_engine, async_engine = database.engines(role)
+    pool = (async_engine if settings.db_async else sync_engine).pool
+    if not hasattr(pool, "checkedout"):
+        return {"class": type(pool).__name__}  # NullPool behind PgBouncer keeps nothing
+    # overflow() counts down from -size while the pool is still filling
+    return {"open": pool.size() + pool.overflow(), "checked_out": pool.checkedout(), "max": pool.size() + settings.db_max_overflow}
+
+
+async def readiness() -> tuple[bool, dict]:
+    """A round-trip through the pool to each database the handlers use, plus pool usage and schema revision.
+
+    A pool with no connection free within READINESS_TIMEOUT_SECONDS counts as unavailable.
+    """
+    checks = {}
+    heads = None
+    for role in ("primary", "replica") if settings.db_replica_hostname else ("primary",):
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(settings.readiness_timeout_seconds):
+                async with database.session_scope(read_only=role == "replica") as db:
+                    if role == "primary":
+                        heads = await current_heads(db)
+                    else:
+                        await db.execute(text("SELECT 1"))
+            checks[role] = {"status": "ok", "ms": round((time.perf_counter() - start) * 1000, 2)}
+        except UNAVAILABLE as e:
+            checks[role] = {"status": "unavailable", "error": type(e).__name__}
+        checks[role]["pool"] = pool_status(role)
+
+    if heads is not None and settings.schema_check != "off":
+        checks["schema"] = {"status": "mismatch" if schema_problem(heads) else "ok", "revision": sorted(heads)}
+    ready = all(check["status"] == "ok" for check in checks.values())
+    return ready, checks
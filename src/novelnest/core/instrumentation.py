@@ -0,0 +1,143 @@
+import logging
+import re
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from . import database
+from .config import settings
+from .metrics import Gauge, Histogram
+
+
+logger = logging.getLogger(__name__)
+
+request_seconds = Histogram(
+    "novelnest_http_request_duration_seconds",
+    "Time from receiving a request to the last byte of its response",
+    ["method", "route", "status"],
+)
+in_flight = Gauge("novelnest_http_requests_in_flight", "Requests being handled right now", ["method", "route"])
+request_statements = Histogram(
+    "novelnest_http_request_db_statements",
+    "SQL statements executed per request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 50),
+)
+request_db_seconds = Histogram(
+    "novelnest_http_request_db_seconds",
+    "Time per request spent waiting on SQL statements",
+    ["method", "route"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+
+UNMATCHED = "unmatched"  # one label for every 404 so scanners can't blow up the series count
+
+
+class RequestStats:
+    __slots__ = ("method", "route", "statements", "db_seconds")
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+# Mutated in place, so statements run in the threadpool (DB_ASYNC=false) still count towards their request
+current_request: ContextVar[RequestStats | None] = ContextVar("novelnest_request_stats", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._novelnest_started = time.perf_counter()
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._novelnest_started
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+    if settings.slow_query_log_ms is not None and elapsed * 1000 >= settings.slow_query_log_ms:
+        where = f"{stats.method} {stats.route}" if stats is not None else "outside a request"
+        logger.warning("Slow query, %.1f ms, %s: %s", elapsed * 1000, where, " ".join(statement.split())[:1000])
+
+
+def _instrument(sync_engine):
+    if not event.contains(sync_engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+
+def instrument_engines():
+    """Count every statement on the primary and replica engines, both drivers, including engines created later."""
+    database.on_engine_created(_instrument)
+
+
+_NAMED_GROUP = re.compile(r"\(\?P<\w+>")
+
+def route_matchers(routes) -> dict:
+    """method -> (regex, templates): all of that method's route paths in one alternation, in routing order."""
+    patterns = {}
+    for route in routes:
+        methods = getattr(route, "methods", None)
+        if not methods or not hasattr(route, "path_regex"):
+            continue
+        for method in methods:
+            patterns.setdefault(method, []).append((_NAMED_GROUP.sub("(?:", route.path_regex.pattern), route.path))
+    return {
+        method: (re.compile("|".join(f"(?P<r{i}>{pattern})" for i, (pattern, _) in enumerate(entries))), [path for _, path in entries])
+        for method, entries in patterns.items()
+    }
+
+
+class InstrumentationMiddleware:
+    """Per-route latency, in-flight and SQL metrics, plus a Server-Timing header.
+
+    The route template (/pieces/{id}) is resolved up front with one regex
+    match, so the in-flight gauge carries it while the handler runs. Server-
+    Timing reports the statements run before the response started; rows a
+    streaming response fetches afterwards only show up in the metrics.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._matchers = None
+
+    def route_of(self, scope) -> str:
+        if self._matchers is None:
+            self._matchers = route_matchers(scope["app"].routes)
+        matcher = self._matchers.get(scope["method"])
+        if matcher is None:
+            return UNMATCHED
+        match = matcher[0].match(scope["path"])
+        return matcher[1][int(match.lastgroup[1:])] if match else UNMATCHED
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        stats = RequestStats(scope["method"], self.route_of(scope))
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.server_timing_enabled:
+                    timing = (
+                        f'db;dur={stats.db_seconds * 1000:.2f};desc="statements: {stats.statements}", '
+                        f"app;dur={(time.perf_counter() - start) * 1000:.2f}"
+                    )
+                    message["headers"] = [*message.get("headers", ()), (b"server-timing", timing.encode())]
+            await send(message)
+
+        in_flight.inc(method=stats.method, route=stats.route)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            in_flight.dec(method=stats.method, route=stats.route)
+            current_request.reset(token)
+            request_seconds.observe(time.perf_counter() - start, method=stats.method, route=stats.route, status=status)
+            request_statements.observe(stats.statements, method=stats.method, route=stats.route)
+            request_db_seconds.observe(stats.db_seconds, method=stats.method, route=stats.route)
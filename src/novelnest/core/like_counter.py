@@ -0,0 +1,183 @@
+import asyncio
+import logging
+
+import asyncpg
+from sqlalchemy import Integer, column, func, select, update, values
+
+from ..models import like_t, piece_t
+from . import database
+from .config import settings
+from .metrics import Counter, Gauge
+from .response_cache import response_cache
+
+
+logger = logging.getLogger(__name__)
+
+# Every buffering worker holds this advisory lock in shared mode while it runs, so a
+# worker can only take it exclusively (and safely rebuild counters) when no other
+# worker may still be holding unflushed deltas.
+ADVISORY_LOCK_KEY = 0x6E6E6C63  # "nnlc"
+
+flushes = Counter("novelnest_like_buffer_flushes_total", "Batched num_of_likes flushes by outcome", ["result"])
+flushed_pieces = Counter("novelnest_like_buffer_flushed_pieces_total", "Piece counters updated by batched flushes")
+reconciled_pieces = Counter("novelnest_like_reconcile_repaired_total", "Piece counters repaired by the reconcile job")
+
+
+def reconcile_statement(first_id: int | None = None, last_id: int | None = None):
+    """UPDATE that sets drifted num_of_likes back to COUNT(*) from likes, optionally for an id range."""
+    actual = (
+        select(func.count())
+        .select_from(like_t.Like)
+        .where(like_t.Like.piece_id == piece_t.Piece.id)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(piece_t.Piece)
+        .where(piece_t.Piece.num_of_likes != actual)
+        .values(num_of_likes=actual)
+        .execution_options(synchronize_session=False)
+    )
+    if first_id is not None:
+        stmt = stmt.where(piece_t.Piece.id.between(first_id, last_id))
+    return stmt
+
+
+async def reconcile_like_counts(chunk_size: int = 1000) -> dict:
+    """Repair counter drift across all pieces, one id range per transaction.
+
+    Each chunk commits on its own so row locks are held briefly. With the
+    write-behind buffer enabled this worker's deltas are flushed first; deltas
+    other workers haven't flushed yet can still be counted twice, so run it
+    when traffic is low.
+    """
+    if settings.like_buffer_enabled:
+        await like_buffer.flush()
+
+    repaired = 0
+    async with database.session_scope() as db:
+        max_id = await db.scalar(select(func.max(piece_t.Piece.id))) or 0
+        for first_id in range(1, max_id + 1, chunk_size):
+            last_id = min(first_id + chunk_size - 1, max_id)
+            result = await db.execute(reconcile_statement(first_id, last_id))
+            await db.commit()
+            repaired += result.rowcount
+    reconciled_pieces.inc(repaired)
+    if repaired:
+        response_cache.clear()
+    logger.info("Like counter reconcile checked piece ids up to %d, repaired %d", max_id, repaired)
+    return {"max_piece_id": max_id, "pieces_repaired": repaired}
+
+
+class LikeCounterBuffer:
+    """Write-behind buffer for pieces.num_of_likes.
+
+    toggle_like records the like row immediately and only adds a +1/-1 delta
+    here; deltas are summed per piece and applied to `pieces` in one UPDATE
+    every `flush_interval` seconds, or sooner once `flush_threshold` events are
+    buffered. Readers add `pending(piece_id)` to what they load from the table.
+    """
+
+    def __init__(self, flush_interval: float, flush_threshold: int):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._deltas = {}
+        self._in_flight = {}
+        self._events = 0
+        self._flush_lock = asyncio.Lock()
+        self._timer = None
+        self._early_flush = None
+        self._lock_conn = None
+
+    def add(self, piece_id: int, delta: int):
+        self._deltas[piece_id] = self._deltas.get(piece_id, 0) + delta
+        self._events += 1
+        if self._events >= self.flush_threshold and (self._early_flush is None or self._early_flush.done()):
+            self._early_flush = asyncio.get_running_loop().create_task(self.flush())
+
+    def pending(self, piece_id: int) -> int:
+        return self._deltas.get(piece_id, 0) + self._in_flight.get(piece_id, 0)
+
+    def pending_events(self) -> int:
+        return self._events
+
+    async def flush(self):
+        async with self._flush_lock:
+            batch = {piece_id: delta for piece_id, delta in self._deltas.items() if delta}
+            self._deltas, self._events = {}, 0
+            if not batch:
+                return
+            self._in_flight = batch
+            try:
+                # Sorted so concurrent flushes from several workers lock rows in the same order
+                rows = values(column("id", Integer), column("delta", Integer), name="deltas").data(sorted(batch.items()))
+                async with database.session_scope() as db:
+                    await db.execute(
+                        update(piece_t.Piece)
+                        .where(piece_t.Piece.id == rows.c.id)
+                        .values(num_of_likes=piece_t.Piece.num_of_likes + rows.c.delta)
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+            except Exception:
+                # Keep the deltas for the next attempt
+                for piece_id, delta in batch.items():
+                    self._deltas[piece_id] = self._deltas.get(piece_id, 0) + delta
+                self._events += len(batch)
+                flushes.inc(result="error")
+                logger.exception("Failed to flush %d buffered like counters", len(batch))
+            else:
+                flushes.inc(result="ok")
+                flushed_pieces.inc(len(batch))
+            finally:
+                self._in_flight = {}
+
+    async def _run_timer(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Shielded so stopping the timer never abandons a batch half-written
+            await asyncio.shield(self.flush())
+
+    async def _acquire_startup_lock(self):
+        # Held for the life of the worker, so on its own connection rather than taking one of the pool's for good
+        conn = await asyncpg.connect(
+            host=settings.db_hostname, port=int(settings.db_port), user=settings.db_username,
+            password=settings.db_password, database=settings.db_name,
+        )
+        try:
+            reconcile = await conn.fetchval("SELECT pg_try_advisory_lock($1)", ADVISORY_LOCK_KEY)
+            if reconcile:
+                # No other worker is buffering: whatever a crashed worker had pending is lost, rebuild from likes
+                # one id range per transaction, as the admin job does, instead of locking every piece at once
+                await reconcile_like_counts()
+            await conn.execute("SELECT pg_advisory_lock_shared($1)", ADVISORY_LOCK_KEY)
+            if reconcile:
+                await conn.execute("SELECT pg_advisory_unlock($1)", ADVISORY_LOCK_KEY)
+        except BaseException:
+            await conn.close()
+            raise
+        return conn
+
+    async def start(self):
+        self._lock_conn = await self._acquire_startup_lock()
+        self._timer = asyncio.get_running_loop().create_task(self._run_timer())
+
+    async def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        await self.flush()
+        if self._lock_conn is not None:
+            await self._lock_conn.close()
+            self._lock_conn = None
+
+
+like_buffer = LikeCounterBuffer(
+    flush_interval=settings.like_buffer_flush_seconds,
+    flush_threshold=settings.like_buffer_flush_threshold,
+)
+
+Gauge("novelnest_like_buffer_pending_events", "Like/unlike events waiting to be flushed to pieces.num_of_likes", function=like_buffer.pending_events)
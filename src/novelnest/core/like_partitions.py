@@ -0,0 +1,58 @@
+from sqlalchemy import text
+
+from . import database
+
+
+PARTITIONS_SQL = text("""
+    SELECT c.relname AS name,
+           substring(pg_get_expr(c.relpartbound, c.oid) FROM 'remainder (\\d+)')::int AS remainder,
+           greatest(c.reltuples, 0)::bigint AS rows,
+           pg_total_relation_size(c.oid) AS bytes
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass('likes')
+    ORDER BY remainder
+""")
+EXACT_ROWS_SQL = text("SELECT tableoid::regclass::text AS name, count(*) FROM likes GROUP BY 1")
+# The most liked pieces and the partition each hashes to: one piece can outweigh the rest of its partition
+HOT_PIECES_SQL = text("""
+    SELECT p.id, p.num_of_likes, r.remainder
+    FROM (SELECT id, num_of_likes FROM pieces ORDER BY num_of_likes DESC, id LIMIT :limit) AS p
+    CROSS JOIN generate_series(0, :modulus - 1) AS r(remainder)
+    WHERE satisfies_hash_partition('likes'::regclass, :modulus, r.remainder, p.id)
+    ORDER BY p.num_of_likes DESC, p.id
+""")
+
+
+async def partition_balance(exact: bool = False, hot_pieces: int = 10) -> dict | None:
+    """Rows, size and share of each hash partition of likes; None when likes isn't partitioned.
+
+    Row counts are the planner's estimates from the last ANALYZE unless
+    `exact`, which counts every row in one scan. `skew` is the largest
+    partition over the mean, 1.0 when perfectly even.
+    """
+    async with database.session_scope(read_only=True) as db:
+        partitions = [row._asdict() for row in await db.execute(PARTITIONS_SQL)]
+        if not partitions:
+            return None
+        if exact:
+            counts = dict((await db.execute(EXACT_ROWS_SQL)).all())
+            for partition in partitions:
+                partition["rows"] = counts.get(partition["name"], 0)
+        names = {partition["remainder"]: partition["name"] for partition in partitions}
+        hot = [
+            {"piece_id": piece_id, "likes": likes, "partition": names[remainder]}
+            for piece_id, likes, remainder in await db.execute(HOT_PIECES_SQL, {"limit": hot_pieces, "modulus": len(partitions)})
+        ]
+
+    total = sum(partition["rows"] for partition in partitions)
+    mean = total / len(partitions)
+    for partition in partitions:
+        partition["share"] = round(partition["rows"] / total, 4) if total else 0
+        del partition["remainder"]
+    return {
+        "rows": total,
+        "exact": exact,
+        "skew": round(max(partition["rows"] for partition in partitions) / mean, 3) if total else 1.0,
+        "partitions": partitions,
+        "hot_pieces": hot,
+    }
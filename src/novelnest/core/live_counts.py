@@ -0,0 +1,321 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+import asyncpg
+from sqlalchemy import Integer, any_, bindparam, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from ..models import piece_t
+from . import database
+from .config import settings
+from .like_counter import like_buffer
+from .metrics import Counter, Gauge
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "novelnest_like_counts"
+NOTIFY_BATCH = 400  # pieces per NOTIFY payload, well under Postgres's 8000-byte limit
+RECONNECT_SECONDS = 1
+HEARTBEAT = b": ping\n\n"  # an SSE comment, so idle streams aren't cut by proxies
+
+publishes = Counter("novelnest_live_count_publishes_total", "Coalesced like-count batches published by outcome", ["result"])
+events_sent = Counter("novelnest_live_count_events_total", "Like-count events written to subscribers")
+coalesced = Counter("novelnest_live_count_coalesced_total", "Like-count updates replaced by a newer one before a subscriber took them")
+rejected = Counter("novelnest_live_count_rejected_total", "Subscriptions refused because the worker was at LIVE_COUNTS_MAX_SUBSCRIBERS")
+
+
+def sse_event(piece_id: int, count: int) -> bytes:
+    return f'event: likes\ndata: {{"piece_id": {piece_id}, "like_count": {count}}}\n\n'.encode()
+
+
+class Subscription:
+    """One client's stream of one piece's like count.
+
+    Only the latest count is kept: a client that reads slower than counts
+    change skips the values in between instead of queueing them, so a slow
+    consumer costs one slot however hot the piece is.
+    """
+
+    __slots__ = ("piece_id", "count", "_changed", "_ready")
+
+    def __init__(self, piece_id: int, count: int):
+        self.piece_id = piece_id
+        self.count = count
+        self._changed = False
+        self._ready = asyncio.Event()
+
+    def offer(self, count: int):
+        if self._changed:
+            coalesced.inc()
+        self.count = count
+        self._changed = True
+        self._ready.set()
+
+    def ping(self):
+        self._ready.set()
+
+    def latest(self) -> int:
+        """The current count, taking any change waiting in the slot."""
+        self._changed = False
+        self._ready.clear()
+        return self.count
+
+    async def next(self) -> int | None:
+        """The next count, or None when woken by a heartbeat with nothing new."""
+        await self._ready.wait()
+        if not self._changed:
+            self._ready.clear()
+            return None
+        return self.latest()
+
+
+class Broadcaster:
+    """This worker's subscriptions by piece; `deliver` hands each of them the latest count."""
+
+    def __init__(self, max_subscribers: int):
+        self.max_subscribers = max_subscribers
+        self._subscriptions = defaultdict(set)
+        self._count = 0
+
+    def full(self) -> bool:
+        return self._count >= self.max_subscribers
+
+    def subscribe(self, piece_id: int, count: int) -> Subscription:
+        subscription = Subscription(piece_id, count)
+        self._subscriptions[piece_id].add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.piece_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.piece_id]
+        self._count -= 1
+
+    def watched(self, piece_id: int) -> bool:
+        return piece_id in self._subscriptions
+
+    def subscriber_count(self) -> int:
+        return self._count
+
+    def deliver(self, counts: dict):
+        for piece_id, count in counts.items():
+            for subscription in self._subscriptions.get(piece_id, ()):
+                subscription.offer(count)
+
+    def ping(self):
+        """Wake every stream so idle ones write a heartbeat; one timer for all of them instead of one each."""
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.ping()
+
+
+class LiveCountsBackend:
+    """Carries published counts to the broadcaster of every worker that should see them."""
+
+    # Whether other workers' subscribers see what this worker publishes
+    shared = False
+
+    async def start(self, deliver):
+        self._deliver = deliver
+
+    async def publish(self, counts: dict):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class LocalBackend(LiveCountsBackend):
+    """Single worker: published counts go straight to this process's subscribers."""
+
+    async def publish(self, counts):
+        self._deliver(counts)
+
+
+class PostgresBackend(LiveCountsBackend):
+    """Postgres LISTEN/NOTIFY: every worker publishes with pg_notify and listens on one dedicated connection.
+
+    A worker also receives its own notifications, so nothing is delivered
+    locally on publish. Counts notified while the listening connection was down
+    are lost; the next change to the piece catches its subscribers up.
+    """
+
+    shared = True
+
+    def __init__(self):
+        self._listener = None
+
+    async def start(self, deliver):
+        await super().start(deliver)
+        self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            conn = None
+            try:
+                # Outside the pool, which shouldn't lose a connection for good, and never through PgBouncer's transaction mode
+                conn = await asyncpg.connect(
+                    host=settings.db_hostname, port=int(settings.db_port), user=settings.db_username,
+                    password=settings.db_password, database=settings.db_name,
+                )
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(CHANNEL, self._on_notify)
+                await lost.wait()
+                logger.warning("Lost the live like-count listener connection, reconnecting")
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning("Live like-count listener can't connect (%s: %s), retrying", type(e).__name__, e)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        self._deliver(dict(json.loads(payload)))
+
+    async def publish(self, counts):
+        items = sorted(counts.items())
+        async with database.session_scope() as db:
+            for start in range(0, len(items), NOTIFY_BATCH):
+                payload = json.dumps(items[start:start + NOTIFY_BATCH], separators=(",", ":"))
+                await db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+            await db.commit()  # notifications go out on commit
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+def backend_from_name(name: str) -> LiveCountsBackend:
+    if name == "local":
+        return LocalBackend()
+    if name == "postgres":
+        return PostgresBackend()
+    raise ValueError(f"Unsupported live counts backend: {name}")
+
+
+class LiveCounts:
+    """Pushes like counts to GET /pieces/{id}/events subscribers.
+
+    toggle_like only marks the piece; every `interval` seconds the marked
+    pieces' counts are read in one query and published as one batch, so a hot
+    piece produces one update per interval however many likes it gets. Each
+    stream also waits `interval` between events, which holds with several
+    workers publishing too.
+    """
+
+    def __init__(self, interval: float, heartbeat: float, max_subscribers: int, backend: LiveCountsBackend):
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.backend = backend
+        self.broadcaster = Broadcaster(max_subscribers)
+        self._dirty = set()
+        self._timer = None
+
+    def touch(self, piece_id: int):
+        if self.backend.shared or self.broadcaster.watched(piece_id):
+            self._dirty.add(piece_id)
+
+    def accepting(self) -> bool:
+        if self.broadcaster.full():
+            rejected.inc()
+            return False
+        return True
+
+    async def stream(self, piece_id: int, count: int):
+        """SSE body: `count`, then each change, with a comment line as heartbeat while idle.
+
+        Subscribes once the response starts streaming, so a client gone before
+        that never leaves a subscription behind.
+        """
+        subscription = self.broadcaster.subscribe(piece_id, count)
+        loop = asyncio.get_running_loop()
+        try:
+            sent, sent_at = count, loop.time()
+            yield sse_event(piece_id, sent)
+            events_sent.inc()
+            while True:
+                count = await subscription.next()
+                if count is None:
+                    yield HEARTBEAT
+                    continue
+                if count == sent:
+                    continue
+                # At most one event per interval; whatever arrives meanwhile is coalesced into the slot
+                wait = sent_at + self.interval - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    count = subscription.latest()
+                yield sse_event(piece_id, count)
+                events_sent.inc()
+                sent, sent_at = count, loop.time()
+        finally:
+            self.broadcaster.unsubscribe(subscription)
+
+    async def flush(self):
+        dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        try:
+            # The primary, so a count never goes backwards because of replica lag
+            async with database.session_scope() as db:
+                rows = await db.execute(
+                    select(piece_t.Piece.id, piece_t.Piece.num_of_likes)
+                    .where(piece_t.Piece.id == any_(bindparam("ids", list(dirty), type_=ARRAY(Integer))))
+                )
+                counts = {piece_id: count + like_buffer.pending(piece_id) for piece_id, count in rows}
+            if counts:
+                await self.backend.publish(counts)
+        except Exception:
+            self._dirty |= dirty
+            publishes.inc(result="error")
+            logger.exception("Failed to publish like counts for %d pieces", len(dirty))
+        else:
+            publishes.inc(result="ok")
+
+    async def _run_timer(self):
+        loop = asyncio.get_running_loop()
+        pinged_at = loop.time()
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.shield(self.flush())
+            if loop.time() - pinged_at >= self.heartbeat:
+                self.broadcaster.ping()
+                pinged_at = loop.time()
+
+    async def start(self):
+        await self.backend.start(self.broadcaster.deliver)
+        self._timer = asyncio.get_running_loop().create_task(self._run_timer())
+
+    async def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        await self.flush()
+        await self.backend.stop()
+
+
+live_counts = LiveCounts(
+    interval=settings.live_counts_interval_seconds,
+    heartbeat=settings.live_counts_heartbeat_seconds,
+    max_subscribers=settings.live_counts_max_subscribers,
+    backend=backend_from_name(settings.live_counts_backend),
+)
+
+Gauge("novelnest_live_count_subscribers", "Open GET /pieces/{id}/events streams in this worker", function=live_counts.broadcaster.subscriber_count)
@@ -0,0 +1,47 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, columns) -> tuple:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return tuple(
+            datetime.fromisoformat(value) if column.type.python_type is datetime else int(value)
+            for column, value in zip(columns, values)
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def paginate(stmt, columns, limit: int, offset: int = 0, cursor: str | None = None):
+    """Order `stmt` by the unique key `columns` and page it.
+
+    With a cursor the page starts right after the encoded key (keyset, cost
+    independent of depth); without one the legacy offset is applied. One extra
+    row is fetched so `page` can tell whether there is a next page.
+    """
+    stmt = stmt.order_by(*columns)
+    if cursor:
+        stmt = stmt.where(tuple_(*columns) > decode_cursor(cursor, columns))
+    else:
+        stmt = stmt.offset(offset)
+    return stmt.limit(limit + 1)
+
+def page(rows, columns, limit: int, response: Response):
+    """Trim the look-ahead row and expose the next cursor in a response header."""
+    rows = list(rows)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+    return rows
@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from .config import settings
+from .metrics import Counter, Gauge
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
+
+
+# Run inside the worker processes
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+def verify_and_update(plain_password: str, hashed_password: str):
+    """Return (valid, new_hash); new_hash is set when the stored hash uses an outdated cost."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+rejected = Counter("novelnest_password_jobs_rejected_total", "Password hash/verify jobs refused because the queue was full")
+
+
+class PasswordPool:
+    """Size-limited process pool for bcrypt work.
+
+    At most `workers + max_queue` jobs may be pending; beyond that callers get a
+    503 with Retry-After instead of piling up behind a login storm.
+    """
+
+    def __init__(self, workers: int, max_queue: int, retry_after: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.pending = 0
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.pending >= self.workers + self.max_queue:
+            rejected.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def map(self, fn, items: list) -> list:
+        """fn(item) for every item, meant for admin batch work such as imports.
+
+        Each item is its own executor job and at most `workers` of them are in
+        flight, each counted in `pending`. A `run` issued meanwhile waits for one
+        item at most, or is refused with the 503 as soon as interactive jobs fill
+        the queue, instead of queueing behind the whole batch.
+        """
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.workers)
+
+        async def job(item):
+            async with slots:
+                self.pending += 1
+                try:
+                    return await loop.run_in_executor(self._get_executor(), fn, item)
+                finally:
+                    self.pending -= 1
+
+        return list(await asyncio.gather(*(job(item) for item in items)))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+pool = PasswordPool(
+    workers=settings.password_workers,
+    max_queue=settings.password_queue_size,
+    retry_after=settings.password_retry_after_seconds,
+)
+
+Gauge("novelnest_password_jobs_pending", "Password jobs running or queued in the process pool", function=lambda: pool.pending)
@@ -0,0 +1,168 @@
+import logging
+import math
+import time
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Request, Response, status
+
+from ..schemas import auth_sc
+from . import OAuth2
+from .cache import TTLCache
+from .config import settings
+from .metrics import Counter
+
+
+logger = logging.getLogger(__name__)
+
+decisions = Counter("novelnest_rate_limit_requests_total", "Rate limited routes by outcome", ["route", "result"])
+
+
+class Limit:
+    """Token bucket holding `capacity` tokens, refilled evenly over `period` seconds."""
+
+    def __init__(self, capacity: int, period: float):
+        if capacity < 1 or period <= 0:
+            raise ValueError("A rate limit needs at least one request per positive period")
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+        self.policy = f"{capacity};w={period:g}"
+
+    @classmethod
+    def parse(cls, spec: str) -> "Limit":
+        """"10/60" is 10 requests per 60 seconds, with bursts of up to 10."""
+        capacity, _, period = spec.partition("/")
+        return cls(int(capacity), float(period))
+
+
+class MemoryBuckets:
+    """Buckets in this worker's memory; each worker process enforces its own limits."""
+
+    def __init__(self, max_keys: int):
+        # A bucket that has refilled completely is the same as no bucket, so entries expire then
+        self._buckets = TTLCache(max_keys, ttl=0)
+
+    async def take(self, key: str, limit: Limit) -> float:
+        """Tokens left after taking one; negative when the request is refused (nothing is taken)."""
+        now = time.monotonic()
+        state = self._buckets.get(key)
+        if state is None:
+            tokens = limit.capacity
+        else:
+            tokens = min(limit.capacity, state[0] + (now - state[1]) * limit.rate)
+        if tokens < 1:
+            return tokens - 1
+        tokens -= 1
+        self._buckets.set(key, (tokens, now), (limit.capacity - tokens) / limit.rate)
+        return tokens
+
+
+# Refill and take in one step on the Redis server, using its clock so workers agree
+TAKE_SCRIPT = """
+local capacity, rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = capacity
+if state[1] then
+    tokens = math.min(capacity, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+end
+if tokens < 1 then
+    return tostring(tokens - 1)
+end
+tokens = tokens - 1
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000))
+return tostring(tokens)
+"""
+
+
+class RedisBuckets:
+    """Buckets shared by every worker through Redis, one script call per request."""
+
+    def __init__(self, url: str):
+        try:
+            from redis import asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("The redis rate limit backend needs the 'redis' extra: pip install novelnest[redis]") from e
+        self._client = redis.from_url(url, decode_responses=True)
+        self._take = self._client.register_script(TAKE_SCRIPT)
+
+    async def take(self, key: str, limit: Limit) -> float:
+        return float(await self._take(keys=[f"novelnest:ratelimit:{key}"], args=[limit.capacity, limit.rate]))
+
+
+def buckets_from_url(url: str | None, max_keys: int):
+    if not url or url.startswith("memory://"):
+        return MemoryBuckets(max_keys)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBuckets(url)
+    raise ValueError(f"Unsupported rate limit backend URL: {url}")
+
+
+class RateLimiter:
+    """Applies the per-route limits from settings.rate_limits."""
+
+    def __init__(self, limits: dict[str, str], buckets):
+        self.limits = {route: Limit.parse(spec) for route, spec in limits.items()}
+        self.buckets = buckets
+
+    async def check(self, route: str, key: str, response: Response):
+        """Take a token for `key` on `route`; 429 with Retry-After when the bucket is empty."""
+        limit = self.limits[route]
+        try:
+            tokens = await self.buckets.take(f"{route}:{key}", limit)
+        except Exception:
+            # A shared backend outage shouldn't take the API down with it
+            decisions.inc(route=route, result="error")
+            logger.exception("Rate limit backend failed, letting the request through")
+            return
+
+        limited = tokens < 0
+        # A refused request took nothing, so the bucket still holds one more than `tokens`
+        available = tokens + 1 if limited else tokens
+        headers = {
+            "RateLimit-Limit": str(limit.capacity),
+            "RateLimit-Remaining": str(0 if limited else math.floor(available)),
+            "RateLimit-Reset": str(math.ceil((limit.capacity - available) / limit.rate)),
+            "RateLimit-Policy": limit.policy,
+        }
+        if limited:
+            decisions.inc(route=route, result="limited")
+            headers["Retry-After"] = str(max(1, math.ceil((1 - available) / limit.rate)))
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many requests, slow down", headers=headers)
+        decisions.inc(route=route, result="allowed")
+        # Straight onto the raw list: headers.update() re-scans it for every key, several times the cost of the check
+        response.raw_headers.extend((name.lower().encode(), value.encode()) for name, value in headers.items())
+
+
+def client_ip(request: Request) -> str:
+    # Run uvicorn with --proxy-headers (and --forwarded-allow-ips) behind a proxy so this is the real client
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit(route: str, per_user: bool = False):
+    """Dependency limiting `route` per client IP, or per user id for authenticated routes.
+
+    The per-user variant reuses the request's get_token_data result, so the
+    token is verified once whether or not the handler also needs the user.
+    """
+    if not settings.rate_limit_enabled or route not in rate_limiter.limits:
+        async def unlimited():
+            pass
+        return unlimited
+
+    if per_user:
+        async def limit_user(response: Response, token_data: Annotated[auth_sc.TokenData, Depends(OAuth2.get_token_data)]):
+            await rate_limiter.check(route, f"user:{token_data.id}", response)
+        return limit_user
+
+    async def limit_ip(request: Request, response: Response):
+        await rate_limiter.check(route, f"ip:{client_ip(request)}", response)
+    return limit_ip
+
+
+rate_limiter = RateLimiter(
+    settings.rate_limits,
+    buckets_from_url(settings.rate_limit_backend_url, settings.rate_limit_max_keys),
+)
@@ -0,0 +1,375 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from sqlalchemy import Float, Integer, bindparam, delete, exists, func, insert, select, text, true
+from sqlalchemy.dialects.postgresql import ARRAY
+from starlette.concurrency import run_in_threadpool
+
+from ..models import like_t, piece_t, similarity_t
+from . import database
+from .config import settings
+from .metrics import Counter, Gauge, Histogram
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # optional: pip install novelnest[recommendations]
+    np = sparse = None
+
+
+logger = logging.getLogger(__name__)
+
+# Held for a whole build so two builds never rewrite the same blocks at once
+ADVISORY_LOCK_KEY = 0x6E6E7273  # "nnrs"
+BUILD_BATCH_SIZE = 50_000  # likes per fetch from the server-side cursor
+WRITE_BATCH_SIZE = 10_000  # neighbour rows per INSERT
+RECENT_LIKES = 50  # a user's latest likes that seed their recommendations
+
+Similarity = similarity_t.PieceSimilarity
+
+builds = Counter("novelnest_recommendation_builds_total", "piece_similarities builds by outcome", ["result"])
+build_seconds = Histogram("novelnest_recommendation_build_seconds", "Time to rebuild piece_similarities", buckets=(1, 5, 10, 30, 60, 300, 900, 1800, 3600))
+updates = Counter("novelnest_recommendation_updates_total", "Batched co-like updates from like events by outcome", ["result"])
+
+
+def similar_pieces_query(columns, piece_id: int, limit: int):
+    """The nearest neighbours of a piece: one range scan of ix_piece_similarities_piece_id_score."""
+    return (
+        select(*columns, Similarity.score)
+        .join(Similarity, Similarity.similar_piece_id == piece_t.Piece.id)
+        .where(Similarity.piece_id == piece_id, Similarity.score > 0, piece_t.Piece.deleted_at.is_(None))
+        .order_by(Similarity.score.desc(), Similarity.similar_piece_id)
+        .limit(limit)
+    )
+
+
+def recommendations_query(columns, user_id: int, limit: int):
+    """Neighbours of the user's latest likes they haven't liked yet, scored by summed similarity."""
+    recent = (
+        select(like_t.Like.piece_id)
+        .where(like_t.Like.user_id == user_id)
+        .order_by(like_t.Like.created_at.desc())
+        .limit(RECENT_LIKES)
+        .subquery("recent")
+    )
+    neighbours = (
+        select(Similarity.similar_piece_id, Similarity.score)
+        .where(Similarity.piece_id == recent.c.piece_id, Similarity.score > 0)
+        .order_by(Similarity.score.desc())
+        .limit(limit)
+        .lateral("neighbours")
+    )
+    already_liked = exists().where(like_t.Like.user_id == user_id, like_t.Like.piece_id == neighbours.c.similar_piece_id)
+    score = func.sum(neighbours.c.score).label("score")
+    ranked = (
+        select(neighbours.c.similar_piece_id.label("piece_id"), score)
+        .select_from(recent.join(neighbours, true()))
+        .where(~already_liked)
+        .group_by(neighbours.c.similar_piece_id)
+        .order_by(score.desc(), neighbours.c.similar_piece_id)
+        .limit(limit)
+        .subquery("ranked")
+    )
+    return (
+        select(*columns, ranked.c.score)
+        .join(ranked, ranked.c.piece_id == piece_t.Piece.id)
+        .where(piece_t.Piece.deleted_at.is_(None))
+        .order_by(ranked.c.score.desc(), piece_t.Piece.id)
+    )
+
+
+def _sample_users(likes, max_user_likes: int, rng):
+    """Keep at most `max_user_likes` random likes per user; `likes` is (user_id, piece_id) sorted by user."""
+    _, starts, counts = np.unique(likes[:, 0], return_index=True, return_counts=True)
+    if counts.max() <= max_user_likes:
+        return likes
+    likes = likes[np.lexsort((rng.random(len(likes)), likes[:, 0]))]
+    rank = np.arange(len(likes)) - np.repeat(starts, counts)
+    return likes[rank < max_user_likes]
+
+
+async def _user_chunks(n_pieces: int, batch_size: int, max_user_likes: int, seed: int):
+    """(user_id, piece_id) arrays from a server-side cursor, re-cut so no user straddles two chunks."""
+    rng = np.random.default_rng(seed)
+    carry = np.empty((0, 2), dtype=np.int64)
+    statement = select(like_t.Like.user_id, like_t.Like.piece_id).order_by(like_t.Like.user_id)
+    async for rows in database.stream_partitions(statement, batch_size):
+        # Flattened first: numpy probing each Row for array attributes costs more than the query
+        batch = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64, count=2 * len(rows)).reshape(-1, 2)
+        likes = np.concatenate((carry, batch))
+        # The last user's likes may go on in the next batch
+        cut = np.searchsorted(likes[:, 0], likes[-1, 0])
+        carry = likes[cut:]
+        if cut:
+            likes = likes[:cut]
+            yield _sample_users(likes[likes[:, 1] < n_pieces], max_user_likes, rng)
+    if len(carry):
+        yield _sample_users(carry[carry[:, 1] < n_pieces], max_user_likes, rng)
+
+
+def _co_likes(likes, first: int, last: int, n_pieces: int):
+    """Sparse (last - first) x n_pieces co-like counts from one chunk of whole users, or None."""
+    in_block = (likes[:, 1] >= first) & (likes[:, 1] < last)
+    if not in_block.any():
+        return None
+    _, user_index = np.unique(likes[:, 0], return_inverse=True)
+    n_users = int(user_index.max()) + 1
+    ones = np.ones(len(likes), dtype=np.float32)
+    user_pieces = sparse.csr_matrix((ones, (user_index, likes[:, 1])), shape=(n_users, n_pieces))
+    block_users = sparse.csr_matrix((ones[in_block], (likes[in_block, 1] - first, user_index[in_block])), shape=(last - first, n_users))
+    return block_users @ user_pieces
+
+
+def _top_neighbours(co, first: int, likes_per_piece, k: int):
+    """(piece_id, similar_piece_id, co_likes, score) arrays, the k best-scored per piece, by cosine similarity."""
+    co = co.tocsr()
+    pieces = np.repeat(np.arange(co.shape[0]), np.diff(co.indptr)) + first
+    similar, co_likes = co.indices.astype(np.int64), co.data
+    other = similar != pieces
+    pieces, similar, co_likes = pieces[other], similar[other], co_likes[other]
+    score = co_likes / np.sqrt(likes_per_piece[pieces].astype(np.float64) * likes_per_piece[similar])
+    order = np.lexsort((similar, -score, pieces))
+    pieces, similar, co_likes, score = pieces[order], similar[order], co_likes[order], score[order]
+    keep = np.arange(len(pieces)) - np.searchsorted(pieces, pieces) < k
+    return pieces[keep], similar[keep], co_likes[keep].astype(np.int64), score[keep]
+
+
+def _insert_neighbours():
+    rows = func.unnest(
+        bindparam("piece_ids", type_=ARRAY(Integer)),
+        bindparam("similar_piece_ids", type_=ARRAY(Integer)),
+        bindparam("co_likes", type_=ARRAY(Integer)),
+        bindparam("scores", type_=ARRAY(Float)),
+    ).table_valued("piece_id", "similar_piece_id", "co_likes", "score").render_derived()
+    # Pieces deleted since their likes were read are skipped instead of failing the foreign keys
+    return insert(Similarity.__table__).from_select(
+        ["piece_id", "similar_piece_id", "co_likes", "score"],
+        select(rows.c.piece_id, rows.c.similar_piece_id, rows.c.co_likes, rows.c.score).where(
+            exists().where(piece_t.Piece.id == rows.c.piece_id),
+            exists().where(piece_t.Piece.id == rows.c.similar_piece_id),
+        ),
+    )
+
+
+async def _write_block(first: int, last: int, neighbours) -> int:
+    """Replace the neighbours of pieces first..last-1 in one transaction."""
+    statement = _insert_neighbours()
+    async with database.session_scope() as db:
+        await db.execute(delete(Similarity).where(Similarity.piece_id >= first, Similarity.piece_id < last))
+        for start in range(0, len(neighbours[0]), WRITE_BATCH_SIZE):
+            pieces, similar, co_likes, scores = (column[start:start + WRITE_BATCH_SIZE].tolist() for column in neighbours)
+            await db.execute(statement, {"piece_ids": pieces, "similar_piece_ids": similar, "co_likes": co_likes, "scores": scores})
+        await db.commit()
+    return len(neighbours[0])
+
+
+def _try_lock():
+    conn = database.engine.connect()
+    if conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar():
+        conn.commit()
+        return conn
+    conn.close()
+    return None
+
+def _unlock(conn):
+    conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+    conn.commit()
+    conn.close()
+
+
+async def build_recommendations(
+    block_pieces: int = settings.recommendations_block_pieces,
+    batch_size: int = BUILD_BATCH_SIZE,
+    neighbours: int = settings.recommendations_neighbours,
+    max_user_likes: int = settings.recommendations_max_user_likes,
+    seed: int = 0,
+) -> dict | None:
+    """Rebuild piece_similarities from likes; None when another build is running.
+
+    Pieces are processed in id blocks of `block_pieces`. Each block is one pass
+    over likes in user order through a server-side cursor (on the replica when
+    configured), accumulating block x pieces co-like counts as sparse matrix
+    products per chunk of whole users, so memory is bounded by the block and
+    the chunk rather than the table. Users with more than `max_user_likes`
+    likes are sampled down, since each user adds pairs quadratically.
+    """
+    if np is None:
+        raise RuntimeError("Building recommendations needs the 'recommendations' extra: pip install novelnest[recommendations]")
+    lock = await run_in_threadpool(_try_lock)
+    if lock is None:
+        builds.inc(result="skipped")
+        return None
+
+    start = time.perf_counter()
+    try:
+        async with database.session_scope(read_only=True) as db:
+            n_pieces = (await db.scalar(select(func.max(piece_t.Piece.id))) or 0) + 1
+        likes_read = written = passes = 0
+        for first in range(0, n_pieces, block_pieces):
+            last = min(first + block_pieces, n_pieces)
+            likes_per_piece = np.zeros(n_pieces, dtype=np.int64)
+            total, pending, likes_read = None, [], 0
+            async for likes in _user_chunks(n_pieces, batch_size, max_user_likes, seed):
+                likes_read += len(likes)
+                likes_per_piece += np.bincount(likes[:, 1], minlength=n_pieces)
+                product = _co_likes(likes, first, last, n_pieces)
+                if product is not None:
+                    pending.append(product)
+                # Fold chunk products in once they outweigh the running total, so each sum stays proportional
+                if pending and (total is None or sum(p.nnz for p in pending) > total.nnz):
+                    for product in pending:
+                        total = product if total is None else total + product
+                    pending = []
+            for product in pending:
+                total = product if total is None else total + product
+            empty = np.empty(0, dtype=np.int64)
+            block = _top_neighbours(total, first, likes_per_piece, neighbours) if total is not None else (empty, empty, empty, empty.astype(np.float64))
+            written += await _write_block(first, last, block)
+            passes += 1
+            logger.info("Recommendations: pieces %d-%d done, %d neighbour rows", first, last - 1, len(block[0]))
+    except Exception:
+        builds.inc(result="error")
+        raise
+    finally:
+        await run_in_threadpool(_unlock, lock)
+
+    elapsed = time.perf_counter() - start
+    build_seconds.observe(elapsed)
+    builds.inc(result="ok")
+    return {"likes": likes_read, "passes": passes, "neighbour_rows": written, "seconds": round(elapsed, 1)}
+
+
+# Nets each user's like changes since the last flush against their current likes: a pair's co_likes moves by
+# (both liked now) - (both liked before). Pairs only ever leave through a build; a zero score hides them meanwhile.
+UPDATE_STATEMENT = text("""
+    WITH events AS (
+        SELECT * FROM unnest(CAST(:user_ids AS integer[]), CAST(:piece_ids AS integer[]), CAST(:deltas AS integer[]))
+            AS e(user_id, piece_id, delta)
+    ),
+    items AS (
+        SELECT user_id, piece_id, liked_now, greatest(least(liked_now - coalesce(delta, 0), 1), 0) AS liked_before,
+               count(*) OVER (PARTITION BY user_id) AS user_likes
+        FROM (
+            SELECT coalesce(l.user_id, e.user_id) AS user_id, coalesce(l.piece_id, e.piece_id) AS piece_id,
+                   (l.user_id IS NOT NULL)::int AS liked_now, e.delta
+            FROM (SELECT user_id, piece_id FROM likes WHERE user_id IN (SELECT user_id FROM events)) AS l
+            FULL JOIN events AS e ON e.user_id = l.user_id AND e.piece_id = l.piece_id
+        ) AS current
+    ),
+    pairs AS (
+        SELECT a.piece_id, b.piece_id AS similar_piece_id, sum(a.liked_now * b.liked_now - a.liked_before * b.liked_before) AS delta
+        FROM items AS a JOIN items AS b ON b.user_id = a.user_id AND b.piece_id <> a.piece_id
+        WHERE (a.liked_now <> a.liked_before OR b.liked_now <> b.liked_before) AND a.user_likes <= :max_user_likes
+        GROUP BY a.piece_id, b.piece_id
+        HAVING sum(a.liked_now * b.liked_now - a.liked_before * b.liked_before) <> 0
+    ),
+    scored AS (
+        SELECT pairs.*, 1 / sqrt(greatest(a.num_of_likes, 1)::float8 * greatest(b.num_of_likes, 1)) AS weight
+        FROM pairs JOIN pieces AS a ON a.id = pairs.piece_id JOIN pieces AS b ON b.id = pairs.similar_piece_id
+    ),
+    locked AS (
+        -- In key order, so concurrent flushes from several workers can't deadlock
+        SELECT s.piece_id, s.similar_piece_id, scored.delta, scored.weight
+        FROM piece_similarities AS s JOIN scored USING (piece_id, similar_piece_id)
+        ORDER BY s.piece_id, s.similar_piece_id
+        FOR UPDATE OF s
+    ),
+    updated AS (
+        UPDATE piece_similarities AS s
+        SET co_likes = greatest(s.co_likes + locked.delta, 0), score = greatest(s.co_likes + locked.delta, 0) * locked.weight
+        FROM locked
+        WHERE s.piece_id = locked.piece_id AND s.similar_piece_id = locked.similar_piece_id
+        RETURNING s.piece_id, s.similar_piece_id
+    ),
+    kept AS (
+        SELECT s.piece_id, count(*) AS neighbours, min(s.score) AS lowest
+        FROM piece_similarities AS s WHERE s.piece_id IN (SELECT piece_id FROM scored WHERE delta > 0)
+        GROUP BY s.piece_id
+    )
+    -- A new pair only goes in when it would make its piece's top neighbours, so the table doesn't grow with every like
+    INSERT INTO piece_similarities (piece_id, similar_piece_id, co_likes, score)
+    SELECT scored.piece_id, scored.similar_piece_id, delta, delta * weight
+    FROM scored LEFT JOIN kept USING (piece_id)
+    WHERE delta > 0
+      AND (kept.neighbours IS NULL OR kept.neighbours < :neighbours OR delta * weight > kept.lowest)
+      AND NOT EXISTS (
+        SELECT 1 FROM updated AS u WHERE u.piece_id = scored.piece_id AND u.similar_piece_id = scored.similar_piece_id
+      )
+    ON CONFLICT (piece_id, similar_piece_id) DO NOTHING
+""")
+
+
+class CoLikeUpdater:
+    """Keeps piece_similarities current between builds.
+
+    toggle_like adds a +1/-1 event per changed like; events are netted per user
+    and piece and applied every `interval` seconds in one statement. Scores use
+    the current num_of_likes and only the changed pairs are rescored; the next
+    build trims and rescores everything, including any drift from several
+    workers changing one user's likes at once.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._events = {}
+        self._flush_lock = asyncio.Lock()
+        self._timer = None
+
+    def add(self, user_id: int, piece_id: int, delta: int):
+        key = (user_id, piece_id)
+        self._events[key] = self._events.get(key, 0) + delta
+
+    def pending_events(self) -> int:
+        return len(self._events)
+
+    async def flush(self):
+        async with self._flush_lock:
+            batch = {key: delta for key, delta in self._events.items() if delta}
+            self._events = {}
+            if not batch:
+                return
+            user_ids, piece_ids = zip(*batch)
+            try:
+                async with database.session_scope() as db:
+                    await db.execute(UPDATE_STATEMENT, {
+                        "user_ids": list(user_ids),
+                        "piece_ids": list(piece_ids),
+                        "deltas": list(batch.values()),
+                        "max_user_likes": settings.recommendations_max_user_likes,
+                        "neighbours": settings.recommendations_neighbours,
+                    })
+                    await db.commit()
+            except Exception:
+                # Keep the events for the next attempt
+                for key, delta in batch.items():
+                    self._events[key] = self._events.get(key, 0) + delta
+                updates.inc(result="error")
+                logger.exception("Failed to apply %d like events to piece_similarities", len(batch))
+            else:
+                updates.inc(result="ok")
+
+    async def _run_timer(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            # Shielded so stopping the timer never abandons a batch half-written
+            await asyncio.shield(self.flush())
+
+    async def start(self):
+        self._timer = asyncio.get_running_loop().create_task(self._run_timer())
+
+    async def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        await self.flush()
+
+
+co_like_updater = CoLikeUpdater(interval=settings.recommendations_update_seconds)
+
+Gauge("novelnest_recommendation_pending_events", "Like events waiting to be applied to piece_similarities", function=co_like_updater.pending_events)
@@ -0,0 +1,159 @@
+import hashlib
+import re
+
+from .cache import TTLCache
+from .config import settings
+from .metrics import Counter, Gauge
+
+
+# Anonymous reads served from the cache; True when the response depends on the query string
+CACHED_ROUTES = (
+    (re.compile(r"^/pieces/$"), True),
+    (re.compile(r"^/pieces/\d+$"), False),
+    (re.compile(r"^/likes/count/\d+$"), False),
+    (re.compile(r"^/users/\d+$"), False),
+)
+
+lookups = Counter(
+    "novelnest_response_cache_lookups_total",
+    "Cacheable anonymous GETs by outcome; hit ratio is hit / (hit + miss)",
+    ["result"],
+)
+not_modified = Counter("novelnest_response_cache_not_modified_total", "Conditional GETs answered with 304 Not Modified")
+invalidations = Counter("novelnest_response_cache_invalidations_total", "Paths invalidated by writes")
+
+
+def match_route(path: str):
+    """None when `path` isn't cached, otherwise whether its entries vary by query string."""
+    for pattern, by_query in CACHED_ROUTES:
+        if pattern.match(path):
+            return by_query
+    return None
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class ResponseCache:
+    """In-process cache of rendered responses for CACHED_ROUTES.
+
+    Entries are keyed by path, plus the query string for list routes. Writes call
+    `invalidate` with the paths they affect: detail entries are dropped directly
+    and list routes move to a new generation, so every cached page of the list
+    misses at once. Other worker processes keep serving their copy for at most
+    `ttl` seconds.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.entries = TTLCache(max_entries, ttl)
+        self._generations = {}
+        # Bumped by every invalidation; a miss only stores its response if no write happened while it ran
+        self.version = 0
+
+    def key(self, path: str, query: bytes, by_query: bool):
+        if by_query:
+            return (path, self._generations.get(path, 0), query)
+        return path
+
+    def invalidate(self, *paths: str):
+        self.version += 1
+        for path in paths:
+            if match_route(path):
+                self._generations[path] = self._generations.get(path, 0) + 1
+            else:
+                self.entries.delete(path)
+        invalidations.inc(len(paths))
+
+    def clear(self):
+        self.version += 1
+        self.entries.clear()
+
+
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    ttl=settings.response_cache_ttl_seconds,
+)
+
+Gauge("novelnest_response_cache_entries", "Responses currently held in the response cache", function=lambda: len(response_cache.entries))
+
+
+class ResponseCacheMiddleware:
+    """Serve CACHED_ROUTES from `response_cache` with strong ETags and 304s.
+
+    Only anonymous GETs are cached: a bearer token changes the body (liked_by_me),
+    so those requests go straight to the app. Only 200 responses are stored.
+    """
+
+    def __init__(self, app, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        by_query = match_route(path)
+        if by_query is None:
+            return await self.app(scope, receive, send)
+
+        if_none_match = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                return await self.app(scope, receive, send)
+            if name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+
+        key = self.cache.key(path, scope["query_string"], by_query)
+        entry = self.cache.entries.get(key)
+        if entry is not None:
+            lookups.inc(result="hit")
+            return await self._send(send, entry, if_none_match)
+
+        lookups.inc(result="miss")
+        version = self.cache.version
+        start = None
+        body = []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                if message["status"] != 200:
+                    start = False
+                    return await send(message)
+                start = message
+            elif start is False:
+                return await send(message)
+            else:
+                body.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                content = b"".join(body)
+                headers = [(name, value) for name, value in start["headers"] if name != b"content-length"]
+                entry = (headers, content, make_etag(content))
+                if self.cache.version == version:
+                    self.cache.entries.set(key, entry)
+                await self._send(send, entry, if_none_match)
+
+        await self.app(scope, receive, capture)
+
+    @staticmethod
+    async def _send(send, entry, if_none_match):
+        headers, content, etag = entry
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            not_modified.inc()
+            await send({"type": "http.response.start", "status": 304, "headers": [(b"etag", etag.encode())]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": headers + [(b"content-length", str(len(content)).encode()), (b"etag", etag.encode())],
+        })
+        await send({"type": "http.response.body", "body": content})
@@ -0,0 +1,57 @@
+from functools import lru_cache
+from typing import List
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from .config import settings
+
+try:
+    import orjson
+except ImportError:  # optional: pip install novelnest[fast-json]
+    orjson = None
+
+# Same output as pydantic's encoder: UTC timestamps end in Z, dict keys may be ints
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson when it is installed.
+
+    Set as a router's default_response_class to opt its endpoints in; without
+    orjson it renders exactly like JSONResponse.
+    """
+
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+def schema_columns(table, schema):
+    """Columns of `table` named by `schema`'s fields, so a select carries exactly what the API returns."""
+    return [table.c[name] for name in schema.model_fields if name in table.c]
+
+
+@lru_cache
+def list_adapter(schema) -> TypeAdapter:
+    return TypeAdapter(List[schema])
+
+
+def rows_response(schema, items: list[dict], response: Response, validate: bool = settings.fast_json_validate) -> Response:
+    """Render a list page of plain dicts as JSON of `List[schema]`.
+
+    Returning a Response skips FastAPI's response_model pass (validation, then
+    jsonable_encoder, then json.dumps), which dominates large pages; the route
+    keeps its response_model for the OpenAPI schema. Headers set on the
+    injected `response` (cursor, rate limit) are carried over.
+    """
+    if orjson is None or validate:
+        adapter = list_adapter(schema)
+        body = adapter.dump_json(adapter.validate_python(items))
+    else:
+        body = orjson.dumps(items, option=ORJSON_OPTIONS)
+    rendered = Response(body, media_type="application/json")
+    rendered.raw_headers.extend(header for header in response.raw_headers if header[0] != b"content-length")
+    return rendered
@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import json
+import time
+from uuid import uuid4
+
+import jwt
+from jwt.algorithms import get_default_algorithms
+from jwt.exceptions import InvalidTokenError
+
+from ..schemas import auth_sc
+from .cache import CacheBackend, TTLCache, backend_from_url
+from .config import settings
+from .metrics import Counter
+
+
+ASYMMETRIC_PREFIXES = ("RS", "PS", "ES", "EdDSA")
+
+verifications = Counter("novelnest_token_verifications_total", "Bearer token checks by outcome", ["result"])
+
+
+class RevokedTokenError(InvalidTokenError):
+    pass
+
+
+class RevocationList:
+    """Revoked token ids (logout) and per-user cut-offs (password change).
+
+    Entries live only as long as the tokens they cover. Revocations are kept
+    in-process and, when a shared backend is configured, written there too so
+    every worker honours them.
+    """
+
+    def __init__(self, max_entries: int, backend: CacheBackend | None = None):
+        self.local = TTLCache(max_entries, ttl=0)
+        self.backend = backend
+
+    async def _set(self, key: str, value: float, ttl: float):
+        self.local.set(key, value, ttl)
+        if self.backend is not None:
+            await self.backend.set(key, repr(value), ttl)
+
+    async def _get(self, key: str) -> float | None:
+        value = self.local.get(key)
+        if value is None and self.backend is not None:
+            raw = await self.backend.get(key)
+            if raw is not None:
+                value = float(raw)
+        return value
+
+    async def revoke_token(self, jti: str, expires_at: float):
+        if expires_at > time.time():
+            await self._set(f"novelnest:revoked:jti:{jti}", expires_at, expires_at - time.time())
+
+    async def revoke_user(self, user_id: int):
+        """Invalidate every token the user holds; tokens issued afterwards are unaffected."""
+        await self._set(f"novelnest:revoked:user:{user_id}", time.time(), settings.access_token_expire_minutes * 60)
+
+    async def is_revoked(self, claims: auth_sc.TokenData) -> bool:
+        if claims.jti is not None and await self._get(f"novelnest:revoked:jti:{claims.jti}") is not None:
+            return True
+        cutoff = await self._get(f"novelnest:revoked:user:{claims.id}")
+        return cutoff is not None and claims.issued_at < cutoff
+
+
+class TokenVerifier:
+    """Issues and verifies access tokens.
+
+    Keys are parsed once. Claims of recently verified tokens are cached by token
+    hash until the token expires (or `ttl`, if sooner), so repeat requests skip
+    the signature check; revocation is still checked on every call.
+    """
+
+    def __init__(self, algorithm: str, signing_key, verifying_key, max_entries: int, ttl: float, revocations: RevocationList):
+        algorithms = get_default_algorithms()
+        if algorithm not in algorithms:
+            raise RuntimeError(f"JWT algorithm {algorithm} needs the 'crypto' extra: pip install novelnest[crypto]")
+        self.algorithm = algorithm
+        self._algorithm = algorithms[algorithm]
+        self.signing_key = self._algorithm.prepare_key(signing_key)
+        self.verifying_key = self._algorithm.prepare_key(verifying_key)
+        self.asymmetric = algorithm.startswith(ASYMMETRIC_PREFIXES)
+        self.key_id = self._thumbprint() if self.asymmetric else None
+        self.cache = TTLCache(max_entries, ttl)
+        self.ttl = ttl
+        self.revocations = revocations
+        self._jwt = jwt.PyJWT(options={"require": ["exp", "user_id"]})
+
+    def _thumbprint(self) -> str:
+        # RFC 7638: SHA-256 over the required public members in lexicographic order
+        jwk = self._algorithm.to_jwk(self.verifying_key, as_dict=True)
+        required = {key: jwk[key] for key in ("crv", "e", "kty", "n", "x", "y") if key in jwk}
+        digest = hashlib.sha256(json.dumps(required, separators=(",", ":"), sort_keys=True).encode()).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+    def jwks(self) -> dict:
+        """Public keys for other services to verify our tokens; empty for HMAC algorithms."""
+        if not self.asymmetric:
+            return {"keys": []}
+        jwk = self._algorithm.to_jwk(self.verifying_key, as_dict=True)
+        return {"keys": [{**jwk, "kid": self.key_id, "alg": self.algorithm, "use": "sig"}]}
+
+    def create(self, data: dict, expires_in: float) -> str:
+        now = time.time()
+        # iat keeps sub-second precision so a token issued right after a password change stays valid
+        payload = {**data, "iat": now, "exp": int(now + expires_in), "jti": uuid4().hex}
+        headers = {"kid": self.key_id} if self.key_id else None
+        return jwt.encode(payload, self.signing_key, algorithm=self.algorithm, headers=headers)
+
+    async def verify(self, token: str) -> auth_sc.TokenData:
+        """Claims of a valid token; raises InvalidTokenError otherwise."""
+        key = hashlib.sha256(token.encode()).digest()
+        claims = self.cache.get(key)
+        if claims is None:
+            try:
+                payload = self._jwt.decode(token, self.verifying_key, algorithms=[self.algorithm])
+            except InvalidTokenError:
+                verifications.inc(result="invalid")
+                raise
+            claims = auth_sc.TokenData(
+                id=str(payload["user_id"]),
+                jti=payload.get("jti"),
+                issued_at=payload.get("iat", 0),
+                expires_at=payload["exp"],
+            )
+            self.cache.set(key, claims, min(self.ttl, claims.expires_at - time.time()))
+            result = "verified"
+        else:
+            result = "cached"
+
+        if await self.revocations.is_revoked(claims):
+            verifications.inc(result="revoked")
+            raise RevokedTokenError("Token has been revoked")
+        verifications.inc(result=result)
+        return claims
+
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+def _keys():
+    if not settings.algo.startswith(ASYMMETRIC_PREFIXES):
+        return settings.secret_key, settings.secret_key
+    if not (settings.jwt_private_key_file and settings.jwt_public_key_file):
+        raise RuntimeError(f"ALGO={settings.algo} needs JWT_PRIVATE_KEY_FILE and JWT_PUBLIC_KEY_FILE")
+    return _read(settings.jwt_private_key_file), _read(settings.jwt_public_key_file)
+
+
+revocations = RevocationList(
+    max_entries=settings.token_revocation_max_entries,
+    backend=backend_from_url(settings.token_revocation_backend_url),
+)
+
+token_verifier = TokenVerifier(
+    settings.algo,
+    *_keys(),
+    max_entries=settings.token_cache_max_entries,
+    ttl=settings.token_cache_ttl_seconds,
+    revocations=revocations,
+)
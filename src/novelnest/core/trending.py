@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+
+from . import database
+from .config import settings
+from .metrics import Counter, Histogram
+
+
+logger = logging.getLogger(__name__)
+
+# Held for the duration of one refresh so workers sharing a schedule don't rebuild the view twice at once
+ADVISORY_LOCK_KEY = 0x6E6E7470  # "nntp"
+
+refreshes = Counter("novelnest_trending_refreshes_total", "trending_pieces refreshes by outcome", ["result"])
+refresh_seconds = Histogram("novelnest_trending_refresh_seconds", "Time to refresh trending_pieces", buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 30, 120))
+
+
+async def refresh_trending() -> bool:
+    """Recompute trending_pieces; False when another worker is already refreshing it.
+
+    CONCURRENTLY keeps the view readable throughout and only writes the rows
+    whose counts changed. The aggregate itself reads just the likes inside the
+    window, through ix_likes_created_at.
+    """
+    start = time.perf_counter()
+    async with database.session_scope() as db:
+        if not await db.scalar(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY}):
+            refreshes.inc(result="skipped")
+            return False
+        await db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY trending_pieces"))
+        await db.commit()
+    refresh_seconds.observe(time.perf_counter() - start)
+    refreshes.inc(result="ok")
+    return True
+
+
+class TrendingRefresher:
+    """Refreshes trending_pieces every `interval` seconds in the background."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._timer = None
+
+    async def _run_timer(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # Shielded so stopping the timer never abandons a refresh mid-transaction
+                await asyncio.shield(refresh_trending())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                refreshes.inc(result="error")
+                logger.exception("Failed to refresh trending_pieces")
+
+    async def start(self):
+        self._timer = asyncio.get_running_loop().create_task(self._run_timer())
+
+    async def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+
+
+trending_refresher = TrendingRefresher(interval=settings.trending_refresh_seconds)
@@ -0,0 +1,99 @@
+import secrets
+
+from ..schemas import user_sc
+from .cache import CacheBackend, TTLCache, backend_from_url
+from .config import settings
+from .metrics import Counter
+
+
+lookups = Counter(
+    "novelnest_user_cache_lookups_total",
+    "Authenticated-user lookups by outcome; every hit is a users SELECT saved",
+    ["result"],
+)
+
+
+class UserCache:
+    """Two-tier cache of authenticated users keyed by id.
+
+    The per-process LRU answers most lookups; the optional shared backend lets a
+    worker reuse a user another worker already loaded. Writes to the users row
+    must call `invalidate`. With a shared backend it also replaces the user's
+    version token there, and every hit checks that token, so no worker keeps
+    serving the old row; without one, other workers can serve it for at most
+    `ttl` seconds.
+
+    `get` returns the version it saw along with the user, and `set` only stores
+    a user loaded after a miss if no invalidation happened since, so a row read
+    just before an update is never cached as current.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, backend: CacheBackend | None = None):
+        self.local = TTLCache(max_entries, ttl)  # user id -> (version token, user)
+        self.backend = backend
+        self.ttl = ttl
+        # Bumped by every invalidation in this process; a `set` only stores its user if none happened since its `get`
+        self.generation = 0
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"novelnest:user:{user_id}"
+
+    @staticmethod
+    def _version_key(user_id: int) -> str:
+        return f"novelnest:user:{user_id}:version"
+
+    async def get(self, user_id: int) -> tuple[user_sc.User | None, tuple]:
+        """The cached user or None, and the version to pass to `set` with a user loaded after a miss."""
+        token = None
+        if self.backend is not None:
+            token = await self.backend.get(self._version_key(user_id))
+        version = (self.generation, token)
+
+        entry = self.local.get(user_id)
+        if entry is not None:
+            if entry[0] == token:
+                lookups.inc(result="hit")
+                return entry[1], version
+            # Invalidated by another worker since this one cached it
+            self.local.delete(user_id)
+
+        if self.backend is not None:
+            raw = await self.backend.get(self._key(user_id))
+            if raw is not None:
+                # Shared entries carry the token they were stored under: one written after an invalidation is stale
+                stored_token, _, data = raw.partition("|")
+                if stored_token == (token or ""):
+                    user = user_sc.User.model_validate_json(data)
+                    self.local.set(user_id, (token, user))
+                    lookups.inc(result="shared_hit")
+                    return user, version
+
+        lookups.inc(result="miss")
+        return None, version
+
+    async def set(self, user: user_sc.User, version: tuple):
+        """Cache `user`, loaded after `get` returned `version`, unless it was invalidated in between."""
+        generation, token = version
+        if self.backend is not None and await self.backend.get(self._version_key(user.id)) != token:
+            return
+        if self.generation != generation:
+            return
+        self.local.set(user.id, (token, user))
+        if self.backend is not None:
+            await self.backend.set(self._key(user.id), f"{token or ''}|{user.model_dump_json()}", self.ttl)
+
+    async def invalidate(self, user_id: int):
+        self.generation += 1
+        self.local.delete(user_id)
+        if self.backend is not None:
+            await self.backend.delete(self._key(user_id))
+            # Outlives every local entry cached before it, which expire after ttl as well
+            await self.backend.set(self._version_key(user_id), secrets.token_hex(8), self.ttl)
+
+
+user_cache = UserCache(
+    max_entries=settings.user_cache_max_entries,
+    ttl=settings.user_cache_ttl_seconds,
+    backend=backend_from_url(settings.user_cache_backend_url),
+)
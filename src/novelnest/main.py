@@ -1,14 +1,54 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .api import auth, like, piece, user
-from .core import database
-from .core.database import engine
+from .api import auth, deletion, health, like, metrics, piece, user
+from .core import database, instrumentation, passwords
+from .core.config import settings
+from .core.deletions import deletion_worker
+from .core.health import prepare_database
+from .core.like_counter import like_buffer
+from .core.live_counts import live_counts
+from .core.recommendations import co_like_updater
+from .core.response_cache import ResponseCacheMiddleware
+from .core.trending import trending_refresher
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing touches the database at import; tables come from `alembic upgrade head`, not create_all
+    await prepare_database()
+    if settings.like_buffer_enabled:
+        await like_buffer.start()
+    if settings.trending_refresh_seconds > 0:
+        await trending_refresher.start()
+    if settings.recommendations_update_seconds > 0:
+        await co_like_updater.start()
+    if settings.live_counts_enabled:
+        await live_counts.start()
+    if settings.deletion_poll_seconds > 0:
+        await deletion_worker.start()
+    yield
+    await deletion_worker.stop()
+    await live_counts.stop()
+    await co_like_updater.stop()
+    await trending_refresher.stop()
+    if settings.like_buffer_enabled:
+        await like_buffer.stop()
+    passwords.pool.shutdown()
+    await database.dispose_engines()
+
 
+app = FastAPI(lifespan=lifespan)
 
-database.Base.metadata.create_all(bind=engine) # We don't need that if we use Alembic
+if settings.response_cache_enabled:
+    app.add_middleware(ResponseCacheMiddleware)
 
-app = FastAPI()
+# Added last so it is outermost and also times responses served from the cache
+if settings.request_metrics_enabled:
+    instrumentation.instrument_engines()
+    app.add_middleware(instrumentation.InstrumentationMiddleware)
 
 # app.add_middleware(
 #     CORSMiddleware,
@@ -22,9 +62,12 @@ app.include_router(auth.router)
 app.include_router(like.router)
 app.include_router(piece.router)
 app.include_router(user.router)
+app.include_router(deletion.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
 
 @app.get("/", tags=["Root"])
-def read_root():
+async def read_root():
     """Welcome endpoint for the NovelNest API."""
     return {
         "message": "Welcome to NovelNest API",
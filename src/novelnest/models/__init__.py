@@ -0,0 +1,4 @@
+# Importing any model registers every mapper, so relationships by class name ("User", "Piece") always resolve
+from . import deletion_t, like_t, piece_t, similarity_t, trending_t, user_t
+
+__all__ = ["deletion_t", "like_t", "piece_t", "similarity_t", "trending_t", "user_t"]
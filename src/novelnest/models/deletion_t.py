@@ -0,0 +1,26 @@
+from sqlalchemy import TIMESTAMP, BigInteger, Column, Enum, Index, Integer, Text
+from sqlalchemy.sql.expression import text
+
+from ..schemas.deletion_sc import DeletionKind, DeletionStatus
+from ..core.database import Base
+
+
+class DeletionJob(Base):
+    """A soft-deleted user or piece whose likes core.deletions removes in chunks before deleting the row itself."""
+    __tablename__ = "deletion_jobs"
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    kind = Column(Enum(DeletionKind), nullable=False)
+    target_id = Column(Integer, nullable=False)  # no foreign key: the row is gone once the job is done
+    status = Column(Enum(DeletionStatus), nullable=False, server_default=DeletionStatus.PENDING.name)
+    likes_total = Column(BigInteger, nullable=True)
+    likes_deleted = Column(BigInteger, nullable=False, server_default=text("0"))
+    last_error = Column(Text, nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    finished_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # The worker's queue: unfinished jobs, oldest first
+        Index("ix_deletion_jobs_unfinished", "id", postgresql_where=text("finished_at IS NULL")),
+    )
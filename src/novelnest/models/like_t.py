@@ -1,8 +1,30 @@
-from sqlalchemy import Column, ForeignKey, Integer
+from sqlalchemy import DDL, TIMESTAMP, Column, ForeignKey, Index, Integer, event
+from sqlalchemy.sql.expression import text
+
 from ..core.database import Base
 
 
+# Hash partitions of likes by piece_id, created by the b7e4a2c9d315 migration (likes_p00, likes_p01, ...),
+# so a piece's likes, count and toggles touch one partition
+PARTITIONS = 32
+
+
 class Like(Base):
     __tablename__ = "likes"
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
     piece_id = Column(Integer, ForeignKey("pieces.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+
+    __table_args__ = (
+        # The primary key leads with user_id; per-piece counts and listings need their own index
+        Index("ix_likes_piece_id_user_id", "piece_id", "user_id"),
+        Index("ix_likes_created_at", "created_at"),  # trending window and incremental export
+        {"postgresql_partition_by": "HASH (piece_id)"},
+    )
+
+
+# The partitions, when the schema is built without Alembic
+for remainder in range(PARTITIONS):
+    event.listen(Like.__table__, "after_create", DDL(
+        f"CREATE TABLE IF NOT EXISTS likes_p{remainder:02d} PARTITION OF likes FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})"
+    ))
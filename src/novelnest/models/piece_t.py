@@ -1,10 +1,13 @@
-from sqlalchemy import TIMESTAMP, Column, Integer, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import DDL, TIMESTAMP, Column, Computed, Index, Integer, String, Text, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql.expression import text
 
 from ..core.database import Base
 
- 
+
+SEARCH_CONFIG = "english"
+
 class Piece(Base):
     __tablename__ = "pieces"
     
@@ -13,6 +16,23 @@ class Piece(Base):
     description = Column(Text, nullable=True)
     num_of_likes = Column(Integer, nullable=False, default=0)
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+    deleted_at = Column(TIMESTAMP(timezone=True), nullable=True)  # set by DELETE /pieces/{id}, see core.deletions
+    # Maintained by Postgres, never loaded unless asked for
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')",
+        persisted=True,
+    )))
     
     liked_by_users = relationship("User", secondary="likes", back_populates="liked_pieces")
- 
\ No newline at end of file
+
+    __table_args__ = (
+        Index("ix_pieces_created_at_id", "created_at", "id"),  # keyset pagination
+        Index("ix_pieces_num_of_likes_id", num_of_likes.desc(), id),  # /pieces/top
+        Index("ix_pieces_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_pieces_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+    )
+
+
+# Trigram index operator class, needed when the schema is created without Alembic
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
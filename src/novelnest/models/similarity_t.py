@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer
+
+from ..core.database import Base
+
+
+class PieceSimilarity(Base):
+    """Top neighbours of each piece by co-likes, built by core.recommendations."""
+    __tablename__ = "piece_similarities"
+
+    piece_id = Column(Integer, ForeignKey("pieces.id", ondelete="CASCADE"), primary_key=True)
+    similar_piece_id = Column(Integer, ForeignKey("pieces.id", ondelete="CASCADE"), primary_key=True)
+    co_likes = Column(Integer, nullable=False)  # users who liked both pieces
+    score = Column(Float, nullable=False)  # co_likes / sqrt(likes of piece * likes of similar piece)
+
+    __table_args__ = (
+        Index("ix_piece_similarities_piece_id_score", "piece_id", score.desc(), "similar_piece_id"),  # /pieces/{id}/similar
+        Index("ix_piece_similarities_similar_piece_id", "similar_piece_id"),  # cascading piece deletes
+    )
@@ -0,0 +1,24 @@
+from sqlalchemy import DDL, Integer, column, event, table
+
+from ..core.database import Base
+
+
+TRENDING_WINDOW = "7 days"
+
+# Materialized view of likes per piece over the last TRENDING_WINDOW, rebuilt by core.trending
+TrendingPiece = table(
+    "trending_pieces",
+    column("piece_id", Integer),
+    column("recent_likes", Integer),
+)
+
+
+# Created after the tables when the schema is built without Alembic
+for statement in (
+    "CREATE MATERIALIZED VIEW IF NOT EXISTS trending_pieces AS "
+    "SELECT piece_id, count(*) AS recent_likes FROM likes "
+    f"WHERE created_at > now() - interval '{TRENDING_WINDOW}' GROUP BY piece_id",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_trending_pieces_piece_id ON trending_pieces (piece_id)",
+    "CREATE INDEX IF NOT EXISTS ix_trending_pieces_recent_likes ON trending_pieces (recent_likes DESC, piece_id)",
+):
+    event.listen(Base.metadata, "after_create", DDL(statement))
@@ -1,4 +1,4 @@
-from sqlalchemy import TIMESTAMP, Column, Integer, String, Enum
+from sqlalchemy import TIMESTAMP, Column, Index, Integer, String, Enum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.expression import text
 
@@ -13,6 +13,11 @@ class User(Base):
     password = Column(String, nullable=False)
     role = Column(Enum(UserRole), nullable=False, default=UserRole.USER)
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+    deleted_at = Column(TIMESTAMP(timezone=True), nullable=True)  # soft delete: no login or reads until core.deletions removes the row
     
     liked_pieces = relationship("Piece", secondary="likes", back_populates="liked_by_users")
+
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),  # keyset pagination
+    )
     
\ No newline at end of file
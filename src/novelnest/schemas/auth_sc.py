@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 class Token(BaseModel):
@@ -5,4 +7,7 @@ class Token(BaseModel):
     token_type: str
 
 class TokenData(BaseModel):
-    id: str
\ No newline at end of file
+    id: str
+    jti: Optional[str] = None  # absent on tokens issued before revocation support
+    issued_at: float = 0
+    expires_at: float = 0
\ No newline at end of file
@@ -0,0 +1,31 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class DeletionKind(str, Enum):
+    USER = "user"
+    PIECE = "piece"
+
+
+class DeletionStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+
+
+class DeletionJob(BaseModel):
+    id: int
+    kind: DeletionKind
+    target_id: int
+    status: DeletionStatus
+    likes_total: Optional[int] = None  # counted when the first chunk runs
+    likes_deleted: int = 0
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,13 @@
+from typing import List
+
+from pydantic import BaseModel
+
+
+class ImportRowError(BaseModel):
+    row: int  # 1-based data row (NDJSON line or CSV record after the header)
+    errors: List[str]
+
+class ImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ImportRowError]  # the first MAX_REPORTED_ERRORS failures
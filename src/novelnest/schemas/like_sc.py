@@ -1,4 +1,7 @@
-from pydantic import BaseModel, ConfigDict, field_validator
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 class LikeToggle(BaseModel):
     piece_id: int
@@ -14,9 +17,17 @@ class LikeToggle(BaseModel):
 class Like(BaseModel):
     piece_id: int
     user_id: int
+    created_at: Optional[datetime] = None
     
     model_config = ConfigDict(from_attributes=True)
     
 class LikeCount(BaseModel):
     piece_id: int
-    like_count: int
\ No newline at end of file
+    like_count: int
+
+class LikeStatusRequest(BaseModel):
+    piece_ids: List[int] = Field(min_length=1, max_length=100)
+
+class LikeStatus(BaseModel):
+    piece_id: int
+    liked: bool
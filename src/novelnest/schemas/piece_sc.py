@@ -20,5 +20,16 @@ class Piece(BasePiece):
     id: int
     created_at: datetime
     num_of_likes: int = 0
+    liked_by_me: Optional[bool] = None  # only set for authenticated viewers
     
     model_config = ConfigDict(from_attributes=True)
+
+class PieceSearchResult(Piece):
+    rank: float
+    headline: str
+
+class TrendingPiece(Piece):
+    recent_likes: int
+
+class ScoredPiece(Piece):
+    score: float  # co-like similarity, higher is closer
@@ -0,0 +1,86 @@
+import uuid
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from novelnest.core import OAuth2, database, passwords
+from novelnest.main import app
+
+
+@pytest.fixture(scope="session")
+def postgres():
+    """Skip tests that need the database unless the configured one is reachable and migrated."""
+    try:
+        with database.engine.connect() as conn:
+            conn.execute(text("SELECT 1 FROM deletion_jobs LIMIT 1"))
+    except SQLAlchemyError as e:
+        pytest.skip(f"needs a Postgres database at the Alembic head: {type(e).__name__}")
+
+
+@pytest_asyncio.fixture
+async def db(postgres):
+    """Async engines are bound to the test's event loop, so their pools are closed after each test."""
+    yield
+    await database.dispose_engines()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def password_pool():
+    yield
+    passwords.pool.shutdown()
+
+
+@pytest_asyncio.fixture
+async def client(db):
+    """The app over ASGI without its lifespan, so no background workers run during the test."""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def auth():
+    """`auth(user_id)` returns the headers of a request made as that user."""
+    return lambda user_id: {"Authorization": f"Bearer {OAuth2.create_access_token({'user_id': user_id})}"}
+
+
+@pytest.fixture
+def seed(postgres):
+    """Insert users and pieces named after a prefix unique to the test; all of them are removed afterwards.
+
+    `seed(users=3, pieces=2)` returns (user_ids, piece_ids); `seed.likes([(user_id, piece_id), ...])` adds likes
+    and brings num_of_likes up to date.
+    """
+    prefix = f"test-{uuid.uuid4().hex[:12]}-"
+    created = {"USER": [], "PIECE": []}
+
+    def insert(users: int = 0, pieces: int = 0):
+        with database.engine.begin() as conn:
+            user_ids = conn.execute(text(
+                "INSERT INTO users (username, email, password, role) "
+                "SELECT :p || g, :p || g || '@example.com', 'x', 'USER' FROM generate_series(1, :n) g RETURNING id"
+            ), {"p": prefix, "n": users}).scalars().all()
+            piece_ids = conn.execute(text(
+                "INSERT INTO pieces (title, num_of_likes) SELECT :p || g, 0 FROM generate_series(1, :n) g RETURNING id"
+            ), {"p": prefix, "n": pieces}).scalars().all()
+        created["USER"] += user_ids
+        created["PIECE"] += piece_ids
+        return user_ids, piece_ids
+
+    def likes(pairs):
+        with database.engine.begin() as conn:
+            conn.execute(text("INSERT INTO likes (user_id, piece_id) VALUES (:u, :p)"), [{"u": u, "p": p} for u, p in pairs])
+            conn.execute(text(
+                "UPDATE pieces SET num_of_likes = (SELECT count(*) FROM likes WHERE piece_id = pieces.id) WHERE id = ANY(:ids)"
+            ), {"ids": sorted({p for _, p in pairs})})
+
+    insert.prefix = prefix
+    insert.likes = likes
+    yield insert
+    with database.engine.begin() as conn:
+        for kind, ids in created.items():
+            conn.execute(text("DELETE FROM deletion_jobs WHERE kind = :kind AND target_id = ANY(:ids)"), {"kind": kind, "ids": ids})
+        conn.execute(text("DELETE FROM users WHERE username LIKE :p"), {"p": prefix + "%"})
+        conn.execute(text("DELETE FROM pieces WHERE title LIKE :p"), {"p": prefix + "%"})
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+from sqlalchemy import text
+
+from novelnest.core import OAuth2, bulk_import, database
+from novelnest.core.user_cache import user_cache
+
+
+async def stream(data: bytes, size: int = 7):
+    """The body in small chunks, so records are split across them as a real upload's are."""
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+@pytest.mark.asyncio
+async def test_import_pieces_reports_bad_rows(db, seed):
+    title = seed.prefix + "imported"
+    rows = [{"title": f"{title}-1"}, {"title": f"{title}-2", "description": "d"}, {"nope": 1}, {"title": f"{title}-3"}]
+    data = "\n".join(json.dumps(row) for row in rows).encode() + b"\nnot json\n"
+
+    result = await bulk_import.import_rows("pieces", stream(data), "ndjson", chunk_size=2)
+
+    assert (result.imported, result.failed) == (3, 2)
+    assert [error.row for error in result.errors] == [3, 5]
+    with database.engine.connect() as conn:
+        titles = conn.execute(text("SELECT title FROM pieces WHERE title LIKE :p ORDER BY title"), {"p": title + "%"}).scalars().all()
+    assert titles == [f"{title}-1", f"{title}-2", f"{title}-3"]
+
+@pytest.mark.asyncio
+async def test_import_users_from_csv_rejects_clashes(db, seed):
+    (existing,), _ = seed(users=1)
+    with database.engine.connect() as conn:
+        taken = conn.scalar(text("SELECT username FROM users WHERE id = :id"), {"id": existing})
+    p = seed.prefix
+    data = (
+        "username,email,password\n"
+        f"{p}new1,{p}new1@example.com,\"multi\nline\"\n"
+        f"{taken},{p}other@example.com,pw\n"  # username already taken
+        f"{p}new2,{p}new1@example.com,pw\n"  # email used earlier in the same chunk
+        f"{p}new3,not-an-email,pw\n"
+        f"{p}new4,{p}new4@example.com,pw4\n"
+    ).encode()
+
+    result = await bulk_import.import_rows("users", stream(data), "csv", chunk_size=10)
+
+    assert (result.imported, result.failed) == (2, 3)
+    assert [error.row for error in result.errors] == [2, 3, 4]
+    assert "already taken" in result.errors[0].errors[0]
+    assert "already in use" in result.errors[1].errors[0]
+    with database.engine.connect() as conn:
+        users = dict(conn.execute(text("SELECT username, password FROM users WHERE username IN (:a, :b)"), {"a": f"{p}new1", "b": f"{p}new4"}).all())
+    assert OAuth2.verify_password("multi\nline", users[f"{p}new1"])
+    assert OAuth2.verify_password("pw4", users[f"{p}new4"])
+
+@pytest.mark.asyncio
+async def test_import_endpoint_is_admin_only(client, seed, auth):
+    (user_id,), _ = seed(users=1)
+    r = await client.post("/pieces/import", content=json.dumps({"title": seed.prefix + "x"}).encode(), headers=auth(user_id))
+    assert r.status_code == 403, r.text
+
+    with database.engine.begin() as conn:
+        conn.execute(text("UPDATE users SET role = 'ADMIN' WHERE id = :id"), {"id": user_id})
+    await user_cache.invalidate(user_id)  # as PUT /users/{id} does
+    r = await client.post("/pieces/import", content=json.dumps({"title": seed.prefix + "x"}).encode(), headers=auth(user_id))
+    assert r.status_code == 200 and r.json()["imported"] == 1, r.text
@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import text
+
+from novelnest.core import database, deletions
+from novelnest.schemas.deletion_sc import DeletionKind
+
+
+async def soft_delete(kind: DeletionKind, target_id: int):
+    async with database.session_scope() as db:
+        job = await db.scalar(deletions.soft_delete_statement(kind, target_id))
+        await db.commit()
+    return job
+
+def job_row(job_id: int):
+    with database.engine.connect() as conn:
+        return conn.execute(text("SELECT * FROM deletion_jobs WHERE id = :id"), {"id": job_id}).one()
+
+def pieces(piece_ids) -> list:
+    """(id, num_of_likes, COUNT(*) of its likes) of the pieces still there."""
+    with database.engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT id, num_of_likes, (SELECT count(*) FROM likes WHERE piece_id = pieces.id) FROM pieces WHERE id = ANY(:ids) ORDER BY id"
+        ), {"ids": list(piece_ids)}).all()
+
+def user_exists(user_id: int) -> bool:
+    with database.engine.connect() as conn:
+        return conn.scalar(text("SELECT count(*) FROM users WHERE id = :id"), {"id": user_id}) == 1
+
+
+@pytest.mark.asyncio
+async def test_user_deletion_removes_likes_in_chunks_and_decrements_counts(db, seed):
+    (heavy, other), piece_ids = seed(users=2, pieces=5)
+    seed.likes([(heavy, piece_id) for piece_id in piece_ids] + [(other, piece_ids[0])])
+
+    job = await soft_delete(DeletionKind.USER, heavy)
+    assert job is not None
+    assert await soft_delete(DeletionKind.USER, heavy) is None  # already being deleted
+
+    assert await deletions.run_deletions(chunk_size=2) >= 3
+    row = job_row(job.id)
+    assert (row.status, row.likes_total, row.likes_deleted, row.last_error) == ("DONE", 5, 5, None)
+    assert row.finished_at is not None
+    assert not user_exists(heavy)
+    assert user_exists(other)
+    assert [(n, actual) for _, n, actual in pieces(piece_ids)] == [(1, 1), (0, 0), (0, 0), (0, 0), (0, 0)]
+
+@pytest.mark.asyncio
+async def test_piece_deletion_removes_its_likes_then_the_piece(db, seed):
+    user_ids, (piece_id, kept) = seed(users=3, pieces=2)
+    seed.likes([(user_id, piece_id) for user_id in user_ids] + [(user_ids[0], kept)])
+
+    job = await soft_delete(DeletionKind.PIECE, piece_id)
+    await deletions.run_deletions(chunk_size=2)
+
+    assert job_row(job.id).status == "DONE"
+    assert pieces([piece_id, kept]) == [(kept, 1, 1)]
+    assert all(user_exists(user_id) for user_id in user_ids)
+
+@pytest.mark.asyncio
+async def test_soft_deleted_targets_are_hidden_at_once(client, seed, auth):
+    (user_id,), (piece_id,) = seed(users=1, pieces=1)
+    r = await client.delete(f"/users/{user_id}", headers=auth(user_id))
+    assert r.status_code == 202, r.text
+    assert r.headers["location"] == f"/deletions/{r.json()['id']}"
+    assert (await client.get(f"/users/{user_id}")).status_code == 404
+    assert (await client.post("/likes/", json={"piece_id": piece_id}, headers=auth(user_id))).status_code == 401
+    await deletions.run_deletions()
+    assert not user_exists(user_id)
+
+@pytest.mark.asyncio
+async def test_failing_job_does_not_block_later_jobs(db, seed, monkeypatch):
+    (user_id,), (piece_id,) = seed(users=1, pieces=1)
+    user_job = await soft_delete(DeletionKind.USER, user_id)
+    piece_job = await soft_delete(DeletionKind.PIECE, piece_id)
+
+    # Every chunk of a user job fails
+    monkeypatch.setattr(deletions, "LIKE_KEYS", {DeletionKind.PIECE: deletions.LIKE_KEYS[DeletionKind.PIECE]})
+    with pytest.raises(KeyError):
+        while await deletions.run_chunk():
+            pass
+    assert job_row(user_job.id).last_error is not None
+
+    # The failed job waits out its retry delay while the job queued after it finishes
+    await deletions.run_deletions()
+    assert job_row(piece_job.id).status == "DONE"
+    assert job_row(user_job.id).status == "PENDING"
+
+    monkeypatch.undo()
+    assert await deletions.run_chunk(retry_seconds=0)
+    row = job_row(user_job.id)
+    assert (row.status, row.last_error) == ("DONE", None)
@@ -0,0 +1,37 @@
+import asyncio
+import random
+
+import pytest
+from sqlalchemy import text
+
+from novelnest.api.like import toggle_like_statement
+from novelnest.core import database
+
+WORKERS = 12  # within the default pool, db_pool_size + db_max_overflow
+TOGGLES_PER_WORKER = 100
+
+
+async def toggler(rng: random.Random, user_ids, piece_ids, outcomes: dict):
+    async with database.session_scope() as db:
+        for _ in range(TOGGLES_PER_WORKER):
+            statement = toggle_like_statement(rng.choice(piece_ids), rng.choice(user_ids), rng.randint(0, 1))
+            result = (await db.execute(statement)).one()
+            await db.commit()
+            outcomes["changed" if result.changed else "noop"] += 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_toggles_keep_num_of_likes_equal_to_count(db, seed):
+    """Many connections liking and unliking a few hot pieces at once, with the exact statement toggle_like runs."""
+    user_ids, piece_ids = seed(users=40, pieces=3)
+    outcomes = {"changed": 0, "noop": 0}
+
+    await asyncio.gather(*(toggler(random.Random(n), user_ids, piece_ids, outcomes) for n in range(WORKERS)))
+
+    assert outcomes["changed"] > 0 and outcomes["noop"] > 0
+    async with database.session_scope() as session:
+        counts = (await session.execute(text(
+            "SELECT p.id, p.num_of_likes, (SELECT count(*) FROM likes l WHERE l.piece_id = p.id) AS actual "
+            "FROM pieces p WHERE p.id = ANY(:ids) ORDER BY p.id"
+        ), {"ids": piece_ids})).all()
+    assert [(row.id, row.num_of_likes) for row in counts] == [(row.id, row.actual) for row in counts]
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Response
+
+from novelnest.api.like import LIKE_ORDER
+from novelnest.api.user import USER_ORDER
+from novelnest.core.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, page
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor([created_at, 42]), USER_ORDER) == (created_at, 42)
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor([1]), encode_cursor(["x", 1]), encode_cursor({"a": 1})])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor, LIKE_ORDER)
+    assert e.value.status_code == 400
+
+def test_page_trims_the_look_ahead_row():
+    rows = [SimpleNamespace(user_id=n, piece_id=1) for n in range(4)]
+    response = Response()
+    assert page(rows, LIKE_ORDER, 3, response) == rows[:3]
+    assert decode_cursor(response.headers[NEXT_CURSOR_HEADER], LIKE_ORDER) == (2, 1)
+
+def test_last_page_has_no_cursor():
+    rows = [SimpleNamespace(user_id=n, piece_id=1) for n in range(3)]
+    response = Response()
+    assert page(rows, LIKE_ORDER, 3, response) == rows
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_cursor_walks_every_like_once(client, seed):
+    user_ids, (piece_id,) = seed(users=7, pieces=1)
+    seed.likes([(user_id, piece_id) for user_id in user_ids])
+
+    seen, cursor = [], None
+    while True:
+        r = await client.get(f"/likes/{piece_id}", params={"limit": 3, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200, r.text
+        seen += [like["user_id"] for like in r.json()]
+        cursor = r.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+    assert seen == sorted(user_ids)
+
+    by_offset = []
+    for offset in range(0, 9, 3):
+        by_offset += [like["user_id"] for like in (await client.get(f"/likes/{piece_id}", params={"limit": 3, "offset": offset})).json()]
+    assert by_offset == seen
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": -1}, {"limit": 101}, {"offset": -1}])
+async def test_out_of_range_limit_or_offset_is_a_422(client, seed, params):
+    _, (piece_id,) = seed(pieces=1)
+    for path in (f"/likes/{piece_id}", "/pieces/", "/users/"):
+        assert (await client.get(path, params=params)).status_code == 422, path
+
+@pytest.mark.asyncio
+async def test_bad_cursor_is_a_400(client, seed):
+    _, (piece_id,) = seed(pieces=1)
+    assert (await client.get(f"/likes/{piece_id}", params={"cursor": "nope"})).status_code == 400
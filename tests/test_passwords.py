@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from novelnest.core import passwords
+from novelnest.core.passwords import PasswordPool
+
+SLOW = 0.2  # seconds each batch item keeps a worker busy, a stand-in for a bcrypt hash
+
+
+@pytest.fixture
+def pool():
+    pool = PasswordPool(workers=2, max_queue=1, retry_after=3)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_map_keeps_order(pool):
+    hashes = await pool.map(passwords.hash_password, ["a", "b", "c"])
+    assert [passwords.pwd_context.verify(p, h) for p, h in zip("abc", hashes)] == [True] * 3
+    assert await pool.map(passwords.hash_password, []) == []
+    assert pool.pending == 0
+
+@pytest.mark.asyncio
+async def test_run_during_a_large_map_is_served_or_refused_promptly(pool):
+    await pool.run(time.sleep, 0)  # start the worker processes
+    batch = asyncio.create_task(pool.map(time.sleep, [SLOW] * 20))
+    await asyncio.sleep(SLOW / 2)
+    assert pool.pending == pool.workers  # the batch's jobs count against the queue limit
+
+    start = time.perf_counter()
+    served = asyncio.create_task(pool.run(time.sleep, 0))
+    await asyncio.sleep(0)
+    # The queue is full now: refused at once with Retry-After rather than left waiting behind the batch
+    with pytest.raises(HTTPException) as e:
+        await pool.run(time.sleep, 0)
+    assert e.value.status_code == 503 and e.value.headers["Retry-After"] == "3"
+    assert time.perf_counter() - start < SLOW
+
+    # Waits for one batch item at most, not for the ~2 s of batch work left
+    await served
+    assert time.perf_counter() - start < 3 * SLOW
+    assert not batch.done()
+    await batch
+    assert pool.pending == 0
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+
+from novelnest.core.rate_limit import Limit, MemoryBuckets, RateLimiter, buckets_from_url
+
+
+def test_parse_limit():
+    limit = Limit.parse("10/60")
+    assert (limit.capacity, limit.period, limit.policy) == (10, 60, "10;w=60")
+    with pytest.raises(ValueError):
+        Limit.parse("0/60")
+
+@pytest.mark.asyncio
+async def test_bucket_allows_a_burst_then_refuses():
+    buckets, limit = MemoryBuckets(100), Limit(3, 60)
+    # A bucket refills continuously, so a little comes back between takes
+    assert [await buckets.take("k", limit) for _ in range(3)] == pytest.approx([2, 1, 0], abs=0.01)
+    assert await buckets.take("k", limit) < 0
+    assert await buckets.take("other", limit) == pytest.approx(2)
+
+@pytest.mark.asyncio
+async def test_bucket_refills_over_the_period():
+    buckets, limit = MemoryBuckets(100), Limit(2, 0.05)
+    await buckets.take("k", limit)
+    await buckets.take("k", limit)
+    assert await buckets.take("k", limit) < 0
+    await asyncio.sleep(0.03)
+    assert await buckets.take("k", limit) >= 0
+
+@pytest.mark.asyncio
+async def test_check_sets_headers_then_answers_429():
+    limiter = RateLimiter({"login": "2/60"}, MemoryBuckets(100))
+    response = Response()
+    await limiter.check("login", "ip:1.2.3.4", response)
+    assert response.headers["ratelimit-limit"] == "2"
+    assert response.headers["ratelimit-remaining"] == "1"
+    await limiter.check("login", "ip:1.2.3.4", Response())
+
+    with pytest.raises(HTTPException) as e:
+        await limiter.check("login", "ip:1.2.3.4", Response())
+    assert e.value.status_code == 429
+    assert e.value.headers["RateLimit-Remaining"] == "0"
+    assert int(e.value.headers["Retry-After"]) >= 1
+
+@pytest.mark.asyncio
+async def test_backend_failure_lets_requests_through():
+    class Broken:
+        async def take(self, key, limit):
+            raise ConnectionError("backend down")
+
+    await RateLimiter({"login": "1/60"}, Broken()).check("login", "ip:1.2.3.4", Response())
+
+@pytest.mark.asyncio
+async def test_redis_buckets_share_limits(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # fakeredis runs the Lua script with it
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr("redis.asyncio.from_url", lambda url, **kwargs: fakeredis.FakeAsyncRedis(server=server, **kwargs))
+
+    # Two workers' limiters over one server draw from the same bucket
+    a, b = (RateLimiter({"like": "3/60"}, buckets_from_url("redis://localhost:6379/0", 100)) for _ in range(2))
+    await a.check("like", "user:1", Response())
+    await b.check("like", "user:1", Response())
+    await a.check("like", "user:1", Response())
+    with pytest.raises(HTTPException) as e:
+        await b.check("like", "user:1", Response())
+    assert e.value.status_code == 429
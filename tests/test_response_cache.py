@@ -0,0 +1,58 @@
+import pytest
+
+from novelnest.core.response_cache import ResponseCache, etag_matches, make_etag, match_route
+
+
+def test_cached_routes():
+    assert match_route("/pieces/") is True
+    assert match_route("/pieces/7") is False
+    assert match_route("/likes/count/7") is False
+    assert match_route("/users/7") is False
+    assert match_route("/pieces/7/similar") is None
+    assert match_route("/users/me") is None
+
+def test_etag_matching():
+    etag = make_etag(b"body")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(make_etag(b"other"), etag)
+
+def test_invalidate_drops_detail_entries_and_moves_lists_to_a_new_generation():
+    cache = ResponseCache(max_entries=10, ttl=60)
+    list_key = cache.key("/pieces/", b"limit=2", True)
+    cache.entries.set(list_key, "page")
+    cache.entries.set("/pieces/7", "piece")
+    version = cache.version
+
+    cache.invalidate("/pieces/", "/pieces/7")
+    assert cache.version > version
+    assert cache.entries.get("/pieces/7") is None
+    assert cache.key("/pieces/", b"limit=2", True) != list_key
+    assert cache.entries.get(cache.key("/pieces/", b"limit=2", True)) is None
+
+
+@pytest.mark.asyncio
+async def test_anonymous_reads_get_etags_and_writes_invalidate_them(client, seed, auth):
+    (user_id,), (piece_id,) = seed(users=1, pieces=1)
+
+    first = await client.get(f"/pieces/{piece_id}")
+    assert first.status_code == 200 and first.json()["num_of_likes"] == 0
+    etag = first.headers["etag"]
+    assert (await client.get(f"/pieces/{piece_id}")).headers["etag"] == etag
+    assert (await client.get(f"/pieces/{piece_id}", headers={"If-None-Match": etag})).status_code == 304
+
+    r = await client.post("/likes/", json={"piece_id": piece_id, "direction": 1}, headers=auth(user_id))
+    assert r.status_code == 201, r.text
+
+    after = await client.get(f"/pieces/{piece_id}", headers={"If-None-Match": etag})
+    assert after.status_code == 200 and after.json()["num_of_likes"] == 1
+    assert after.headers["etag"] != etag
+    assert (await client.get(f"/likes/count/{piece_id}")).json()["like_count"] == 1
+
+@pytest.mark.asyncio
+async def test_authenticated_reads_bypass_the_cache(client, seed, auth):
+    (user_id,), (piece_id,) = seed(users=1, pieces=1)
+    seed.likes([(user_id, piece_id)])
+    assert (await client.get(f"/pieces/{piece_id}")).json()["liked_by_me"] is None
+    assert (await client.get(f"/pieces/{piece_id}", headers=auth(user_id))).json()["liked_by_me"] is True
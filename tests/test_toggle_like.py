@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import text
+
+from novelnest.core import database
+
+
+def counts(piece_id: int) -> tuple:
+    """(num_of_likes, COUNT(*) of its likes) for the piece."""
+    with database.engine.connect() as conn:
+        return tuple(conn.execute(text(
+            "SELECT num_of_likes, (SELECT count(*) FROM likes WHERE piece_id = :id) FROM pieces WHERE id = :id"
+        ), {"id": piece_id}).one())
+
+
+@pytest.mark.asyncio
+async def test_like_then_unlike(client, seed, auth):
+    (user_id,), (piece_id,) = seed(users=1, pieces=1)
+    headers = auth(user_id)
+
+    r = await client.post("/likes/", json={"piece_id": piece_id, "direction": 1}, headers=headers)
+    assert r.status_code == 201, r.text
+    like = r.json()["like"]
+    assert (like["piece_id"], like["user_id"]) == (piece_id, user_id)
+    assert like["created_at"] is not None
+    assert counts(piece_id) == (1, 1)
+
+    r = await client.post("/likes/", json={"piece_id": piece_id, "direction": 1}, headers=headers)
+    assert r.status_code == 409, r.text
+    assert counts(piece_id) == (1, 1)
+
+    r = await client.post("/likes/", json={"piece_id": piece_id, "direction": 0}, headers=headers)
+    assert r.status_code == 201, r.text
+    assert counts(piece_id) == (0, 0)
+
+    r = await client.post("/likes/", json={"piece_id": piece_id, "direction": 0}, headers=headers)
+    assert r.status_code == 404, r.text
+    assert counts(piece_id) == (0, 0)
+
+@pytest.mark.asyncio
+async def test_like_missing_or_deleted_piece_is_a_404(client, seed, auth):
+    (user_id,), (piece_id,) = seed(users=1, pieces=1)
+    with database.engine.begin() as conn:
+        conn.execute(text("UPDATE pieces SET deleted_at = now() WHERE id = :id"), {"id": piece_id})
+    for missing in (piece_id, 2**31 - 1):
+        r = await client.post("/likes/", json={"piece_id": missing, "direction": 1}, headers=auth(user_id))
+        assert r.status_code == 404, r.text
+
+@pytest.mark.asyncio
+async def test_like_needs_a_token_and_a_valid_direction(client, seed, auth):
+    (user_id,), (piece_id,) = seed(users=1, pieces=1)
+    assert (await client.post("/likes/", json={"piece_id": piece_id})).status_code == 401
+    assert (await client.post("/likes/", json={"piece_id": piece_id, "direction": 2}, headers=auth(user_id))).status_code == 422
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from novelnest.core.cache import MemoryBackend
+from novelnest.core.user_cache import UserCache
+from novelnest.schemas import user_sc
+
+
+def make_user(role=user_sc.UserRole.ADMIN, username="alice"):
+    return user_sc.User(id=1, username=username, email="alice@example.com", role=role, created_at="2026-01-01T00:00:00Z")
+
+def workers(ttl=30):
+    """Two workers' caches sharing one backend, as with USER_CACHE_BACKEND_URL set."""
+    backend = MemoryBackend()
+    return UserCache(100, ttl, backend), UserCache(100, ttl, backend)
+
+async def load(cache: UserCache, user: user_sc.User):
+    """What get_current_user does on a miss: look up, load the row, cache it under the version seen first."""
+    cached, version = await cache.get(user.id)
+    assert cached is None
+    await cache.set(user, version)
+
+async def cached(cache: UserCache):
+    return (await cache.get(1))[0]
+
+
+@pytest.mark.asyncio
+async def test_local_hit_without_backend():
+    cache = UserCache(100, 30)
+    await load(cache, make_user())
+    assert (await cached(cache)).username == "alice"
+    await cache.invalidate(1)
+    assert await cached(cache) is None
+
+@pytest.mark.asyncio
+async def test_shared_hit_fills_the_other_workers_local_tier():
+    a, b = workers()
+    await load(a, make_user())
+    assert (await cached(b)).username == "alice"
+    assert b.local.get(1) is not None
+
+@pytest.mark.asyncio
+async def test_invalidate_reaches_other_workers_local_tier():
+    a, b = workers()
+    await load(a, make_user())
+    assert (await cached(b)).role == user_sc.UserRole.ADMIN  # now in b's local tier
+
+    # a demotes the user: b must not keep serving the admin from its local tier
+    await a.invalidate(1)
+    assert await cached(b) is None
+    assert b.local.get(1) is None
+
+    await load(a, make_user(role=user_sc.UserRole.USER))
+    assert (await cached(b)).role == user_sc.UserRole.USER
+    assert (await cached(a)).role == user_sc.UserRole.USER
+
+@pytest.mark.asyncio
+async def test_invalidate_after_reload_is_seen_again():
+    a, b = workers()
+    await load(b, make_user(username="alice"))
+    await a.invalidate(1)
+    await load(b, make_user(username="bob"))
+    assert (await cached(b)).username == "bob"
+    await a.invalidate(1)
+    assert await cached(b) is None
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("shared", [False, True])
+async def test_invalidate_between_load_and_set_keeps_the_old_row_out(shared):
+    """The row was read before the update committed, and the update invalidated before the reader's set()."""
+    a, b = workers() if shared else (UserCache(100, 30),) * 2
+    _, version = await a.get(1)
+    admin = make_user(role=user_sc.UserRole.ADMIN)  # the SELECT saw the row before the demotion
+    await b.invalidate(1)  # the demotion, in this worker or another
+    await a.set(admin, version)
+
+    assert await cached(a) is None
+    assert await cached(b) is None
+
+@pytest.mark.asyncio
+async def test_shared_write_racing_an_invalidation_is_ignored():
+    """A set() that checked the token just before another worker's invalidate still lands, but nobody serves it."""
+    a, b = workers()
+    _, version = await a.get(1)
+    stale = make_user(role=user_sc.UserRole.ADMIN)
+    await b.invalidate(1)
+    # The shared write as it would arrive after the invalidation, under the token a saw
+    await a.backend.set(a._key(1), f"{version[1] or ''}|{stale.model_dump_json()}", a.ttl)
+
+    assert await cached(b) is None
+    assert await cached(a) is None
+
+@pytest.mark.asyncio
+async def test_entries_expire_after_ttl():
+    a, b = workers(ttl=0.01)
+    await load(a, make_user())
+    await asyncio.sleep(0.02)
+    assert await cached(a) is None
+    assert await cached(b) is None